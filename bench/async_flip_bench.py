@@ -0,0 +1,122 @@
+"""
+Moves/s and flip latency of lab3's AsyncBoard against ConcurrentBoard behind asyncio.to_thread.
+
+Both run N player coroutines in one event loop for --seconds, each playing
+turns (first flip, --think-ms pause, second flip, pause) on a fresh
+rows x cols board of pairs:
+  - async:  await board.flip(...) on an AsyncBoard
+  - thread: await asyncio.to_thread(board.flip, ...) on a ConcurrentBoard,
+            as simulation.py used to; every move is a hop to the default
+            executor, whose size (--executor, default min(32, cpus + 4))
+            caps the moves in flight
+Latency is measured around each awaited flip, so it includes any wait for
+a controlled card and, for "thread", the executor queue. When every executor
+thread is blocked waiting for a card whose holder's move is queued behind
+them, the thread mode stalls; a run still going 10 s after --seconds is
+reported as stalled and unwound by making every player leave.
+
+    python bench/async_flip_bench.py                          # 10..5000 players
+    python bench/async_flip_bench.py --players 1000 --think-ms 0 --seconds 3
+    python bench/async_flip_bench.py --modes async --players 20000 --json
+"""
+import argparse, asyncio, json, os, random, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lab3" / "src"))
+from board import AsyncBoard, ConcurrentBoard  # noqa: E402
+
+def make_values(n: int, seed: int = 42) -> list:
+    vals = [f"v{i // 2}" for i in range(n)]
+    random.Random(seed).shuffle(vals)
+    return vals
+
+def pct(sorted_vals: list, p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(len(sorted_vals) * p))]
+
+async def player(flip, leave, name: str, rows: int, cols: int, think: float, end: float,
+                 seed: int, lat: list) -> int:
+    rnd = random.Random(seed)
+    failed = 0
+    while time.perf_counter() < end:
+        t = time.perf_counter()
+        try:
+            await flip(name, rnd.randrange(rows), rnd.randrange(cols))
+        except ValueError:
+            failed += 1
+        lat.append(time.perf_counter() - t)
+        await asyncio.sleep(think)
+    await leave(name)   # a matched pair still held would leave other players waiting on it
+    return failed
+
+async def run(mode: str, rows: int, cols: int, players: int, think_ms: float, seconds: float,
+              executor: int) -> dict:
+    values = make_values(rows * cols)
+    loop = asyncio.get_running_loop()
+    if mode == "async":
+        board = AsyncBoard(rows, cols, values)
+        flip, leave = board.flip, board.leave
+    else:
+        board = ConcurrentBoard(rows, cols, values)
+        pool = ThreadPoolExecutor(executor)
+        loop.set_default_executor(pool)
+
+        async def flip(name, r, c):
+            return await asyncio.to_thread(board.flip, name, r, c)
+
+        async def leave(name):
+            return await asyncio.to_thread(board.leave, name)
+    lat: list = []
+    end = time.perf_counter() + seconds
+    t = time.perf_counter()
+    tasks = [asyncio.create_task(player(flip, leave, f"p{k}", rows, cols, think_ms / 1000, end, k, lat))
+             for k in range(players)]
+    done, stalled = await asyncio.wait(tasks, timeout=seconds + 10)
+    took = time.perf_counter() - t
+    failed = [task.result() for task in done]
+    for task in stalled:
+        task.cancel()
+    if mode == "thread":
+        if stalled:
+            pool.shutdown(wait=False, cancel_futures=True)
+            for k in range(players):   # blocked flips return once the cards' holders have left
+                threading.Thread(target=board.leave, args=(f"p{k}",), daemon=True).start()
+        pool.shutdown()
+    lat.sort()
+    st = board.stats()
+    return {"mode": mode, "players": players, "moves": len(lat), "failed": sum(failed),
+            "seconds": round(took, 3), "moves_per_s": round(len(lat) / took),
+            "p50_ms": round(pct(lat, 0.50) * 1e3, 3), "p99_ms": round(pct(lat, 0.99) * 1e3, 3),
+            "max_ms": round(lat[-1] * 1e3, 3) if lat else 0.0, "waits": st["waits"],
+            "stalled": len(stalled)}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=1000)
+    ap.add_argument("--cols", type=int, default=1000)
+    ap.add_argument("--players", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    ap.add_argument("--modes", nargs="+", choices=["async", "thread"], default=["async", "thread"])
+    ap.add_argument("--think-ms", type=float, default=1.0)
+    ap.add_argument("--seconds", type=float, default=2.0)
+    ap.add_argument("--executor", type=int, default=min(32, (os.cpu_count() or 1) + 4),
+                    help="worker threads for the thread mode")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    a = ap.parse_args()
+
+    results = [asyncio.run(run(m, a.rows, a.cols, p, a.think_ms, a.seconds, a.executor))
+               for p in a.players for m in a.modes]
+    if a.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{a.rows}x{a.cols} board, think {a.think_ms} ms, {a.seconds}s per run, executor {a.executor}")
+    print(f"{'mode':>6} {'players':>7} {'moves/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'waits':>6}")
+    for r in results:
+        print(f"{r['mode']:>6} {r['players']:>7} {r['moves_per_s']:>9} {r['p50_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['max_ms']:>8} {r['waits']:>6}")
+        if r["stalled"]:
+            print(f"        stalled: {r['stalled']} players had not finished {a.seconds + 10:g}s in")
+
+if __name__ == "__main__":
+    main()
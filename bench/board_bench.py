@@ -0,0 +1,102 @@
+"""
+Flip throughput and memory of the lab3 board engines.
+
+For each engine a rows x cols board of paired values is built, then random
+flip_up/flip_down pairs are timed (plus mark_matched on matching pairs) for
+--seconds or --ops operations, whichever comes first. Memory is measured
+with tracemalloc around construction, excluding the input value list.
+--rep-check takes one or more RepCheck specs (off, local, sampled:N, full)
+and runs every engine under each, reporting the time spent checking.
+
+    python bench/board_bench.py                        # 1000x1000, both engines
+    python bench/board_bench.py --rows 200 --cols 200 --engines compact --seconds 2
+    python bench/board_bench.py --rows 300 --cols 300 --rep-check off local sampled:1000 full
+"""
+import argparse, json, random, sys, time, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lab3" / "src"))
+from board import BOARD_ENGINES  # noqa: E402
+
+def make_values(n: int, distinct: int, seed: int = 42) -> list:
+    vals = [f"v{i % distinct}" for i in range(n)]
+    random.Random(seed).shuffle(vals)
+    return vals
+
+def build(engine: str, rows: int, cols: int, values: list, rep_check: str):
+    """Times an untraced build, then measures a second one under tracemalloc."""
+    t = time.perf_counter()
+    board = BOARD_ENGINES[engine](rows, cols, values, rep_check)
+    built = time.perf_counter() - t
+    del board
+    tracemalloc.start()
+    board = BOARD_ENGINES[engine](rows, cols, values, rep_check)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return board, built, used
+
+def flips(board, rows: int, cols: int, seconds: float, max_ops: int, seed: int = 7) -> tuple:
+    rnd = random.Random(seed)
+    ops, end = 0, time.perf_counter() + seconds
+    t = time.perf_counter()
+    while ops < max_ops and time.perf_counter() < end:
+        a = (rnd.randrange(rows), rnd.randrange(cols))
+        b = (rnd.randrange(rows), rnd.randrange(cols))
+        try:
+            va = board.flip_up(a)
+        except ValueError:  # already matched
+            ops += 1; continue
+        try:
+            vb = board.flip_up(b)
+        except ValueError:  # matched, or b == a
+            board.flip_down(a)
+            ops += 3; continue
+        if va == vb:
+            board.mark_matched(a, b)
+        else:
+            board.flip_down(a); board.flip_down(b)
+        ops += 4
+    return ops, time.perf_counter() - t
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=1000)
+    ap.add_argument("--cols", type=int, default=1000)
+    ap.add_argument("--distinct", type=int, default=5000, help="distinct card values")
+    ap.add_argument("--engines", nargs="+", choices=list(BOARD_ENGINES), default=list(BOARD_ENGINES))
+    ap.add_argument("--seconds", type=float, default=5.0, help="time budget for flips per engine")
+    ap.add_argument("--ops", type=int, default=1_000_000, help="cap on board operations per engine")
+    ap.add_argument("--rep-check", nargs="+", default=["local"], help="RepCheck specs to run under")
+    ap.add_argument("--json", help="also write results to this file")
+    a = ap.parse_args()
+    n = a.rows * a.cols
+    values = make_values(n, a.distinct)
+    rows = []
+    for spec in a.rep_check:
+        for engine in a.engines:
+            board, built, used = build(engine, a.rows, a.cols, values, spec)
+            before = board.rep_check_stats()  # leaves out the construction scan
+            ops, dt = flips(board, a.rows, a.cols, a.seconds, a.ops)
+            checks = {k: (v - before[k] if isinstance(v, (int, float)) and k != "every" else v)
+                      for k, v in board.rep_check_stats().items()}
+            row = {"engine": engine, "rep_check": spec, "rows": a.rows, "cols": a.cols, "build_s": round(built, 3),
+                   "bytes": used, "bytes_per_cell": round(used / n, 2), "nbytes": board.nbytes(),
+                   "ops": ops, "ops_per_s": round(ops / dt, 1), "checks": checks,
+                   "check_share": round(checks["seconds"] / dt, 4)}
+            rows.append(row)
+            print(f"{engine:8} {spec:13} {a.rows}x{a.cols}  build {built:6.2f}s  {row['bytes_per_cell']:7.2f} B/cell "
+                  f"({used / 1e6:.1f} MB)  {row['ops_per_s']:12,.0f} ops/s ({ops} ops)  "
+                  f"checking {row['check_share']:6.1%} ({checks['full_checks']} full, {checks['local_checks']} local)",
+                  flush=True)
+            del board
+        group = [r for r in rows if r["rep_check"] == spec]
+        if len(group) > 1 and group[0]["ops_per_s"]:
+            base = group[0]
+            for r in group[1:]:
+                print(f"  {r['engine']} vs {base['engine']}: {r['ops_per_s'] / base['ops_per_s']:.1f}x ops/s, "
+                      f"{base['bytes_per_cell'] / r['bytes_per_cell']:.1f}x less memory per cell")
+    if a.json:
+        Path(a.json).write_text(json.dumps(rows, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Concurrent flip throughput of lab3's ConcurrentBoard as the player count grows.
+
+Each player is a thread that plays turns for --seconds: a first flip, a
+pause of --think-ms (players wait on the network or a person, not the CPU),
+then a second flip. Failed flips (removed or controlled cards) still count.
+Every (stripes, players) pair gets a fresh rows x cols board of pairs.
+--hot K aims first flips at the first K cells only, so players queue for
+the same cards; "wakeups/wait" near 1 shows a released card wakes only the
+players waiting for it.
+
+    python bench/flip_bench.py                              # 1000x1000, 4..256 players
+    python bench/flip_bench.py --players 4 64 --stripes 1 64 --think-ms 0
+    python bench/flip_bench.py --hot 64 --seconds 3 --json
+"""
+import argparse, json, random, sys, threading, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lab3" / "src"))
+from board import ConcurrentBoard  # noqa: E402
+
+def make_values(n: int, seed: int = 42) -> list:
+    vals = [f"v{i // 2}" for i in range(n)]
+    random.Random(seed).shuffle(vals)
+    return vals
+
+def play(board, player: str, rows: int, cols: int, hot: int, think: float, end: float, seed: int, out: list):
+    rnd = random.Random(seed)
+    flips = failed = 0
+    while time.perf_counter() < end:
+        for second in (False, True):
+            if hot and not second:
+                i = rnd.randrange(hot)
+                r, c = divmod(i, cols)
+            else:
+                r, c = rnd.randrange(rows), rnd.randrange(cols)
+            try:
+                board.flip(player, r, c)
+            except ValueError:
+                failed += 1
+            flips += 1
+            if think:
+                time.sleep(think)
+    board.leave(player)   # a matched pair still held would leave other players waiting on it
+    out.append((flips, failed))
+
+def run(rows: int, cols: int, players: int, stripes: int, hot: int, think_ms: float, seconds: float) -> dict:
+    board = ConcurrentBoard(rows, cols, make_values(rows * cols), stripes)
+    out: list = []
+    end = time.perf_counter() + seconds
+    threads = [threading.Thread(target=play, args=(board, f"p{k}", rows, cols, min(hot, rows * cols),
+                                                   think_ms / 1000, end, k, out), daemon=True)
+               for k in range(players)]
+    t = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join(seconds + 10)
+    took = time.perf_counter() - t
+    flips = sum(f for f, _ in out)
+    st = board.stats()
+    return {"players": players, "stripes": st["stripes"], "finished": len(out), "flips": flips,
+            "failed": sum(f for _, f in out), "seconds": round(took, 3),
+            "flips_per_s": round(flips / took), "waits": st["waits"], "wakeups": st["wakeups"],
+            "wakeups_per_wait": round(st["wakeups"] / st["waits"], 2) if st["waits"] else 0.0}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=1000)
+    ap.add_argument("--cols", type=int, default=1000)
+    ap.add_argument("--players", type=int, nargs="+", default=[4, 16, 64, 256])
+    ap.add_argument("--stripes", type=int, nargs="+", default=[1, 64])
+    ap.add_argument("--hot", type=int, default=0, help="aim first flips at the first K cells (0 = anywhere)")
+    ap.add_argument("--think-ms", type=float, default=1.0)
+    ap.add_argument("--seconds", type=float, default=2.0)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    a = ap.parse_args()
+
+    results = [run(a.rows, a.cols, p, s, a.hot, a.think_ms, a.seconds) for s in a.stripes for p in a.players]
+    if a.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{a.rows}x{a.cols} board, think {a.think_ms} ms, hot {a.hot or 'off'}, {a.seconds}s per run")
+    print(f"{'stripes':>7} {'players':>7} {'flips/s':>10} {'scaling':>8} {'failed':>8} {'waits':>7} {'wakeups/wait':>12}")
+    base = {}
+    for r in results:
+        base.setdefault(r["stripes"], r)
+        scale = r["flips_per_s"] / base[r["stripes"]]["flips_per_s"] if base[r["stripes"]]["flips_per_s"] else 0
+        print(f"{r['stripes']:>7} {r['players']:>7} {r['flips_per_s']:>10} {scale:>7.1f}x {r['failed']:>8} "
+              f"{r['waits']:>7} {r['wakeups_per_wait']:>12}")
+        if r["finished"] < r["players"]:
+            print(f"        {r['players'] - r['finished']} players still waiting at the end")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark: the original _read_request loop vs httpparse.RequestParser.
+
+Both are fed the same request through a fake socket that hands out
+fixed-size chunks, so the numbers isolate parsing and buffering cost.
+
+    python bench/parser_bench.py [--rounds 2000]
+"""
+import argparse, os, sys, time
+from typing import Dict, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lab2"))
+from httpparse import RequestParser  # noqa: E402
+
+CRLF = "\r\n"
+
+class ChunkSocket:
+    def __init__(self, data: bytes, chunk: int):
+        self.data, self.chunk, self.pos = data, chunk, 0
+
+    def settimeout(self, t): pass
+
+    def recv(self, n: int) -> bytes:
+        n = min(n, self.chunk)
+        out = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return out
+
+def legacy_read_request(conn) -> Tuple[str, Dict[str, str]]:
+    # verbatim copy of the pre-httpparse HTTPServer._read_request
+    data = b""
+    conn.settimeout(5.0)
+    while CRLF.encode()*2 not in data:
+        chunk = conn.recv(4096)
+        if not chunk: break
+        data += chunk
+        if len(data) > 64*1024: break
+    txt = data.decode("iso-8859-1", errors="replace")
+    lines = txt.split(CRLF)
+    if not lines or not lines[0]: return "", {}
+    reqline = lines[0]; headers = {}
+    for line in lines[1:]:
+        if not line: break
+        if ":" in line:
+            k,v = line.split(":",1); headers[k.strip().lower()] = v.strip()
+    return reqline, headers
+
+def parser_read_request(conn) -> Tuple[str, Dict[str, str]]:
+    p = RequestParser(max_head=256 * 1024, max_headers=1000)
+    while True:
+        req = p.next()
+        if req: return req
+        chunk = conn.recv(65536)
+        if not chunk: return "", {}
+        p.feed(chunk)
+
+def make_request(n_headers: int, value_len: int) -> bytes:
+    lines = ["GET /nothing/darkBalls/ HTTP/1.1", "Host: localhost:8088"]
+    lines += [f"X-Header-{i}: {'v' * value_len}" for i in range(n_headers)]
+    return (CRLF.join(lines) + CRLF + CRLF).encode()
+
+def bench(fn, data: bytes, chunk: int, rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn(ChunkSocket(data, chunk))
+    return (time.perf_counter() - t0) / rounds * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=2000)
+    a = ap.parse_args()
+    cases = [
+        ("typical (2 headers)", make_request(2, 20), 4096),
+        ("browser (20 headers)", make_request(20, 60), 4096),
+        ("large (600 headers, 60 KB)", make_request(600, 80), 4096),
+        ("large, slow client (512 B recvs)", make_request(600, 80), 512),
+    ]
+    assert legacy_read_request(ChunkSocket(cases[1][1], 4096)) == parser_read_request(ChunkSocket(cases[1][1], 4096))
+    print(f"{'case':36} {'bytes':>7} {'legacy us':>10} {'parser us':>10} {'speedup':>8}")
+    for name, data, chunk in cases:
+        rounds = a.rounds if len(data) < 8192 else max(1, a.rounds // 20)
+        old = bench(legacy_read_request, data, chunk, rounds)
+        new = bench(parser_read_request, data, chunk, rounds)
+        print(f"{name:36} {len(data):7d} {old:10.1f} {new:10.1f} {old / new:7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+End-to-end benchmark of lab2/server.py across its --mode values.
+
+For each mode a server is started on localhost against a generated docroot
+(small HTML pages, medium PNGs, large PDFs and a 10k-entry directory) and
+driven by every workload profile with load_server.run_load. Throughput,
+latency percentiles and the server process's RSS and CPU time are written
+to bench/results/<timestamp>.json.
+
+    python bench/run_bench.py                          # all modes, all profiles
+    python bench/run_bench.py --modes pool evloop --profiles small-html --duration 3
+    python bench/run_bench.py --save-baseline          # store this run as bench/baseline.json
+    python bench/run_bench.py --baseline bench/baseline.json --tolerance 0.15
+
+With a baseline, any (mode, profile) whose throughput dropped or whose p99
+grew by more than the tolerance is reported and the exit status is 1.
+Baselines are machine specific; record one on the box you compare on.
+"""
+import argparse, asyncio, json, os, platform, random, shutil, socket, subprocess, sys, tempfile, time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+LAB2 = HERE.parent / "lab2"
+sys.path.insert(0, str(LAB2))
+from load_server import run_load  # noqa: E402
+
+MODES = ["single", "threaded", "pool", "evloop"]
+
+# name -> (paths, open-loop rate or 0 for closed loop, concurrency)
+PROFILES = {
+    "small-html": (["/html/page{}.html".format(i) for i in range(0, 200, 7)], 0, 32),
+    "medium-png": (["/png/img{}.png".format(i) for i in range(0, 40, 3)], 0, 16),
+    "large-pdf": (["/pdf/doc{}.pdf".format(i) for i in range(4)], 0, 4),
+    "dir-10k": (["/dir10k/"], 0, 4),
+    "mixed-open": (["/html/page1.html", "/html/page2.html", "/png/img1.png", "/html/page3.html",
+                    "/png/img2.png", "/html/page4.html", "/pdf/doc0.pdf", "/dir10k/"], 300, 64),
+}
+
+def make_docroot(root: Path, large_mb: int = 20) -> Path:
+    """Builds the benchmark docroot once; reruns reuse it."""
+    stamp = root / ".complete"
+    if stamp.exists(): return root
+    rnd = random.Random(42)
+    (root / "html").mkdir(parents=True, exist_ok=True)
+    for i in range(200):
+        body = "".join(f"<p>paragraph {j} of page {i}</p>\n" for j in range(rnd.randint(20, 80)))
+        (root / "html" / f"page{i}.html").write_text(f"<!doctype html><title>page {i}</title>\n{body}")
+    (root / "png").mkdir(exist_ok=True)
+    for i in range(40):
+        (root / "png" / f"img{i}.png").write_bytes(b"\x89PNG\r\n\x1a\n" + rnd.randbytes(rnd.randint(100, 300) * 1024))
+    (root / "pdf").mkdir(exist_ok=True)
+    for i in range(4):
+        (root / "pdf" / f"doc{i}.pdf").write_bytes(b"%PDF-1.4\n" + rnd.randbytes(large_mb * 1024 * 1024))
+    d = root / "dir10k"; d.mkdir(exist_ok=True)
+    for i in range(10_000):
+        (d / f"entry{i:05d}.html").write_bytes(b"<p>x</p>")
+    stamp.touch()
+    return root
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0)); return s.getsockname()[1]
+
+def wait_ready(port: int, proc: subprocess.Popen, timeout: float = 10.0) -> None:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5) as s:
+                s.sendall(b"GET /__health HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+                if s.recv(64).startswith(b"HTTP/1.1 200"): return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not become ready")
+
+def proc_usage(pid: int) -> dict:
+    """CPU seconds and RSS of pid and its children from /proc; empty where /proc is missing."""
+    pids, out = [pid], {"cpu_s": 0.0, "rss_mb": 0.0, "peak_rss_mb": 0.0}
+    try:
+        pids += [int(c) for c in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+        tick = os.sysconf("SC_CLK_TCK")
+        for p in pids:
+            stat = Path(f"/proc/{p}/stat").read_text().rsplit(")", 1)[1].split()
+            out["cpu_s"] += (int(stat[11]) + int(stat[12])) / tick
+            for line in Path(f"/proc/{p}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"): out["rss_mb"] += int(line.split()[1]) / 1024
+                if line.startswith("VmHWM:"): out["peak_rss_mb"] += int(line.split()[1]) / 1024
+    except (OSError, ValueError, AttributeError):
+        return {}
+    return {k: round(v, 2) for k, v in out.items()}
+
+def bench_mode(mode: str, docroot: Path, profiles: list, a) -> list:
+    port = free_port()
+    cmd = [sys.executable, str(LAB2 / "server.py"), "--mode", mode, "--port", str(port), "--host", "127.0.0.1",
+           "-d", str(docroot), "--delay", "0", "--rate", "0", *a.server_args]
+    proc = subprocess.Popen(cmd, cwd=LAB2, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    rows = []
+    try:
+        wait_ready(port, proc)
+        for name in profiles:
+            paths, rate, conc = PROFILES[name]
+            urls = [f"http://127.0.0.1:{port}{p}" for p in paths]
+            before = proc_usage(proc.pid)
+            r = asyncio.run(run_load(urls, rate, a.duration, conc, a.timeout, label=f"{mode}/{name}"))
+            after = proc_usage(proc.pid)
+            lat = r["latency_ms"]["all"]
+            row = {"mode": mode, "profile": name, "loop": r["loop"], "concurrency": conc, "rate": rate,
+                   "throughput_rps": r["throughput_rps"], "mb_per_s": r["mb_per_s"],
+                   "p50_ms": lat["p50"], "p90_ms": lat["p90"], "p99_ms": lat["p99"], "p999_ms": lat["p999"],
+                   "statuses": r["statuses"]}
+            if after:
+                row.update({"cpu_s": round(after["cpu_s"] - before.get("cpu_s", 0.0), 2),
+                            "rss_mb": after["rss_mb"], "peak_rss_mb": after["peak_rss_mb"]})
+            rows.append(row)
+            print(f"{mode:9} {name:11} {row['throughput_rps']:9.1f} req/s {row['mb_per_s']:8.2f} MB/s "
+                  f"p50 {row['p50_ms']:8.2f} p99 {row['p99_ms']:8.2f} ms  "
+                  f"cpu {row.get('cpu_s', '-')}s rss {row.get('rss_mb', '-')} MB", flush=True)
+    finally:
+        proc.terminate()
+        try: proc.wait(5)
+        except subprocess.TimeoutExpired: proc.kill()
+    return rows
+
+def regressions(rows: list, baseline: dict, tol: float) -> list:
+    base = {(r["mode"], r["profile"]): r for r in baseline.get("runs", [])}
+    out = []
+    for r in rows:
+        b = base.get((r["mode"], r["profile"]))
+        if not b: continue
+        if b["throughput_rps"] and r["throughput_rps"] < b["throughput_rps"] * (1 - tol):
+            out.append(f"{r['mode']}/{r['profile']}: throughput {b['throughput_rps']} -> {r['throughput_rps']} req/s")
+        # sub-millisecond p99 moves are noise on a loopback run
+        if r["p99_ms"] > max(b["p99_ms"] * (1 + tol), b["p99_ms"] + 1.0):
+            out.append(f"{r['mode']}/{r['profile']}: p99 {b['p99_ms']} -> {r['p99_ms']} ms")
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    ap.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    ap.add_argument("--duration", type=float, default=5.0, help="seconds per (mode, profile)")
+    ap.add_argument("--timeout", type=float, default=10.0, help="per-request timeout")
+    ap.add_argument("--docroot", default=os.path.join(tempfile.gettempdir(), "lab2-bench-docroot"))
+    ap.add_argument("--large-mb", type=int, default=20, help="size of each generated PDF")
+    ap.add_argument("--out", help="results file (default bench/results/<timestamp>.json)")
+    ap.add_argument("--baseline", default=str(HERE / "baseline.json"))
+    ap.add_argument("--save-baseline", action="store_true", help="also write this run to --baseline")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    ap.add_argument("--clean", action="store_true", help="regenerate the docroot")
+    ap.add_argument("server_args", nargs=argparse.REMAINDER, help="extra server.py flags after --")
+    a = ap.parse_args()
+    a.server_args = [x for x in a.server_args if x != "--"]
+    root = Path(a.docroot)
+    if a.clean and root.exists(): shutil.rmtree(root)
+    make_docroot(root, a.large_mb)
+    rows = []
+    for mode in a.modes:
+        rows += bench_mode(mode, root, a.profiles, a)
+    result = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": platform.node(),
+              "python": platform.python_version(), "cpus": os.cpu_count(), "duration": a.duration,
+              "server_args": a.server_args, "runs": rows}
+    out = Path(a.out) if a.out else HERE / "results" / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"results -> {out}")
+    if a.save_baseline:
+        Path(a.baseline).write_text(json.dumps(result, indent=2))
+        print(f"baseline -> {a.baseline}"); return
+    if os.path.exists(a.baseline):
+        bad = regressions(rows, json.loads(Path(a.baseline).read_text()), a.tolerance)
+        for line in bad: print(f"REGRESSION {line}")
+        if bad: sys.exit(1)
+        print(f"no regressions against {a.baseline} (tolerance {a.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,32 @@
-
-import socket, argparse, urllib.parse, os
+import socket, argparse, urllib.parse, os, sys, threading, queue, time
+from html.parser import HTMLParser
 CRLF="\r\n"
+CHUNK=64*1024
+MAX_HEAD=64*1024
 
 def request(host,port,path):
     if not path.startswith("/"): path="/"+path
     req=f"GET {path} HTTP/1.0{CRLF}Host: {host}{CRLF}Connection: close{CRLF}{CRLF}"
     s=socket.create_connection((host,port),timeout=10)
     s.sendall(req.encode("iso-8859-1"))
-    data=b""
+    chunks=[]
     while True:
-        chunk=s.recv(4096)
+        chunk=s.recv(CHUNK)
         if not chunk:break
-        data+=chunk
+        chunks.append(chunk)
     s.close()
-    head,body=data.split(b"\r\n\r\n",1)
-    headlines=head.decode(errors="ignore").split(CRLF)
+    head,body=b"".join(chunks).split(b"\r\n\r\n",1)
+    status,headers=parse_head(head)
+    return status,headers,body
+
+def parse_head(head):
+    headlines=head.decode("iso-8859-1").split(CRLF)
     status=int(headlines[0].split()[1])
     headers={}
     for l in headlines[1:]:
         if ":" in l:
             k,v=l.split(":",1);headers[k.strip().lower()]=v.strip()
-    return status,headers,body
+    return status,headers
 
 def save(body,outdir,filename):
     os.makedirs(outdir,exist_ok=True)
@@ -28,12 +34,299 @@ def save(body,outdir,filename):
     open(path,"wb").write(body)
     print(f"Saved to {path}")
 
+class HTTPStatusError(Exception):
+    """A response status that retrying will not change (404, 403, ...)."""
+
+class Conn:
+    """
+    One kept-alive HTTP/1.1 connection. get() returns the status and headers
+    as soon as the head has arrived; body() then streams the payload in
+    chunks, so nothing is held in memory beyond a single recv.
+    """
+    def __init__(self,host,port,timeout=10.0):
+        self.host,self.port,self.timeout=host,port,timeout
+        self.sock=None;self.buf=bytearray();self.keep=False
+        self.opened=self.requests=0
+
+    def _connect(self):
+        self.close()
+        self.sock=socket.create_connection((self.host,self.port),timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+        self.opened+=1
+
+    def close(self):
+        if self.sock:
+            try: self.sock.close()
+            except OSError: pass
+        self.sock=None;self.buf.clear()
+
+    def _fill(self):
+        chunk=self.sock.recv(CHUNK)
+        if not chunk: raise ConnectionError("connection closed by server")
+        self.buf+=chunk
+
+    def _line(self):
+        while (i:=self.buf.find(b"\r\n"))<0: self._fill()
+        line=bytes(self.buf[:i]);del self.buf[:i+2]
+        return line
+
+    def get(self,path,headers=None):
+        """Sends GET path; read the body with body() before the next get()."""
+        reused=self.sock is not None
+        if not reused: self._connect()
+        try:
+            return self._get(path,headers)
+        except ConnectionError:
+            if not reused: raise
+            # the server closed an idle kept-alive connection; GET is safe to resend
+            self._connect()
+            return self._get(path,headers)
+
+    def _get(self,path,headers):
+        lines=[f"GET {path} HTTP/1.1",f"Host: {self.host}:{self.port}"]
+        lines+=[f"{k}: {v}" for k,v in (headers or {}).items()]
+        self.sock.sendall((CRLF.join(lines)+CRLF+CRLF).encode("iso-8859-1"))
+        while (i:=self.buf.find(b"\r\n\r\n"))<0:
+            if len(self.buf)>MAX_HEAD: raise ConnectionError("response head too large")
+            self._fill()
+        head=bytes(self.buf[:i]);del self.buf[:i+4]
+        status,hd=parse_head(head)
+        tok=hd.get("connection","").lower()
+        self.keep="close" not in tok and (head.startswith(b"HTTP/1.1") or "keep-alive" in tok)
+        self.requests+=1
+        return status,hd
+
+    def body(self,status,hd):
+        """Yields the body of the response get() just returned."""
+        if status in (204,304):
+            pass
+        elif "chunked" in hd.get("transfer-encoding","").lower():
+            while size:=int(self._line().split(b";")[0],16):
+                while size:
+                    if not self.buf: self._fill()
+                    part=bytes(self.buf[:size]);del self.buf[:len(part)]
+                    size-=len(part);yield part
+                self._line()
+            while self._line(): pass  # trailers
+        elif "content-length" in hd:
+            left=int(hd["content-length"])
+            while left:
+                if self.buf:
+                    part=bytes(self.buf[:left]);del self.buf[:len(part)]
+                else:
+                    part=self.sock.recv(min(left,CHUNK))
+                    if not part: raise ConnectionError("connection closed mid-body")
+                left-=len(part);yield part
+        else:
+            # no framing: the body runs to EOF and the connection is spent
+            self.keep=False
+            if self.buf: yield bytes(self.buf);self.buf.clear()
+            while part:=self.sock.recv(CHUNK): yield part
+        if not self.keep: self.close()
+
+    def read(self,status,hd):
+        return b"".join(self.body(status,hd))
+
+class LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__();self.links=[]
+    def handle_starttag(self,tag,attrs):
+        if tag=="a":
+            href=dict(attrs).get("href")
+            if href: self.links.append(href)
+
+def canon(path):
+    """One spelling per path (%-quoted, query kept) so links to the same place dedupe and compare."""
+    p,_,q=path.partition("?")
+    p=urllib.parse.quote(urllib.parse.unquote(p if p.startswith("/") else "/"+p),safe="/")
+    return p+("?"+q if q else "")
+
+def listing_links(base,page,root):
+    """Directories (including ?page= views of one) and files linked from a listing, kept under root."""
+    p=LinkParser();p.feed(page.decode("utf-8","ignore"))
+    dirs,files=[],[]
+    for href in p.links:
+        u=urllib.parse.urlsplit(urllib.parse.urljoin(base,href))
+        if u.scheme or u.netloc: continue
+        path=canon(u.path)
+        if not path.startswith(root): continue
+        if path.endswith("/"):
+            dirs.append(path+("?"+u.query if u.query else ""))
+        else:
+            files.append(path)
+    return dirs,files
+
+def local_path(outdir,path,root):
+    """Where a crawled path lands: its location relative to the crawl root, never outside outdir."""
+    rel=urllib.parse.unquote(path[len(root):] if root else os.path.basename(path.rstrip("/"))).lstrip("/")
+    if not rel or path.endswith("/"): rel=os.path.join(rel,"index.html")
+    dest=os.path.abspath(os.path.join(outdir,rel))
+    if os.path.commonpath([dest,os.path.abspath(outdir)])!=os.path.abspath(outdir):
+        raise HTTPStatusError(f"refusing to write outside {outdir}: {path}")
+    return dest
+
+def download(conn,path,dest):
+    """
+    Streams path into dest via dest.part. A .part left by an earlier run or
+    attempt is resumed with Range (guarded by If-Range on the validator saved
+    next to it); a 200 instead of 206 means the server sent the whole file.
+    Returns (bytes received, bytes resumed).
+    """
+    part,meta=dest+".part",dest+".part.meta"
+    os.makedirs(os.path.dirname(dest) or ".",exist_ok=True)
+    have=os.path.getsize(part) if os.path.exists(part) else 0
+    hdrs={}
+    if have:
+        hdrs["Range"]=f"bytes={have}-"
+        if os.path.exists(meta):
+            with open(meta) as f: hdrs["If-Range"]=f.read().strip()
+    st,hd=conn.get(path,hdrs)
+    if st==416 and have:
+        conn.read(st,hd)
+        total=hd.get("content-range","").rpartition("/")[2]
+        if total.isdigit() and int(total)==have:
+            os.replace(part,dest)
+            if os.path.exists(meta): os.remove(meta)
+            return 0,have
+        os.remove(part)
+        raise ConnectionError("partial file no longer matches, restarting")
+    if st==206:
+        start=hd.get("content-range","").split()[-1].split("-")[0]
+        if not start.isdigit() or int(start)!=have:
+            conn.close()
+            raise HTTPStatusError(f"unexpected Content-Range {hd.get('content-range')!r}")
+        mode="ab"
+    elif st==200:
+        have,mode=0,"wb"
+        validator=hd.get("etag") or hd.get("last-modified")
+        if validator:
+            with open(meta,"w") as f: f.write(validator)
+    else:
+        conn.read(st,hd)
+        raise HTTPStatusError(f"{st}")
+    got=0
+    with open(part,mode) as f:
+        for chunk in conn.body(st,hd):
+            f.write(chunk);got+=len(chunk)
+    os.replace(part,dest)
+    if os.path.exists(meta): os.remove(meta)
+    return got,have
+
+class Batch:
+    """
+    Downloads many paths over a bounded pool of kept-alive connections: one
+    worker thread per connection pulls from a shared queue. With crawl on,
+    paths ending in / are fetched as listings and everything they link to
+    below the crawl root is queued as well.
+    """
+    def __init__(self,host,port,outdir,connections=4,retries=2,timeout=10.0,depth=8,overwrite=False):
+        self.host,self.port,self.outdir=host,port,outdir
+        self.connections,self.retries,self.timeout=max(1,connections),retries,timeout
+        self.depth,self.overwrite=depth,overwrite
+        self.q=queue.Queue();self.lock=threading.Lock();self.seen=set()
+        self.files=self.bytes=self.resumed=self.skipped=self.failed=self.listings=0
+        self.conns=[]
+
+    def add(self,path,root="",depth=0):
+        with self.lock:
+            if path in self.seen: return
+            self.seen.add(path)
+        self.q.put((path,root,depth))
+
+    def run(self):
+        t0=time.monotonic()
+        workers=[threading.Thread(target=self._worker,daemon=True) for _ in range(self.connections)]
+        for w in workers: w.start()
+        self.q.join()
+        for _ in workers: self.q.put(None)
+        for w in workers: w.join()
+        return time.monotonic()-t0
+
+    def _worker(self):
+        conn=Conn(self.host,self.port,self.timeout)
+        with self.lock: self.conns.append(conn)
+        while (item:=self.q.get()) is not None:
+            try: self._fetch(conn,*item)
+            finally: self.q.task_done()
+        conn.close()
+
+    def _fetch(self,conn,path,root,depth):
+        for attempt in range(self.retries+1):
+            try:
+                if path.split("?")[0].endswith("/") and root: self._crawl(conn,path,root,depth)
+                else: self._file(conn,path,root)
+                return
+            except HTTPStatusError as e:
+                err=e;break
+            except OSError as e:
+                err=e;conn.close()
+            except Exception as e:
+                # a malformed response (bad chunk size, Content-Length, listing) leaves the stream
+                # out of step; retrying would get the same answer, so drop the connection and move on
+                err=e;conn.close();break
+        with self.lock: self.failed+=1
+        print(f"[fail] {path}: {err}",flush=True)
+
+    def _crawl(self,conn,path,root,depth):
+        st,hd=conn.get(path)
+        page=conn.read(st,hd)
+        if st!=200 or "text/html" not in hd.get("content-type",""):
+            raise HTTPStatusError(f"{st} {hd.get('content-type','')}")
+        with self.lock: self.listings+=1
+        dirs,files=listing_links(path,page,root)
+        for f in files: self.add(f,root,depth)
+        for d in dirs:
+            # ?page=N views are the same directory; only real subdirectories go deeper
+            sub=d.split("?")[0]!=path.split("?")[0]
+            if not sub or depth<self.depth: self.add(d,root,depth+sub)
+
+    def _file(self,conn,path,root):
+        dest=local_path(self.outdir,path,root)
+        if os.path.exists(dest) and not self.overwrite:
+            with self.lock: self.skipped+=1
+            return
+        t0=time.monotonic()
+        got,have=download(conn,path,dest)
+        dt=max(time.monotonic()-t0,1e-6)
+        with self.lock:
+            self.files+=1;self.bytes+=got;self.resumed+=have
+        note=f" (resumed at {have} B)" if have else ""
+        print(f"[ok] {path} -> {dest}  {got} B in {dt:.2f}s, {got/dt/1e6:.2f} MB/s{note}",flush=True)
+
+    def report(self,elapsed):
+        reqs=sum(c.requests for c in self.conns);opened=sum(c.opened for c in self.conns)
+        print(f"{self.files} files, {self.bytes/1e6:.2f} MB in {elapsed:.2f}s = {self.bytes/max(elapsed,1e-6)/1e6:.2f} MB/s"
+              f" ({self.files/max(elapsed,1e-6):.1f} files/s)")
+        print(f"{self.listings} listings, {self.skipped} skipped, {self.failed} failed, "
+              f"{self.resumed/1e6:.2f} MB resumed from .part files")
+        print(f"{reqs} requests over {opened} connections ({self.connections} workers)")
+
 def main():
-    ap=argparse.ArgumentParser()
+    ap=argparse.ArgumentParser(description="Fetch one path, or with several paths / --crawl download them all concurrently.")
     ap.add_argument("host");ap.add_argument("port",type=int)
-    ap.add_argument("url");ap.add_argument("directory")
+    ap.add_argument("url",nargs="+",help="path(s) on the server, e.g. /FineSHYT/hahaanime.jpg or /FineSHYT/")
+    ap.add_argument("directory")
+    ap.add_argument("--urls-file",help="more paths, one per line (- for stdin)")
+    ap.add_argument("--crawl",action="store_true",help="follow directory listings for paths ending in /")
+    ap.add_argument("--depth",type=int,default=8,help="subdirectory levels to crawl")
+    ap.add_argument("-c","--connections",type=int,default=4,help="kept-alive connections / download workers")
+    ap.add_argument("--retries",type=int,default=2,help="attempts per file after a network error; each resumes the .part")
+    ap.add_argument("--timeout",type=float,default=10.0)
+    ap.add_argument("--overwrite",action="store_true",help="download files that already exist locally")
     a=ap.parse_args()
-    st,hd,body=request(a.host,a.port,a.url)
+    urls=list(a.url)
+    if a.urls_file:
+        f=sys.stdin if a.urls_file=="-" else open(a.urls_file)
+        urls+=[l.strip() for l in f if l.strip() and not l.startswith("#")]
+    urls=[canon(u) for u in urls]
+    if len(urls)>1 or a.crawl:
+        b=Batch(a.host,a.port,a.directory,a.connections,a.retries,a.timeout,a.depth,a.overwrite)
+        for u in urls:
+            # a crawled directory keeps its layout under directory/; single files land flat
+            b.add(u,u if a.crawl and u.endswith("/") else "")
+        b.report(b.run())
+        sys.exit(1 if b.failed else 0)
+    st,hd,body=request(a.host,a.port,a.url[0])
     print("Status",st)
     ctype=hd.get("content-type","")
     if st!=200:
@@ -41,8 +334,8 @@ def main():
     if "text/html" in ctype:
         print(body.decode("utf-8","ignore"))
     elif any(x in ctype for x in ["pdf","png","jpeg"]):
-        save(body,a.directory,a.url)
+        save(body,a.directory,a.url[0])
     else:
-        save(body,a.directory,a.url)
+        save(body,a.directory,a.url[0])
 
-if __name__=="__main__": main()
\ No newline at end of file
+if __name__=="__main__": main()
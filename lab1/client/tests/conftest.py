@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# client.py is run as a script, so it is imported as a top-level module
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
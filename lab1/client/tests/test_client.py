@@ -0,0 +1,66 @@
+import socket
+import threading
+from pathlib import Path
+
+import pytest
+
+from client import Batch
+
+RESPONSES = {
+    "/good.html": b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok",
+    "/chunked.html": b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\nnot hex\r\n0\r\n\r\n",
+    "/length.html": b"HTTP/1.1 200 OK\r\nContent-Length: many\r\n\r\nok",
+}
+
+
+@pytest.fixture
+def origin():
+    """A keep-alive server answering each path from RESPONSES, however malformed."""
+    srv = socket.create_server(("127.0.0.1", 0))
+
+    def conn_loop(c):
+        buf = b""
+        with c:
+            while True:
+                while b"\r\n\r\n" not in buf:
+                    data = c.recv(65536)
+                    if not data: return
+                    buf += data
+                head, _, buf = buf.partition(b"\r\n\r\n")
+                path = head.split(b" ")[1].decode()
+                c.sendall(RESPONSES.get(path, b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n"))
+
+    def accept_loop():
+        while True:
+            try:
+                c, _ = srv.accept()
+            except OSError:
+                return
+            threading.Thread(target=conn_loop, args=(c,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    yield srv.getsockname()[1]
+    srv.close()
+
+
+def run_batch(batch: Batch, timeout: float = 10.0) -> None:
+    t = threading.Thread(target=batch.run, daemon=True)
+    t.start()
+    t.join(timeout)
+    assert not t.is_alive(), "Batch.run() hung"
+
+
+def test_malformed_bodies_fail_their_path_and_keep_workers(origin, tmp_path: Path):
+    batch = Batch("127.0.0.1", origin, str(tmp_path), connections=1, retries=2, timeout=5.0)
+    for path in ("/chunked.html", "/length.html", "/good.html"):
+        batch.add(path)
+    run_batch(batch)
+    assert batch.failed == 2 and batch.files == 1   # the one worker survived both errors
+    assert (tmp_path / "good.html").read_bytes() == b"ok"
+
+
+def test_status_errors_are_not_retried(origin, tmp_path: Path):
+    batch = Batch("127.0.0.1", origin, str(tmp_path), connections=2, retries=3, timeout=5.0)
+    batch.add("/missing.html")
+    run_batch(batch)
+    assert batch.failed == 1 and sum(c.requests for c in batch.conns) == 1
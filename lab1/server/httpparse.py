@@ -0,0 +1,81 @@
+from typing import Dict, List, Tuple
+
+class HTTPError(Exception):
+    """A request we refuse to parse; code/reason are what the client should get back."""
+    def __init__(self, code: int, reason: str, message: str = ""):
+        super().__init__(message or reason)
+        self.code, self.reason = code, reason
+
+class RequestParser:
+    """
+    Incremental request-head parser for one connection.
+
+    Bytes are appended to a single bytearray; the search for the blank line
+    resumes where the previous call stopped instead of rescanning the buffer.
+    Anything after a complete head stays buffered for the next (pipelined)
+    request. Limits raise HTTPError: 431 for too many or too large headers,
+    414 for an oversized request line, 400 for malformed input.
+    """
+    def __init__(self, max_head: int = 64 * 1024, max_headers: int = 100, max_line: int = 8 * 1024):
+        self.buf = bytearray()
+        self.max_head, self.max_headers, self.max_line = max_head, max_headers, max_line
+        self._scan = 0
+
+    def feed(self, data) -> None:
+        self.buf += data
+
+    def __len__(self) -> int:
+        return len(self.buf)
+
+    def next(self) -> Tuple[str, Dict[str, str]] | None:
+        """Pops one parsed (request line, headers) off the buffer, or None if the head is incomplete."""
+        buf = self.buf
+        if not buf:
+            return None
+        n = len(buf)
+        if not self._scan and n <= self.max_head and buf.endswith(b"\r\n\r\n"):
+            # fast path: the buffer is exactly one complete head, as when one recv() got a whole
+            # small request; a blank line inside means pipelining or stray CRLFs, handled below
+            lines = buf.decode("iso-8859-1").split("\r\n")
+            del lines[-2:]
+            if "" not in lines:
+                buf.clear()
+                return self._parse(lines, n - 4)
+        # skip stray CRLFs between pipelined requests (RFC 9112 2.2)
+        while buf.startswith(b"\r\n"):
+            del buf[:2]
+        end = buf.find(b"\r\n\r\n", max(0, self._scan - 3))
+        if end < 0:
+            self._scan = len(buf)
+            if len(buf) > self.max_head:
+                raise HTTPError(431, "Request Header Fields Too Large")
+            nl = buf.find(b"\r\n", 0, self.max_line + 2)
+            if nl < 0 and len(buf) > self.max_line:
+                raise HTTPError(414, "URI Too Long")
+            return None
+        self._scan = 0
+        if end + 4 > self.max_head:
+            raise HTTPError(431, "Request Header Fields Too Large")
+        # one decode + C-level split beats walking the head line by line in Python
+        lines = buf[:end].decode("iso-8859-1").split("\r\n")
+        del buf[:end + 4]
+        return self._parse(lines, end)
+
+    def _parse(self, lines: List[str], size: int) -> Tuple[str, Dict[str, str]]:
+        reqline = lines[0]
+        if len(reqline) > self.max_line:
+            raise HTTPError(414, "URI Too Long")
+        parts = reqline.split(" ")
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise HTTPError(400, "Bad Request", "Malformed request line")
+        # no line can be over max_line when the whole head is not
+        if len(lines) - 1 > self.max_headers or (size > self.max_line and max(map(len, lines)) > self.max_line):
+            raise HTTPError(431, "Request Header Fields Too Large")
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            k, sep, v = line.partition(":")
+            if not sep or k[-1:] in " \t":   # "" is in any string: an empty name fails too
+                raise HTTPError(400, "Bad Request", "Malformed header line")
+            k = k.lower(); v = v.strip()
+            headers[k] = f"{headers[k]}, {v}" if k in headers else v
+        return reqline, headers
@@ -0,0 +1,76 @@
+import threading, time
+from collections import OrderedDict
+from typing import Tuple
+
+# slack for float error: burst * interval summed step by step lands a hair above tau
+EPSILON = 1e-6
+
+def gcra_step(tat: float, now: float, interval: float, tau: float) -> Tuple[float, Tuple[bool, float, float]]:
+    """
+    One GCRA decision. tat is the key's theoretical arrival time, interval is
+    1/rate and tau = burst * interval. Returns (tat to store, (allowed,
+    remaining tokens, reset-or-wait seconds)), the same triple TokenBucket
+    used to return.
+    """
+    tat = max(tat, now)
+    new_tat = tat + interval
+    backlog = new_tat - now
+    if backlog > tau + EPSILON:
+        tokens = (tau - (tat - now)) / interval
+        return tat, (False, max(0.0, tokens), backlog - tau)
+    tokens = max(0.0, (tau - backlog) / interval)
+    return new_tat, (True, tokens, max(0.0, (1.0 - tokens) * interval))
+
+class RateLimiter:
+    """
+    Bounded per-IP rate limiter.
+
+    Each key costs one float (its GCRA TAT) in an LRU-ordered dict; keys are
+    spread over `shards` dicts with their own locks. A key whose bucket has
+    been full again for `ttl` seconds is indistinguishable from a new one, so
+    it is dropped; when a shard is still over its share of `max_keys` the
+    least recently seen key is evicted.
+    """
+    ALLOWED, DENIED, EXPIRED, EVICTED = range(4)
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100_000, shards: int = 16, ttl: float = 0.0):
+        self.rate, self.burst = float(rate), int(max(1, burst))
+        self.interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        self.tau = self.interval * self.burst
+        self.ttl = float(max(0.0, ttl))
+        self.max_keys = int(max(1, max_keys))
+        self.per_shard = max(1, self.max_keys // max(1, shards))
+        self._shards = [(threading.Lock(), OrderedDict(), [0, 0, 0, 0]) for _ in range(max(1, shards))]
+
+    def allow(self, key: str) -> Tuple[bool, float, float]:
+        if self.rate <= 0:
+            return True, 0.0, 0.0
+        now = time.monotonic()
+        lock, table, st = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            tat, res = gcra_step(table.get(key, now), now, self.interval, self.tau)
+            table[key] = tat
+            table.move_to_end(key)
+            st[self.ALLOWED if res[0] else self.DENIED] += 1
+            # amortized expiry from the cold end, then the hard cap
+            for _ in range(4):
+                k, t = next(iter(table.items()))
+                if t + self.ttl > now or k == key: break
+                del table[k]; st[self.EXPIRED] += 1
+            while len(table) > self.per_shard:
+                table.popitem(last=False); st[self.EVICTED] += 1
+        return res
+
+    def __len__(self) -> int:
+        return sum(len(t) for _, t, _ in self._shards)
+
+    def stats(self) -> dict:
+        tot = [0, 0, 0, 0]
+        active = 0
+        for lock, table, st in self._shards:
+            with lock:
+                active += len(table)
+                tot = [a + b for a, b in zip(tot, st)]
+        return {"active_buckets": active, "max_buckets": self.max_keys, "shards": len(self._shards),
+                "allowed": tot[self.ALLOWED], "denied": tot[self.DENIED],
+                "expired": tot[self.EXPIRED], "evicted": tot[self.EVICTED]}
@@ -1,39 +1,21 @@
 
-import argparse, os, socket, threading, time, urllib.parse, email.utils
+import argparse, itertools, os, socket, threading, time, urllib.parse, email.utils
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, Iterator, Tuple
+from ratelimit import RateLimiter
+from httpparse import RequestParser, HTTPError
 
 CRLF = "\r\n"
 SERVER_NAME = "CN-Lab-HTTP/1.0"
 ALLOWED = {"text/html; charset=utf-8", "image/png", "application/pdf", "image/jpeg"}
 
 
-class TokenBucket:
-    def __init__(self, rate: float, burst: int):
-        self.rate = float(rate)
-        self.burst = int(max(1, burst))
-        self.tokens = float(self.burst)
-        self.last = time.monotonic()
-
-    def allow(self) -> Tuple[bool, float]:
-        now = time.monotonic()
-        elapsed = max(0.0, now - self.last)
-        self.last = now
-        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
-        if self.tokens >= 1.0:
-            self.tokens -= 1.0
-            return True, 0.0
-        need = 1.0 - self.tokens
-        wait = need / self.rate if self.rate > 0 else 1.0
-        return False, max(0.0, wait)
-
-
 def http_date(ts: float | None = None) -> str:
     return email.utils.formatdate(ts if ts is not None else None, usegmt=True)
 
 def start_line(code: int, reason: str) -> bytes:
-    return f"HTTP/1.0 {code} {reason}{CRLF}".encode("iso-8859-1")
+    return f"HTTP/1.1 {code} {reason}{CRLF}".encode("iso-8859-1")
 
 def send_headers(conn: socket.socket, headers: Dict[str, str]) -> None:
     for k, v in headers.items():
@@ -49,6 +31,31 @@ def guess_mime(p: Path) -> str:
     return "application/octet-stream"
 
 
+def parse_range(value: str, size: int) -> Tuple[int, int] | None:
+    """
+    Parses a single-range "bytes=a-b" header into an inclusive (start, end).
+    Returns None for anything we choose to ignore (multi-range, other units),
+    raises ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    first, last = first.strip(), last.strip()
+    # anything but digits (signs, a second dash, "bytes=-") is a malformed range and ignored
+    if not dash or not (first + last).isdecimal():
+        return None
+    if first == "":
+        n = int(last)
+        if n == 0 or size == 0: raise ValueError("empty suffix range")
+        return max(0, size - n), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
 def fmt_size(n: int) -> str:
     for u in ("B","KB","MB","GB","TB"):
         if n < 1024: return f"{n:.0f} {u}"
@@ -66,43 +73,96 @@ def breadcrumb(root: Path, here: Path) -> str:
         crumbs.append(f'<a href="{href}">{p}/</a>')
     return " ".join(crumbs)
 
-def listing_html(root: Path, here: Path) -> bytes:
-    rows = []
-    if here != root:
-        rows.append('<tr><td>📁</td><td><a href="../">Parent directory/</a></td><td>-</td><td>-</td></tr>')
-    for entry in sorted(here.iterdir(), key=lambda x: (x.is_file(), x.name.lower())):
-        name = entry.name + ("/" if entry.is_dir() else "")
-        href = urllib.parse.quote(name)
-        st = entry.stat()
-        size = "-" if entry.is_dir() else fmt_size(st.st_size)
-        mtime = datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M")
-        icon = "📁" if entry.is_dir() else ("🖼️" if entry.suffix.lower() in {".png",".jpg",".jpeg"} else "📄")
-        rows.append(f"<tr><td>{icon}</td><td><a href=\"{href}\">{name}</a></td><td>{size}</td><td>{mtime}</td></tr>")
-
-    html = f"""<!doctype html>
+LISTING_FLUSH = 32 * 1024  # rendered rows per chunk of a streamed listing, in characters
+
+LISTING_HEAD = """<!doctype html>
 <html><head><meta charset="utf-8"><title>Index of {here}</title>
 <style>body{{font-family:system-ui,Segoe UI,Roboto; padding:24px}}
 table{{border-collapse:collapse; width:100%}} th,td{{padding:8px 10px; border-bottom:1px solid #e5e7eb; text-align:left}}
 th{{background:#f3f4f6}}</style></head>
 <body>
-<h2>Index of {breadcrumb(root, here)}</h2>
+<h2>Index of {crumbs}</h2>
 <table>
 <thead><tr><th></th><th>Name</th><th>Size</th><th>Last modified</th></tr></thead>
-<tbody>{''.join(rows)}</tbody></table>
+<tbody>"""
+LISTING_TAIL = """</tbody></table>
 </body></html>"""
-    return html.encode()
+
+def listing_row(name: str, is_dir: bool, dir_fd: int) -> str | None:
+    try:
+        st = os.stat(name, dir_fd=dir_fd)
+    except FileNotFoundError:  # removed since the scan
+        return None
+    name += "/" if is_dir else ""
+    href = urllib.parse.quote(name)
+    size = "-" if is_dir else fmt_size(st.st_size)
+    mtime = datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M")
+    icon = "📁" if is_dir else ("🖼️" if os.path.splitext(name)[1].lower() in {".png",".jpg",".jpeg"} else "📄")
+    return f"<tr><td>{icon}</td><td><a href=\"{href}\">{name}</a></td><td>{size}</td><td>{mtime}</td></tr>"
+
+def listing_chunks(root: Path, here: Path) -> Iterator[bytes]:
+    """
+    The listing page as a stream of chunks of about LISTING_FLUSH characters.
+    os.scandir answers is_dir()/is_file() from the directory entry itself, so
+    the scan and the sort need no stat() and keep only small name tuples; the
+    one stat() a row needs (size, mtime) happens when its chunk is rendered.
+    Nothing but the name list grows with the directory.
+    """
+    fd = os.open(here, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    try:
+        with os.scandir(fd) as it:
+            names = sorted((e.is_file(), e.name.lower(), e.name, e.is_dir()) for e in it)
+        yield LISTING_HEAD.format(here=here, crumbs=breadcrumb(root, here)).encode()
+        rows, n = [], 0
+        if here != root:
+            rows.append('<tr><td>📁</td><td><a href="../">Parent directory/</a></td><td>-</td><td>-</td></tr>')
+        for _, _, name, is_dir in names:
+            row = listing_row(name, is_dir, fd)
+            if row is None: continue
+            rows.append(row); n += len(row)
+            if n >= LISTING_FLUSH:
+                yield "".join(rows).encode()
+                rows.clear(); n = 0
+        rows.append(LISTING_TAIL)
+        yield "".join(rows).encode()
+    finally:
+        os.close(fd)
+
+def wants_keep_alive(reqline: str, headers: Dict[str, str]) -> bool:
+    tok = headers.get("connection", "").lower()
+    if "close" in tok: return False
+    # we never read request bodies, so a body would desync the next request
+    if headers.get("content-length", "0") not in ("", "0") or "transfer-encoding" in headers:
+        return False
+    if reqline.rsplit(" ", 1)[-1].upper() == "HTTP/1.1": return True
+    return "keep-alive" in tok
+
+
+class ClientConn:
+    """A client socket plus keep-alive state: the request parser (holding pipelined bytes), requests served."""
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.parser = RequestParser()
+        self.keep_alive = False
+        self.http11 = False
+        self.served = 0
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
 
 
 class HTTPServer:
-    def __init__(self, host: str, port: int, docroot: Path, mode: str, rate: float, burst: int, race_mode: bool):
+    def __init__(self, host: str, port: int, docroot: Path, mode: str, rate: float, burst: int, race_mode: bool,
+                 keepalive_timeout: float = 5.0, max_requests: int = 100, max_buckets: int = 100_000):
         self.host, self.port, self.docroot = host, port, docroot.resolve()
         self.mode, self.rate, self.burst = mode, float(max(0.0, rate)), int(max(1, burst))
         self.sock: socket.socket | None = None
         self._hits = 0
         self._hit_lock = threading.Lock()
-        self._buckets: Dict[str, TokenBucket] = {}
-        self._buckets_lock = threading.Lock()
+        self.limiter = RateLimiter(self.rate, self.burst, max_keys=max_buckets)
         self.race_mode = bool(race_mode)
+        self.keepalive_timeout = float(max(0.1, keepalive_timeout))
+        self.max_requests = int(max(1, max_requests))
 
     # hit counter (racy if --race)
     def inc_hit(self):
@@ -117,13 +177,8 @@ class HTTPServer:
             return self._hits
 
     def check_rate(self, ip: str) -> Tuple[bool, float]:
-        if self.rate <= 0:
-            return True, 0.0
-        with self._buckets_lock:
-            b = self._buckets.get(ip)
-            if b is None:
-                b = self._buckets[ip] = TokenBucket(self.rate, self.burst)
-        return b.allow()
+        allowed, _, wait = self.limiter.allow(ip)
+        return allowed, (0.0 if allowed else wait)
 
     def start(self):
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -144,7 +199,7 @@ class HTTPServer:
         while True:
             conn, addr = self.sock.accept()
             try:
-                self._handle(conn, addr)
+                self._handle(ClientConn(conn), addr)
             finally:
                 try: conn.close()
                 except: pass
@@ -157,29 +212,52 @@ class HTTPServer:
 
     def _thread_wrapper(self, conn, addr):
         try:
-            self._handle(conn, addr)
+            self._handle(ClientConn(conn), addr)
         finally:
             try: conn.close()
             except: pass
 
-    def _read_request(self, conn) -> Tuple[str, Dict[str, str]]:
-        data = b""
-        while CRLF.encode()*2 not in data:
-            chunk = conn.recv(4096)
-            if not chunk: break
-            data += chunk
-            if len(data) > 64*1024: break
-        txt = data.decode("iso-8859-1", errors="replace")
-        lines = txt.split(CRLF)
-        if not lines or not lines[0]: return "", {}
-        reqline = lines[0]; headers = {}
-        for line in lines[1:]:
-            if not line: break
-            if ":" in line:
-                k,v = line.split(":",1); headers[k.strip().lower()] = v.strip()
-        return reqline, headers
-
-    def _handle(self, conn: socket.socket, addr):
+    def _read_request(self, conn: ClientConn, timeout: float = 5.0) -> Tuple[str, Dict[str, str]]:
+        """Next request head on conn; ("", {}) on EOF or idle timeout. Raises HTTPError on bad input."""
+        conn.settimeout(timeout)
+        parser = conn.parser
+        while True:
+            req = parser.next()
+            if req: return req
+            try:
+                chunk = conn.recv(65536)
+            except (socket.timeout, ConnectionError):
+                return "", {}
+            if not chunk: return "", {}
+            parser.feed(chunk)
+
+    def _conn_headers(self, conn) -> Dict[str, str]:
+        if not getattr(conn, "keep_alive", False):
+            return {"Connection": "close"}
+        left = self.max_requests - conn.served - 1
+        return {"Connection": "keep-alive",
+                "Keep-Alive": f"timeout={int(self.keepalive_timeout)}, max={left}"}
+
+    def _handle(self, conn: ClientConn, addr):
+        timeout = 5.0
+        while True:
+            try:
+                reqline, headers = self._read_request(conn, timeout)
+            except HTTPError as e:
+                conn.keep_alive = False
+                self._send_simple(conn, e.code, e.reason, str(e).encode()); return
+            if not reqline: return
+            # in single mode an idle kept-alive client would block the accept loop for everyone else,
+            # so the connection only stays open for requests already pipelined into the buffer
+            conn.keep_alive = (wants_keep_alive(reqline, headers) and conn.served + 1 < self.max_requests
+                               and (self.mode != "single" or len(conn.parser) > 0))
+            conn.http11 = reqline.rsplit(" ", 1)[-1].upper() == "HTTP/1.1"
+            self._handle_request(conn, addr, reqline, headers)
+            conn.served += 1
+            if not conn.keep_alive: return
+            timeout = self.keepalive_timeout
+
+    def _handle_request(self, conn: ClientConn, addr, reqline: str, headers: Dict[str, str]):
         ip, _ = addr
         allowed, wait = self.check_rate(ip)
         if not allowed:
@@ -190,24 +268,23 @@ class HTTPServer:
 
         self.inc_hit()
 
-        reqline, _ = self._read_request(conn)
-        if not reqline: return
         try:
             method, target, _ = reqline.split()
         except ValueError:
+            conn.keep_alive = False
             self._send_simple(conn, 400, "Bad Request", b"Malformed request line"); return
 
-        if method != "GET":
-            self._send_simple(conn, 405, "Method Not Allowed", b"Only GET", {"Allow":"GET"}); return
+        if method not in ("GET", "HEAD"):
+            self._send_simple(conn, 405, "Method Not Allowed", b"Only GET/HEAD", {"Allow":"GET, HEAD"}); return
 
         if target == "/__counter":
             self._send_simple(conn, 200, "OK", f"hits={self.hits()}\n".encode(),
                               {"Content-Type":"text/plain; charset=utf-8"})
             return
 
-        self._serve_path(conn, target)
+        self._serve_path(conn, target, method, headers)
 
-    def _serve_path(self, conn, target: str):
+    def _serve_path(self, conn, target: str, method: str = "GET", req_headers: Dict[str, str] | None = None):
         parsed = urllib.parse.urlsplit(target)
         path = urllib.parse.unquote(parsed.path)
         if not path.startswith("/"): path = "/" + path
@@ -222,14 +299,14 @@ class HTTPServer:
                     # add trailing slash
                     headers = {"Date": http_date(None), "Server": SERVER_NAME,
                                "Location": urllib.parse.quote(path + "/"),
-                               "Connection": "close", "Content-Length":"0"}
+                               "Content-Length":"0", **self._conn_headers(conn)}
                     conn.sendall(start_line(301,"Moved Permanently"))
                     send_headers(conn, headers); return
                 idx = fs / "index.html"
                 if idx.exists() and idx.is_file():
-                    self._send_file(conn, idx, "text/html; charset=utf-8")
+                    self._send_file(conn, idx, "text/html; charset=utf-8", method, req_headers)
                 else:
-                    self._send_simple(conn, 200, "OK", listing_html(self.docroot, fs),
+                    self._send_stream(conn, 200, "OK", listing_chunks(self.docroot, fs), method,
                                       {"Content-Type":"text/html; charset=utf-8"})
                 return
 
@@ -239,42 +316,90 @@ class HTTPServer:
             ctype = guess_mime(fs)
             if ctype not in ALLOWED:
                 self._send_simple(conn, 404, "Not Found", b"Unknown file type"); return
-            self._send_file(conn, fs, ctype)
+            self._send_file(conn, fs, ctype, method, req_headers)
         except PermissionError:
             self._send_simple(conn, 403, "Forbidden", b"Forbidden")
         except Exception as e:
             self._send_simple(conn, 500, "Internal Server Error", str(e).encode())
 
-    def _send_file(self, conn, path: Path, ctype: str):
-        body = path.read_bytes()
-        conn.sendall(start_line(200,"OK"))
-        send_headers(conn, {
+    def _send_file(self, conn, path: Path, ctype: str, method: str = "GET", req_headers: Dict[str, str] | None = None):
+        st = path.stat()
+        size = st.st_size
+        code, reason, start, length = 200, "OK", 0, size
+        headers = {
+            "Date": http_date(None), "Server": SERVER_NAME,
+            "Content-Type": ctype, "Accept-Ranges": "bytes",
+            "Last-Modified": http_date(st.st_mtime),
+        }
+        rng = (req_headers or {}).get("range")
+        if rng:
+            try:
+                span = parse_range(rng, size)
+            except ValueError:
+                self._send_simple(conn, 416, "Range Not Satisfiable", b"Range not satisfiable",
+                                  {"Content-Range": f"bytes */{size}"}); return
+            if span:
+                start, end = span
+                code, reason, length = 206, "Partial Content", end - start + 1
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(length)
+        headers.update(self._conn_headers(conn))
+        conn.sendall(start_line(code, reason))
+        send_headers(conn, headers)
+        if method != "HEAD" and length:
+            # socket.sendfile uses os.sendfile where available, chunked send() otherwise
+            with path.open("rb") as f:
+                conn.sendfile(f, start, length)
+
+    def _send_stream(self, conn, code, reason, chunks: Iterator[bytes], method: str = "GET",
+                     extra: Dict[str,str]|None=None):
+        """
+        Sends a body of unknown length as it is produced: chunked to HTTP/1.1
+        clients, delimited by closing the connection for HTTP/1.0 ones. The
+        first chunk is pulled before the status line so that errors opening
+        the source still get a normal error response.
+        """
+        first = next(chunks)
+        if not conn.http11: conn.keep_alive = False
+        headers = {
             "Date": http_date(None), "Server": SERVER_NAME,
-            "Content-Type": ctype, "Content-Length": str(len(body)),
-            "Last-Modified": http_date(path.stat().st_mtime),
-            "Connection": "close",
-        })
-        conn.sendall(body)
+            "Content-Type": "text/plain; charset=utf-8", **self._conn_headers(conn),
+        }
+        if conn.http11: headers["Transfer-Encoding"] = "chunked"
+        if extra: headers.update(extra)
+        conn.sendall(start_line(code, reason))
+        send_headers(conn, headers)
+        if method == "HEAD": return
+        try:
+            for data in itertools.chain((first,), chunks):
+                if data: conn.sendall(b"%x\r\n%s\r\n" % (len(data), data) if conn.http11 else data)
+            if conn.http11: conn.sendall(b"0\r\n\r\n")
+        except Exception:
+            # too late for an error status; a body without its last chunk tells the client
+            conn.keep_alive = False
 
     def _send_simple(self, conn, code, reason, body: bytes, extra: Dict[str,str]|None=None):
         conn.sendall(start_line(code, reason))
         headers = {
             "Date": http_date(None), "Server": SERVER_NAME,
             "Content-Type": "text/plain; charset=utf-8",
-            "Content-Length": str(len(body)), "Connection":"close",
+            "Content-Length": str(len(body)), **self._conn_headers(conn),
         }
         if extra: headers.update(extra)
         send_headers(conn, headers); conn.sendall(body)
 
 def parse_args():
-    p = argparse.ArgumentParser(description="HTTP/1.0 file server")
+    p = argparse.ArgumentParser(description="HTTP/1.1 file server")
     p.add_argument("-H","--host", default="0.0.0.0")
     p.add_argument("-p","--port", type=int, default=1337)
     p.add_argument("-d","--docroot", default="/app/content")
     p.add_argument("--mode", choices=["single","threaded"], default="single")
     p.add_argument("--rate", type=float, default=0.0, help="per-IP requests/sec (0 = unlimited)")
     p.add_argument("--burst", type=int, default=5, help="token bucket size")
+    p.add_argument("--max-buckets", type=int, default=100_000, help="cap on tracked client IPs")
     p.add_argument("--race", action="store_true", help="make /__counter increments racy (no lock)")
+    p.add_argument("--keepalive-timeout", type=float, default=5.0, help="idle seconds before a kept-alive connection is closed")
+    p.add_argument("--max-requests", type=int, default=100, help="requests served per connection before closing")
     return p.parse_args()
 
 def main():
@@ -282,7 +407,9 @@ def main():
     root = Path(a.docroot)
     if not root.exists() or not root.is_dir():
         raise SystemExit(f"Docroot missing: {root}")
-    HTTPServer(a.host, a.port, root, a.mode, a.rate, a.burst, a.race).start()
+    HTTPServer(a.host, a.port, root, a.mode, a.rate, a.burst, a.race,
+               keepalive_timeout=a.keepalive_timeout, max_requests=a.max_requests,
+               max_buckets=a.max_buckets).start()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
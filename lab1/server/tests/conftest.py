@@ -0,0 +1,37 @@
+import socket
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# server.py imports its neighbours as top-level modules, as when it is run directly
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def serve():
+    """Runs an HTTPServer's accept loop in a thread; returns its port. Closing the socket ends it."""
+    started = []
+
+    def run(srv):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(("127.0.0.1", 0)); s.listen(50)
+        srv.sock = s
+
+        def loop():
+            try:
+                getattr(srv, f"_serve_{srv.mode}")()
+            except OSError:
+                pass
+
+        t = threading.Thread(target=loop, daemon=True)
+        t.start()
+        started.append((s, t))
+        return s.getsockname()[1]
+
+    yield run
+    for s, t in started:
+        s.shutdown(socket.SHUT_RDWR)
+        s.close()
+        t.join(5)
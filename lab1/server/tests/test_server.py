@@ -0,0 +1,121 @@
+import socket
+import time
+from pathlib import Path
+
+import pytest
+
+from server import HTTPServer, parse_range
+
+
+class Client:
+    """One connection; responses are read through a buffered file, so pipelined ones stay queued."""
+
+    def __init__(self, port: int):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        self.f = self.sock.makefile("rb")
+
+    def send(self, path: str = "/a.html", keep_alive: bool = True, times: int = 1, **headers: str) -> None:
+        conn = "keep-alive" if keep_alive else "close"
+        extra = "".join(f"{k.replace('_', '-')}: {v}\r\n" for k, v in headers.items())
+        self.sock.sendall(f"GET {path} HTTP/1.1\r\nHost: x\r\nConnection: {conn}\r\n{extra}\r\n".encode() * times)
+
+    def response(self) -> bytes:
+        """Status line and headers of the next response; the body is kept in self.body."""
+        head = b""
+        while not head.endswith(b"\r\n\r\n"):
+            line = self.f.readline()
+            assert line, "connection closed"
+            head += line
+        length = [l for l in head.split(b"\r\n") if l.lower().startswith(b"content-length:")]
+        self.body = self.f.read(int(length[0].split(b":")[1])) if length else b""
+        return head
+
+    def header(self, head: bytes, name: str) -> str:
+        return next(l.split(b":", 1)[1].strip().decode() for l in head.split(b"\r\n")
+                    if l.lower().startswith(name.lower().encode() + b":"))
+
+    def close(self) -> None:
+        self.f.close(); self.sock.close()
+
+
+def test_single_mode_does_not_wait_on_idle_keep_alive(tmp_path: Path, serve):
+    (tmp_path / "a.html").write_text("hi")
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "single", 0.0, 1, False, keepalive_timeout=5.0))
+    idle = Client(port)
+    idle.send()
+    assert b"Connection: close" in idle.response()
+    t = time.monotonic()
+    other = Client(port)
+    other.send()
+    assert other.response().startswith(b"HTTP/1.1 200")
+    assert time.monotonic() - t < 1.0
+    idle.close(); other.close()
+
+
+def test_single_mode_still_answers_pipelined_requests(tmp_path: Path, serve):
+    (tmp_path / "a.html").write_text("hi")
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "single", 0.0, 1, False))
+    c = Client(port)
+    c.send(times=2)
+    first, second = c.response(), c.response()
+    assert b"Connection: keep-alive" in first and b"Connection: close" in second
+    c.close()
+
+
+@pytest.mark.parametrize("value, span", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=0-0", (0, 0)),
+    ("Bytes = 5-6", (5, 6)),
+    ("bytes=90-", (90, 99)),           # open-ended
+    ("bytes=50-500", (50, 99)),        # end clamped to the file
+    ("bytes=-10", (90, 99)),           # suffix
+    ("bytes=-500", (0, 99)),           # suffix longer than the file
+    ("bytes=0-1,5-6", None),           # multi-range: served whole
+    ("items=0-9", None),
+    ("bytes=", None),
+    ("bytes=-", None),
+    ("bytes=5", None),
+    ("bytes=a-b", None),
+    ("bytes=+1-5", None),
+    ("bytes=--5", None),
+    ("bytes=5--1", None),
+])
+def test_parse_range(value, span):
+    assert parse_range(value, 100) == span
+
+
+@pytest.mark.parametrize("value, size", [
+    ("bytes=10-5", 100),               # start > end
+    ("bytes=100-", 100),               # start == size
+    ("bytes=150-200", 100),
+    ("bytes=-0", 100),
+    ("bytes=0-", 0),
+    ("bytes=-5", 0),
+])
+def test_parse_range_unsatisfiable(value, size):
+    with pytest.raises(ValueError):
+        parse_range(value, size)
+
+
+def test_range_responses(tmp_path: Path, serve):
+    data = bytes(range(100))
+    (tmp_path / "a.pdf").write_bytes(data)
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "threaded", 0.0, 1, False))
+    c = Client(port)
+    for rng, body, content_range in (("bytes=10-19", data[10:20], "bytes 10-19/100"),
+                                     ("bytes=-5", data[95:], "bytes 95-99/100"),
+                                     ("bytes=98-", data[98:], "bytes 98-99/100")):
+        c.send("/a.pdf", Range=rng)
+        head = c.response()
+        assert head.startswith(b"HTTP/1.1 206") and c.body == body
+        assert c.header(head, "Content-Range") == content_range
+    for rng in ("bytes=0-1,5-6", "lines=1-2", "bytes=x-"):
+        c.send("/a.pdf", Range=rng)
+        head = c.response()
+        assert head.startswith(b"HTTP/1.1 200") and c.body == data and b"Content-Range" not in head
+    c.send("/a.pdf", Range="bytes=100-")
+    head = c.response()
+    assert head.startswith(b"HTTP/1.1 416") and c.header(head, "Content-Range") == "bytes */100"
+    c.send("/a.pdf")
+    assert c.response().startswith(b"HTTP/1.1 200")   # the 416 kept the connection usable
+    c.close()
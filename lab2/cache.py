@@ -0,0 +1,425 @@
+import ctypes, ctypes.util, gzip, os, stat, struct, threading, time, urllib.parse, zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is produced on the fly
+    brotli = None
+
+CODINGS = ("br", "gzip") if brotli else ("gzip",)  # what compress() can produce, best first
+
+class Inotify:
+    """
+    Minimal ctypes inotify(7) watcher. Calls on_change(path) for a changed entry
+    of a watched dir, or on_change(dir + os.sep) when the dir itself goes away.
+    """
+    MASK = (0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200 | 0x400 | 0x800)  # modify/attrib/close_write/moves/create/delete/self
+    IN_IGNORED = 0x8000
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, on_change: Callable[[str], None] | None = None):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._subs: list[Callable[[str], None]] = [on_change] if on_change else []
+        self._dirs: Dict[str, int] = {}
+        self._wds: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True, name="inotify").start()
+
+    def subscribe(self, on_change: Callable[[str], None]) -> None:
+        self._subs.append(on_change)
+
+    def watch(self, directory: str) -> None:
+        with self._lock:
+            if directory in self._dirs: return
+            wd = self._libc.inotify_add_watch(self.fd, directory.encode(), self.MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch {directory}")
+            self._dirs[directory] = wd; self._wds[wd] = directory
+
+    def _run(self):
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except OSError:
+                return
+            off = 0
+            while off + self.EVENT.size <= len(data):
+                wd, mask, _, nlen = self.EVENT.unpack_from(data, off)
+                name = data[off + self.EVENT.size: off + self.EVENT.size + nlen].rstrip(b"\0").decode(errors="surrogateescape")
+                off += self.EVENT.size + nlen
+                with self._lock:
+                    directory = self._wds.get(wd)
+                    if directory is not None and mask & self.IN_IGNORED:
+                        del self._wds[wd]; self._dirs.pop(directory, None)
+                if directory is None: continue
+                changed = os.path.join(directory, name) if name else directory.rstrip(os.sep) + os.sep
+                for cb in self._subs:
+                    cb(changed)
+
+_inotify: Inotify | None = None
+_inotify_lock = threading.Lock()
+
+def shared_inotify() -> Inotify | None:
+    """One watcher per process, shared by every cache; None where inotify is unavailable."""
+    global _inotify
+    with _inotify_lock:
+        if _inotify is None:
+            try:
+                _inotify = Inotify()
+            except (OSError, AttributeError):
+                return None
+        return _inotify
+
+def file_etag(st: os.stat_result) -> str:
+    """Strong validator: changes whenever the inode, size or mtime does."""
+    return f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+class CacheEntry:
+    def __init__(self, ctype: str, head: bytes, body, size: int, mtime: float, etag: str = ""):
+        self.ctype, self.head, self.body = ctype, head, body
+        self.size, self.mtime, self.etag = size, mtime, etag
+        self.checked = time.monotonic()
+
+class FileCache:
+    """
+    Byte-budgeted LRU of hot files keyed by resolved path.
+
+    Each entry keeps the static header bytes, a private copy of the body and
+    the MIME type, so a file truncated or rewritten in place can never tear a
+    response. Files of `sendfile_threshold` bytes or more are not cached:
+    sendfile already sends them without copying. Entries are dropped by inotify
+    events when available; otherwise they are revalidated against st_mtime at
+    most once every `revalidate` seconds.
+    """
+    def __init__(self, budget: int, max_entry: int | None = None, sendfile_threshold: int = 256 * 1024,
+                 revalidate: float = 1.0, use_inotify: bool = True):
+        self.budget = int(budget)
+        self.max_entry = int(min(max_entry or max(1, self.budget // 8), sendfile_threshold - 1))
+        self.revalidate = float(revalidate)
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self.inotify = shared_inotify() if use_inotify else None
+        if self.inotify:
+            self.inotify.subscribe(self.invalidate)
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self._lock:
+            e = self._entries.get(key)
+            if e is None:
+                self.misses += 1; return None
+            self._entries.move_to_end(key)
+        if self.inotify is None and time.monotonic() - e.checked > self.revalidate:
+            try:
+                st = os.stat(key)
+            except OSError:
+                st = None
+            if st is None or st.st_mtime != e.mtime or st.st_size != e.size:
+                self.invalidate(key)
+                with self._lock: self.misses += 1
+                return None
+            e.checked = time.monotonic()
+        with self._lock: self.hits += 1
+        return e
+
+    def load(self, path: Path, ctype: str, head: Callable[[os.stat_result], bytes]) -> CacheEntry | None:
+        """Reads path into the cache; head(st) builds its static header bytes. None if it does not fit."""
+        key = str(path)
+        if self.inotify is not None:
+            # watch before reading so a write racing the load still invalidates it
+            try: self.inotify.watch(os.path.dirname(key))
+            except OSError: return None
+        with open(key, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size > self.max_entry:
+                return None
+            body = f.read(st.st_size + 1)
+        if len(body) != st.st_size:
+            return None  # being written right now; serve it uncached
+        e = CacheEntry(ctype, head(st), body, st.st_size, st.st_mtime, file_etag(st))
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None: self.bytes -= old.size
+            self._entries[key] = e
+            self.bytes += e.size
+            while self.bytes > self.budget and self._entries:
+                _, victim = self._entries.popitem(last=False)
+                self.bytes -= victim.size; self.evictions += 1
+        return e
+
+    def invalidate(self, key: str) -> None:
+        """Drops key, or everything under it when key ends with a path separator."""
+        with self._lock:
+            if key.endswith(os.sep):
+                dropped = [k for k in self._entries if k.startswith(key)]
+            else:
+                dropped = [key] if key in self._entries else []
+            for k in dropped:
+                self.bytes -= self._entries.pop(k).size
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries), "bytes": self.bytes, "budget": self.budget,
+                "hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "miss_ratio": round(self.misses / total, 4) if total else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations,
+                "invalidation": "inotify" if self.inotify else f"mtime/{self.revalidate}s",
+            }
+
+class Resolved:
+    """What a request path maps to: kind is "file", "dir", "missing" or "forbidden"."""
+    __slots__ = ("path", "fs", "kind", "ctype", "index", "deps", "expires")
+    def __init__(self, path: str, fs: Path, kind: str, ctype: str = "", index: Path | None = None,
+                 deps: tuple = (), expires: float | None = None):
+        self.path, self.fs, self.kind, self.ctype, self.index = path, fs, kind, ctype, index
+        self.deps, self.expires = deps, expires
+
+class PathCache:
+    """
+    Bounded LRU from the raw request path to its Resolved entry, including
+    negative ("missing", "forbidden") ones, so a repeated request costs no
+    unquote, realpath walk or stat at all.
+
+    Containment is checked with os.path.commonpath on the resolved path, which,
+    unlike a string prefix test, does not let /srv/www match /srv/www-old.
+    With inotify every directory an entry was resolved through is watched,
+    and an event for any name the entry depends on (an ancestor, the target
+    itself, a directory's index.html) drops it. Entries resolved through a
+    symlink, or all entries without inotify, also expire after `ttl` seconds.
+    """
+    def __init__(self, root: Path, mime: Callable[[Path], str], max_entries: int = 10_000,
+                 ttl: float = 2.0, use_inotify: bool = True):
+        self.root, self.mime = Path(os.path.realpath(root)), mime
+        self._root = str(self.root)
+        self.max_entries, self.ttl = int(max(0, max_entries)), float(ttl)
+        self._entries: "OrderedDict[str, Resolved]" = OrderedDict()
+        self._by_dep: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self._changes = 0
+        self.hits = self.misses = self.invalidations = self.expired = self.evictions = 0
+        self.inotify = shared_inotify() if use_inotify and self.max_entries else None
+        if self.inotify:
+            self.inotify.subscribe(self._changed)
+
+    def get(self, raw: str) -> Resolved:
+        if not self.max_entries:  # caching off: resolve every time
+            return self._resolve(raw)
+        with self._lock:
+            e = self._entries.get(raw)
+            if e is not None and (e.expires is None or time.monotonic() < e.expires):
+                self._entries.move_to_end(raw)
+                self.hits += 1
+                return e
+            if e is not None:
+                self._drop(raw); self.expired += 1
+            self.misses += 1
+            changes = self._changes
+        e = self._resolve(raw)
+        with self._lock:
+            # an event while resolving may already describe a newer state; serve it, don't keep it
+            if changes == self._changes:
+                self._entries[raw] = e
+                for d in e.deps:
+                    self._by_dep.setdefault(d, set()).add(raw)
+                while len(self._entries) > self.max_entries:
+                    self._drop(next(iter(self._entries))); self.evictions += 1
+        return e
+
+    def _resolve(self, raw: str) -> Resolved:
+        path = urllib.parse.unquote(raw)
+        if not path.startswith("/"): path = "/" + path
+        lexical = os.path.normpath(os.path.join(self._root, path.lstrip("/")))
+        real = os.path.realpath(lexical)
+        fs = Path(real)
+        expires = None if self.inotify else time.monotonic() + self.ttl
+        if real != lexical:  # symlinks along the way are not watched
+            expires = time.monotonic() + self.ttl
+        if os.path.commonpath([self._root, real]) != self._root:
+            return Resolved(path, fs, "forbidden", expires=expires)
+        # every name from the root down to the target, and the directories holding them
+        names, d = [real], real
+        while d != self._root:
+            d = os.path.dirname(d); names.append(d)
+        watched = names[1:]
+        try:
+            st = os.stat(real)
+        except (FileNotFoundError, NotADirectoryError):
+            st = None
+        kind, ctype, index = "missing", "", None
+        if st is not None and stat.S_ISDIR(st.st_mode):
+            kind, idx = "dir", os.path.join(real, "index.html")
+            names.append(idx); watched = names[:-1]
+            if os.path.isfile(idx): index = Path(idx)
+        elif st is not None and stat.S_ISREG(st.st_mode):
+            kind, ctype = "file", self.mime(fs)
+        if self.inotify and expires is None:
+            try:
+                for d in watched:
+                    if os.path.isdir(d): self.inotify.watch(d)
+            except OSError:  # out of watches: fall back to the TTL
+                expires = time.monotonic() + self.ttl
+        return Resolved(path, fs, kind, ctype, index, tuple(names), expires)
+
+    def _drop(self, key: str) -> None:
+        # caller holds _lock
+        e = self._entries.pop(key)
+        for d in e.deps:
+            keys = self._by_dep.get(d)
+            if keys is not None:
+                keys.discard(key)
+                if not keys: del self._by_dep[d]
+
+    def _changed(self, path: str) -> None:
+        name = path.rstrip(os.sep)
+        with self._lock:
+            self._changes += 1
+            for key in list(self._by_dep.get(name, ())):
+                self._drop(key); self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            kinds: Dict[str, int] = {}
+            for e in self._entries.values():
+                kinds[e.kind] = kinds.get(e.kind, 0) + 1
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "kinds": kinds,
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                    "invalidations": self.invalidations, "expired": self.expired, "evictions": self.evictions,
+                    "invalidation": "off" if not self.max_entries else "inotify" if self.inotify else f"ttl/{self.ttl}s"}
+
+class Listing:
+    def __init__(self, rows: list, mtime_ns: int):
+        self.rows, self.mtime_ns = rows, mtime_ns
+        # depends only on the rows, so every worker and every rebuild of the same listing agree
+        self.digest = zlib.crc32(repr(rows).encode())
+        self.built = time.monotonic()
+
+class ListingCache:
+    """
+    Pre-rendered directory listing rows keyed by directory path.
+
+    A listing is reused while the directory's st_mtime_ns is unchanged. Since
+    that does not move when a file is rewritten in place, rows are also dropped
+    on inotify events for the directory, or after `ttl` seconds without inotify.
+    A miss is built by one thread; others asking for the same directory
+    meanwhile wait for its result instead of scanning it again.
+    """
+    def __init__(self, build: Callable[[Path], list], max_dirs: int = 256, ttl: float = 2.0,
+                 use_inotify: bool = True):
+        self.build, self.max_dirs, self.ttl = build, int(max(1, max_dirs)), float(ttl)
+        self._entries: "OrderedDict[str, Listing]" = OrderedDict()
+        self._building: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.builds = self.coalesced = 0
+        self.inotify = shared_inotify() if use_inotify else None
+        if self.inotify:
+            self.inotify.subscribe(self._changed)
+
+    def _changed(self, path: str) -> None:
+        parent = os.path.dirname(path.rstrip(os.sep))
+        with self._lock:
+            self._entries.pop(parent, None)
+            if path.endswith(os.sep):
+                self._entries.pop(path.rstrip(os.sep), None)
+
+    def get(self, here: Path) -> Listing:
+        key = str(here)
+        mtime_ns = os.stat(key).st_mtime_ns
+        while True:
+            with self._lock:
+                e = self._entries.get(key)
+                if e is not None and e.mtime_ns == mtime_ns and (self.inotify or time.monotonic() - e.built < self.ttl):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return e
+                flight = self._building.get(key)
+                if flight is None:
+                    flight = self._building[key] = threading.Event()
+                    self.misses += 1
+                    break
+                self.coalesced += 1
+            # someone is scanning this directory; look again once they are done (or failed)
+            flight.wait()
+        try:
+            if self.inotify:
+                try: self.inotify.watch(key)
+                except OSError: pass
+            rows = self.build(here)
+            with self._lock:
+                self.builds += 1
+                e = self._entries[key] = Listing(rows, mtime_ns)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_dirs:
+                    self._entries.popitem(last=False)
+            return e
+        finally:
+            with self._lock:
+                del self._building[key]
+            flight.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"dirs": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "builds": self.builds, "coalesced": self.coalesced}
+
+def compress(data, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(bytes(data), quality=5)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+class CompressCache:
+    """
+    Byte-budgeted LRU of compressed bodies.
+
+    Keys carry everything that identifies the source bytes (path plus
+    mtime/size, or a listing's ETag) and the coding, so a changed file simply
+    misses and its stale variant ages out. Bodies larger than budget/8 are
+    compressed but not kept.
+    """
+    def __init__(self, budget: int):
+        self.budget = int(budget)
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self.bytes_in = self.bytes_out = 0
+
+    def get(self, key: tuple, coding: str, data: Callable[[], bytes]) -> bytes:
+        k = key + (coding,)
+        with self._lock:
+            body = self._entries.get(k)
+            if body is not None:
+                self._entries.move_to_end(k)
+                self.hits += 1
+                return body
+            self.misses += 1
+        raw = data()
+        body = compress(raw, coding)
+        with self._lock:
+            self.bytes_in += len(raw); self.bytes_out += len(body)
+            if len(body) <= self.budget // 8 and k not in self._entries:
+                self._entries[k] = body
+                self.bytes += len(body)
+                while self.bytes > self.budget and self._entries:
+                    _, victim = self._entries.popitem(last=False)
+                    self.bytes -= len(victim); self.evictions += 1
+        return body
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "budget": self.budget,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "compressed_in": self.bytes_in, "compressed_out": self.bytes_out,
+                    "ratio": round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else 0.0,
+                    "codings": list(CODINGS)}
@@ -0,0 +1,82 @@
+import json, os, threading
+from typing import Dict
+
+class ShardedCounter:
+    """
+    Per-path hit counts without a lock on the hot path.
+
+    Every thread increments its own dict; readers merge the shards lazily.
+    Shards of threads that have exited are folded into a base dict so
+    thread-per-connection mode does not grow the shard list forever.
+    """
+    def __init__(self, initial: Dict[str, int] | None = None):
+        self._local = threading.local()
+        self._base: Dict[str, int] = dict(initial or {})
+        self._shards: list[tuple[threading.Thread, Dict[str, int]]] = []
+        self._lock = threading.Lock()  # guards _shards/_base, never taken by inc()
+        self._registered = 0
+        self._keys = set(self._base)   # every path ever counted, so len() needs no merge
+
+    def _shard(self) -> Dict[str, int]:
+        d: Dict[str, int] = {}
+        self._local.d = d
+        with self._lock:
+            self._shards.append((threading.current_thread(), d))
+            self._registered += 1
+            if self._registered % 64 == 0:
+                self._fold_dead()
+        return d
+
+    def inc(self, path: str, n: int = 1) -> None:
+        try:
+            d = self._local.d
+        except AttributeError:
+            d = self._shard()
+        v = d.get(path)
+        if v is None:
+            # first time for this shard; set.add is atomic under the GIL
+            self._keys.add(path)
+            v = 0
+        d[path] = v + n
+
+    def _fold_dead(self) -> None:
+        live = []
+        for t, d in self._shards:
+            if t.is_alive():
+                live.append((t, d))
+            else:
+                for k, v in d.items():
+                    self._base[k] = self._base.get(k, 0) + v
+        self._shards = live
+
+    def get(self, path: str) -> int:
+        with self._lock:
+            return self._base.get(path, 0) + sum(d.get(path, 0) for _, d in self._shards)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            self._fold_dead()
+            out = dict(self._base)
+            for _, d in self._shards:
+                # dict.copy() is atomic under the GIL, so an owner writing concurrently is fine
+                for k, v in d.copy().items():
+                    out[k] = out.get(k, 0) + v
+        return out
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+def load_counts(path: str) -> Dict[str, int]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {str(k): int(v) for k, v in data.items()}
+
+def save_counts(path: str, counts: Dict[str, int]) -> None:
+    """Atomically replaces path with the JSON counts."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(counts, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
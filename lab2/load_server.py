@@ -1,44 +1,281 @@
-import argparse, time, threading, requests
+"""
+Load generator for the lab servers: asyncio + raw sockets, no thread per request.
+
+    # open loop: 500 req/s for 10 s, at most 256 requests in flight
+    python load_server.py --url http://127.0.0.1:8088/ --rate 500 --duration 10 --concurrency 256
+    # closed loop: 64 connections as fast as the server answers
+    python load_server.py --url http://127.0.0.1:8088/ --duration 10 --concurrency 64
+    # machine-readable runs, then a side-by-side table
+    python load_server.py ... --label pool --json pool.json
+    python load_server.py --compare single.json threaded.json pool.json
+    # without --duration: the original 10-concurrent + rate-spam demo
+    python load_server.py --url http://127.0.0.1:8088/
+
+In open-loop mode every request has a scheduled send time (start + i/rate)
+and its latency is measured from that time, not from when a connection
+became free, so a stalled server shows up in the tail instead of silently
+lowering the offered load (coordinated omission).
+"""
+import argparse, asyncio, json, math, sys, time, urllib.parse
+from typing import Dict, List, Tuple
+
+class Histogram:
+    """
+    Log-linear latency histogram in microseconds (HdrHistogram layout).
+
+    Values below 2**SUB are exact; above that each power of two is split
+    into 2**(SUB-1) buckets, so a bucket is never wider than ~1.6% of the
+    values it holds. Counts live in a sparse dict, so memory is bounded by
+    the number of distinct buckets, not samples.
+    """
+    SUB = 7
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.n, self.total, self.lo, self.hi = 0, 0, None, 0
+
+    @classmethod
+    def _index(cls, v: int) -> int:
+        shift = max(0, v.bit_length() - cls.SUB)
+        return (shift << (cls.SUB - 1)) + (v >> shift)
+
+    @classmethod
+    def _value(cls, idx: int) -> int:
+        half = 1 << (cls.SUB - 1)
+        if idx < 2 * half: return idx
+        shift = idx // half - 1
+        return ((idx - shift * half + 1) << shift) - 1  # highest value in the bucket
+
+    def record(self, us: float) -> None:
+        v = max(0, int(us))
+        i = self._index(v)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.n += 1; self.total += v
+        self.lo = v if self.lo is None else min(self.lo, v)
+        self.hi = max(self.hi, v)
+
+    def merge(self, other: "Histogram") -> None:
+        for i, c in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + c
+        if other.n:
+            self.lo = other.lo if self.lo is None else min(self.lo, other.lo)
+            self.hi = max(self.hi, other.hi)
+        self.n += other.n; self.total += other.total
+
+    def percentile(self, q: float) -> int:
+        if not self.n: return 0
+        want, seen = max(1, math.ceil(q / 100.0 * self.n)), 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= want:
+                return min(self._value(i), self.hi)
+        return self.hi
+
+    def summary(self) -> dict:
+        ms = lambda us: round(us / 1000.0, 3)
+        return {"count": self.n, "min": ms(self.lo or 0), "mean": ms(self.total / max(1, self.n)),
+                "p50": ms(self.percentile(50)), "p90": ms(self.percentile(90)),
+                "p99": ms(self.percentile(99)), "p999": ms(self.percentile(99.9)), "max": ms(self.hi)}
+
+class Target:
+    def __init__(self, url: str):
+        u = urllib.parse.urlsplit(url)
+        self.host, self.port = u.hostname or "127.0.0.1", u.port or 80
+        self.path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+
+class Pool:
+    """Idle keep-alive connections per (host, port)."""
+    def __init__(self, keepalive: bool = True):
+        self.keepalive = keepalive
+        self.idle: Dict[Tuple[str, int], List[tuple]] = {}
+        self.opened = 0
+
+    async def acquire(self, t: Target):
+        free = self.idle.get((t.host, t.port))
+        if free: return free.pop()
+        self.opened += 1
+        return await asyncio.open_connection(t.host, t.port)
+
+    def release(self, t: Target, conn, reusable: bool) -> None:
+        if reusable and self.keepalive:
+            self.idle.setdefault((t.host, t.port), []).append(conn)
+        else:
+            conn[1].close()
+
+    def close(self) -> None:
+        for conns in self.idle.values():
+            for _, w in conns: w.close()
+        self.idle.clear()
+
+async def fetch(pool: Pool, t: Target) -> Tuple[int, int]:
+    """One GET over a pooled connection; returns (status, body bytes)."""
+    conn = await pool.acquire(t)
+    reader, writer = conn
+    ok = False
+    try:
+        writer.write(f"GET {t.path} HTTP/1.1\r\nHost: {t.host}:{t.port}\r\n"
+                     f"Connection: {'keep-alive' if pool.keepalive else 'close'}\r\n\r\n".encode())
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("iso-8859-1").split("\r\n")
+        status = int(head[0].split(" ", 2)[1])
+        headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in head[1:] if l)}
+        size = 0
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                n = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await reader.readexactly(n + 2); size += n
+                if n == 0: break
+        elif "content-length" in headers:
+            size = int(headers["content-length"])
+            await reader.readexactly(size)
+        else:
+            size = len(await reader.read())
+            headers["connection"] = "close"
+        ok = "close" not in headers.get("connection", "").lower()
+        return status, size
+    finally:
+        pool.release(t, conn, ok)
+
+class Run:
+    def __init__(self):
+        self.hist: Dict[str, Histogram] = {}
+        self.sent = self.bytes = 0
+
+    def record(self, status: str, us: float, size: int = 0) -> None:
+        self.hist.setdefault(status, Histogram()).record(us)
+        self.bytes += size
+
+async def _one(pool: Pool, t: Target, run: Run, started: float, timeout: float) -> None:
+    run.sent += 1
+    try:
+        status, size = await asyncio.wait_for(fetch(pool, t), timeout)
+        run.record(str(status), (time.perf_counter() - started) * 1e6, size)
+    except Exception:
+        run.record("error", (time.perf_counter() - started) * 1e6)
+
+async def open_loop(targets: List[Target], rate: float, duration: float, concurrency: int,
+                    timeout: float, pool: Pool, run: Run) -> None:
+    sem = asyncio.Semaphore(max(1, concurrency))
+    pending: set = set()
+
+    async def scheduled(t: Target, due: float):
+        async with sem:  # queueing behind the cap is part of the measured latency
+            await _one(pool, t, run, due, timeout)
+
+    t0, n = time.perf_counter(), int(rate * duration)
+    for i in range(n):
+        due = t0 + i / rate
+        delay = due - time.perf_counter()
+        if delay > 0: await asyncio.sleep(delay)
+        task = asyncio.ensure_future(scheduled(targets[i % len(targets)], due))
+        pending.add(task); task.add_done_callback(pending.discard)
+    if pending: await asyncio.wait(pending)
+
+async def closed_loop(targets: List[Target], duration: float, concurrency: int,
+                      timeout: float, pool: Pool, run: Run) -> None:
+    end = time.perf_counter() + duration
+
+    async def worker(k: int):
+        i = k
+        while time.perf_counter() < end:
+            await _one(pool, targets[i % len(targets)], run, time.perf_counter(), timeout)
+            i += concurrency
+
+    await asyncio.gather(*(worker(k) for k in range(max(1, concurrency))))
+
+async def run_load(urls: List[str], rate: float = 0.0, duration: float = 10.0, concurrency: int = 64,
+                   timeout: float = 10.0, keepalive: bool = True, label: str = "") -> dict:
+    """Drives urls (round-robin) and returns the result dict that --json writes."""
+    targets, pool, run = [Target(u) for u in urls], Pool(keepalive), Run()
+    t0 = time.perf_counter()
+    try:
+        if rate > 0:
+            await open_loop(targets, rate, duration, concurrency, timeout, pool, run)
+        else:
+            await closed_loop(targets, duration, concurrency, timeout, pool, run)
+    finally:
+        pool.close()
+    elapsed = time.perf_counter() - t0
+    total = Histogram()
+    for h in run.hist.values(): total.merge(h)
+    return {
+        "label": label, "urls": urls, "loop": "open" if rate > 0 else "closed",
+        "rate": rate, "duration": duration, "concurrency": concurrency, "keepalive": keepalive,
+        "elapsed": round(elapsed, 3), "sent": run.sent, "completed": total.n,
+        "connections": pool.opened,
+        "throughput_rps": round(total.n / elapsed, 1) if elapsed else 0.0,
+        "ok_rps": round(run.hist["200"].n / elapsed, 1) if "200" in run.hist and elapsed else 0.0,
+        "mb_per_s": round(run.bytes / elapsed / 1e6, 2) if elapsed else 0.0,
+        "statuses": {k: h.n for k, h in sorted(run.hist.items())},
+        "latency_ms": {"all": total.summary(), **{k: h.summary() for k, h in sorted(run.hist.items())}},
+    }
+
+def print_report(r: dict) -> None:
+    print(f"{r['label'] or r['urls'][0]}: {r['loop']} loop, "
+          + (f"{r['rate']:.0f} req/s offered, " if r["loop"] == "open" else "")
+          + f"concurrency {r['concurrency']}, {r['elapsed']:.1f}s")
+    print(f"  completed {r['completed']}/{r['sent']}  throughput {r['throughput_rps']} req/s  "
+          f"(200: {r['ok_rps']} req/s, {r['mb_per_s']} MB/s, {r['connections']} connections)")
+    print(f"  {'status':>8} {'count':>8} {'p50':>9} {'p90':>9} {'p99':>9} {'p99.9':>9} {'max':>9}  (ms)")
+    for k, s in r["latency_ms"].items():
+        print(f"  {k:>8} {s['count']:8d} {s['p50']:9.2f} {s['p90']:9.2f} {s['p99']:9.2f} {s['p999']:9.2f} {s['max']:9.2f}")
+
+def compare(paths: List[str]) -> None:
+    rows = []
+    for p in paths:
+        with open(p, encoding="utf-8") as f:
+            r = json.load(f)
+        a = r["latency_ms"]["all"]
+        rows.append((r.get("label") or p, r["throughput_rps"], r["ok_rps"], a["p50"], a["p99"], a["p999"],
+                     r["statuses"].get("429", 0), r["statuses"].get("503", 0), r["statuses"].get("error", 0)))
+    print(f"{'run':20} {'req/s':>9} {'200/s':>9} {'p50':>8} {'p99':>8} {'p99.9':>8} {'429':>7} {'503':>7} {'err':>6}")
+    for row in rows:
+        print(f"{row[0]:20} {row[1]:9.1f} {row[2]:9.1f} {row[3]:8.2f} {row[4]:8.2f} {row[5]:8.2f} {row[6]:7d} {row[7]:7d} {row[8]:6d}")
 
 def blast(url: str, n: int = 10, timeout=5.0):
-    t0=time.time(); codes=[]
-    def worker(i):
-        try:
-            r=requests.get(url, timeout=timeout)
-            codes.append(r.status_code)
-            print(f"[{i}] {r.status_code}")
-        except Exception as e:
-            print(f"[{i}] ERROR {e}")
-            codes.append(-1)
-    th=[threading.Thread(target=worker, args=(i,), daemon=True) for i in range(n)]
-    [t.start() for t in th]; [t.join() for t in th]
-    dt=time.time()-t0
-    ok=sum(1 for c in codes if c==200)
-    print(f"Done {n} in {dt:.2f}s (200 OK: {ok}/{n})")
-    return dt, codes
+    """n requests at once, one connection each."""
+    r = asyncio.run(run_load([url], rate=n / 0.01, duration=0.01, concurrency=n, timeout=timeout, keepalive=False))
+    print(f"Done {r['completed']} in {r['elapsed']:.2f}s (200 OK: {r['statuses'].get('200', 0)}/{n})")
+    return r
 
 def spam(url: str, rps: float, seconds: float):
-    gap=1.0/max(0.1,rps); end=time.time()+seconds; codes=[]
-    while time.time()<end:
-        try: codes.append(requests.get(url, timeout=5).status_code)
-        except: codes.append(-1)
-        time.sleep(gap)
-    ok=sum(1 for c in codes if c==200); denied=sum(1 for c in codes if c==429)
-    total=len(codes)
-    print(f"Sent ~{total/seconds:.1f} r/s for {seconds:.1f}s -> OK {ok/seconds:.1f} r/s, 429 {denied/seconds:.1f} r/s")
-    return codes
+    """Constant-rate requests from one client IP, to watch the rate limiter."""
+    r = asyncio.run(run_load([url], rate=rps, duration=seconds, concurrency=max(8, int(rps)), timeout=5.0))
+    ok, denied = r["statuses"].get("200", 0), r["statuses"].get("429", 0)
+    print(f"Sent ~{r['sent']/seconds:.1f} r/s for {seconds:.1f}s -> OK {ok/seconds:.1f} r/s, 429 {denied/seconds:.1f} r/s")
+    return r
 
 def main():
-    ap=argparse.ArgumentParser()
-    ap.add_argument("--url", default="http://127.0.0.1:8088/")
-    ap.add_argument("--n", type=int, default=10)
-    ap.add_argument("--rps", type=float, default=12.0)
-    ap.add_argument("--seconds", type=float, default=5.0)
-    a=ap.parse_args()
-    print("== 10 concurrent requests ==")
-    blast(a.url, a.n)
-    print("\n== Rate spam (single IP) ==")
-    spam(a.url, a.rps, a.seconds)
-
-if __name__=="__main__":
+    ap = argparse.ArgumentParser(description="asyncio load generator for the lab HTTP servers")
+    ap.add_argument("--url", action="append", help="target URL; repeat to rotate over several")
+    ap.add_argument("--n", type=int, default=10, help="demo: concurrent requests")
+    ap.add_argument("--rps", type=float, default=12.0, help="demo: rate-spam requests per second")
+    ap.add_argument("--seconds", type=float, default=5.0, help="demo: rate-spam length")
+    ap.add_argument("--duration", type=float, help="benchmark length in seconds (enables benchmark mode)")
+    ap.add_argument("--rate", type=float, default=0.0, help="open-loop arrivals per second; 0 = closed loop")
+    ap.add_argument("--concurrency", type=int, default=64, help="max requests in flight / closed-loop connections")
+    ap.add_argument("--timeout", type=float, default=10.0)
+    ap.add_argument("--no-keepalive", action="store_true", help="new connection per request")
+    ap.add_argument("--label", default="", help="name for this run in JSON/compare output")
+    ap.add_argument("--json", nargs="?", const="-", metavar="FILE", help="write the result as JSON (stdout if no FILE)")
+    ap.add_argument("--compare", nargs="+", metavar="JSON", help="compare saved --json results")
+    a = ap.parse_args()
+    if a.compare:
+        compare(a.compare); return
+    urls = a.url or ["http://127.0.0.1:8088/"]
+    if a.duration is None:
+        print("== 10 concurrent requests ==")
+        blast(urls[0], a.n)
+        print("\n== Rate spam (single IP) ==")
+        spam(urls[0], a.rps, a.seconds)
+        return
+    r = asyncio.run(run_load(urls, a.rate, a.duration, a.concurrency, a.timeout, not a.no_keepalive, a.label))
+    if a.json == "-":
+        json.dump(r, sys.stdout, indent=2); print()
+        return
+    print_report(r)
+    if a.json:
+        with open(a.json, "w", encoding="utf-8") as f:
+            json.dump(r, f, indent=2)
+
+if __name__ == "__main__":
     main()
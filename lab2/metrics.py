@@ -0,0 +1,86 @@
+import bisect, random
+from typing import Dict, Tuple
+from counters import ShardedCounter
+
+# fraction of requests timed, shared by Metrics, HTTPServer and --metrics-sample
+DEFAULT_SAMPLE = 0.05
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:
+    """
+    Prometheus counters and histograms kept in a ShardedCounter.
+
+    Every series is a key (name, labels[, bucket]) in the calling thread's
+    own dict, so recording never takes a lock; a scrape merges the shards.
+    Counters are exact. Timings are only taken for a `sample` fraction of
+    requests (see sampled()), which keeps perf_counter calls and histogram
+    updates off most requests at full load.
+    """
+    def __init__(self, sample: float = DEFAULT_SAMPLE, prefix: str = "lab2"):
+        self.sample, self.prefix = float(min(1.0, max(0.0, sample))), prefix
+        self._c = ShardedCounter()
+        self._meta: Dict[str, Tuple[str, str]] = {}
+
+    def describe(self, name: str, kind: str, help: str) -> None:
+        self._meta[name] = (kind, help)
+
+    def sampled(self) -> bool:
+        return self.sample >= 1.0 or (self.sample > 0.0 and random.random() < self.sample)
+
+    def inc(self, name: str, labels: tuple = (), n: float = 1) -> None:
+        self._c.inc((name, labels), n)
+
+    def observe(self, name: str, seconds: float, labels: tuple = ()) -> None:
+        c = self._c
+        c.inc((name, labels, bisect.bisect_left(BUCKETS, seconds)))
+        c.inc((name, labels, "sum"), seconds)
+
+    def render(self, gauges: Dict[str, float] | None = None, const: tuple = ()) -> str:
+        """Prometheus text exposition (0.0.4) of everything recorded plus the given gauges."""
+        series: Dict[str, list] = {}
+        for key, v in self._c.snapshot().items():
+            series.setdefault(key[0], []).append((key, v))
+        lab = lambda pairs: "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+        out = []
+        for name in sorted(series):
+            # observe() keys carry a bucket, so an undescribed histogram still renders as one
+            kind, help = self._meta.get(name, ("histogram" if len(series[name][0][0]) == 3 else "untyped", ""))
+            full = f"{self.prefix}_{name}"
+            out += [f"# HELP {full} {help}", f"# TYPE {full} {kind}"]
+            if kind != "histogram":
+                for (_, labels), v in sorted(series[name]):
+                    out.append(f"{full}{lab(const + labels)} {v}")
+                continue
+            hists: Dict[tuple, dict] = {}
+            for key, v in series[name]:
+                hists.setdefault(key[1], {})[key[2]] = v
+            for labels, h in sorted(hists.items()):
+                cum = 0
+                for i, le in enumerate(BUCKETS):
+                    cum += h.get(i, 0)
+                    out.append(f"{full}_bucket{lab(const + labels + (('le', repr(le)),))} {cum}")
+                cum += h.get(len(BUCKETS), 0)
+                out.append(f"{full}_bucket{lab(const + labels + (('le', '+Inf'),))} {cum}")
+                out.append(f"{full}_sum{lab(const + labels)} {h.get('sum', 0.0)}")
+                out.append(f"{full}_count{lab(const + labels)} {cum}")
+        for name, v in sorted((gauges or {}).items()):
+            full = f"{self.prefix}_{name}"
+            out += [f"# HELP {full} {name} from /__stats.", f"# TYPE {full} gauge", f"{full}{lab(const)} {v}"]
+        return "\n".join(out) + "\n"
+
+def escape(value) -> str:
+    """Label value as the text format wants it: backslash, double quote and newline escaped."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def flatten(d: dict, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of a nested stats dict as name_sub_key -> value; lists and strings are skipped."""
+    out: Dict[str, float] = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}".replace("-", "_").replace(".", "_")
+        if isinstance(v, bool):
+            out[key] = int(v)
+        elif isinstance(v, (int, float)):
+            out[key] = v
+        elif isinstance(v, dict):
+            out.update(flatten(v, key + "_"))
+    return out
@@ -0,0 +1,222 @@
+import math, selectors, socket, threading, time
+from collections import deque
+from typing import Callable
+
+class AdaptivePool:
+    """
+    Worker threads for accepted connections, sized between min and max.
+
+    A worker is started whenever work is queued and no thread is idle;
+    a thread idle for `idle` seconds exits while more than min remain.
+    Admission is CoDel-style: every connection is stamped when queued and
+    a worker checks its sojourn time on dequeue. Once the wait has stayed
+    above `target` for a full `interval`, connections are shed (handed to
+    reject) at a rate that grows with sqrt(drops), until a dequeue sees a
+    wait below target again. max_queue remains a hard cap for bursts.
+    Every timestamp comes from `clock`, which tests replace.
+    """
+    def __init__(self, handle: Callable, reject: Callable, min_workers: int, max_workers: int,
+                 target: float = 0.02, interval: float = 0.2, idle: float = 5.0, max_queue: int = 1024,
+                 clock: Callable[[], float] = time.monotonic):
+        self.handle, self.reject, self.clock = handle, reject, clock
+        self.min = int(max(1, min_workers))
+        self.max = int(max(self.min, max_workers))
+        self.target, self.interval, self.idle = float(target), float(interval), float(idle)
+        self.max_queue = int(max(1, max_queue))
+        self._q: deque = deque()
+        self._cv = threading.Condition(threading.Lock())
+        self._stop = False
+        self.size = self.busy = self.peak = 0
+        self.spawned = self.retired = self.shed = self.rejected_full = self.served = 0
+        self._waits: deque = deque(maxlen=4096)  # recent sojourn times, for percentiles
+        # CoDel state
+        self._first_above = 0.0
+        self._dropping = False
+        self._drop_next = 0.0
+        self._drops = 0
+
+    def start(self) -> None:
+        with self._cv:
+            for _ in range(self.min):
+                self._spawn()
+
+    def stop(self) -> None:
+        """Workers exit once the queue is empty; queued connections are still served."""
+        with self._cv:
+            self._stop = True
+            self._cv.notify_all()
+
+    def _spawn(self) -> None:
+        # caller holds _cv
+        self.size += 1; self.spawned += 1
+        self.peak = max(self.peak, self.size)
+        threading.Thread(target=self._run, daemon=True, name=f"w{self.spawned}").start()
+
+    def submit(self, conn, addr) -> bool:
+        """Queues a connection; False (and nothing queued) when the hard cap is hit."""
+        with self._cv:
+            if len(self._q) >= self.max_queue:
+                self.rejected_full += 1
+                return False
+            self._q.append((self.clock(), conn, addr))
+            if self.size - self.busy < len(self._q) and self.size < self.max:
+                self._spawn()
+            self._cv.notify()
+        return True
+
+    def _should_shed(self, wait: float, now: float) -> bool:
+        # caller holds _cv; the control law from RFC 8289
+        if wait < self.target or not self._q:
+            self._first_above = 0.0
+            self._dropping = False
+            return False
+        if not self._dropping:
+            if self._first_above == 0.0:
+                self._first_above = now + self.interval
+                return False
+            if now < self._first_above:
+                return False
+            self._dropping = True
+            # re-entering soon after the last episode resumes at the previous rate
+            self._drops = self._drops - 2 if self._drops > 2 and now - self._drop_next < 16 * self.interval else 1
+            self._drop_next = now + self.interval / math.sqrt(self._drops)
+            return True
+        if now >= self._drop_next:
+            self._drops += 1
+            self._drop_next += self.interval / math.sqrt(self._drops)
+            return True
+        return False
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                idle_since = self.clock()
+                while not self._q and not self._stop:
+                    left = idle_since + self.idle - self.clock()
+                    if left > 0:
+                        self._cv.wait(left); continue
+                    if self.size > self.min:
+                        self.size -= 1; self.retired += 1
+                        return
+                    idle_since = self.clock()
+                if not self._q:  # stopping, and everything queued has been taken
+                    self.size -= 1
+                    return
+                queued, conn, addr = self._q.popleft()
+                now = self.clock()
+                wait = now - queued
+                self._waits.append(wait)
+                shed = self._should_shed(wait, now)
+                if shed: self.shed += 1
+                else: self.busy += 1
+            if shed:
+                self.reject(conn, addr)
+                continue
+            try:
+                self.handle(conn, addr)
+            finally:
+                with self._cv:
+                    self.busy -= 1; self.served += 1
+
+    def stats(self) -> dict:
+        with self._cv:
+            waits = sorted(self._waits)
+            st = {"min": self.min, "max": self.max, "size": self.size, "busy": self.busy,
+                  "idle": self.size - self.busy, "queued": len(self._q), "peak": self.peak,
+                  "utilization": round(self.busy / self.size, 3) if self.size else 0.0,
+                  "spawned": self.spawned, "retired": self.retired, "served": self.served,
+                  "shed": self.shed, "rejected_full": self.rejected_full,
+                  "codel": {"target_ms": self.target * 1e3, "interval_ms": self.interval * 1e3,
+                            "dropping": self._dropping, "drops": self._drops}}
+        pct = lambda q: round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1e3, 3) if waits else 0.0
+        st["wait_ms"] = {"samples": len(waits), "p50": pct(0.5), "p90": pct(0.9), "p99": pct(0.99),
+                         "max": round(waits[-1] * 1e3, 3) if waits else 0.0}
+        return st
+
+
+class KeepAliveWatcher:
+    """
+    Holds kept-alive connections between requests so they do not pin pool workers.
+
+    A worker park()s a connection once its response is sent and nothing
+    pipelined is buffered. One selector thread waits on every parked socket
+    and hands a connection to ready() as soon as its next request starts to
+    arrive, or to expire() once it has been idle for `timeout` seconds.
+    close() expires everything still parked and stops the thread.
+    """
+    def __init__(self, ready: Callable, expire: Callable, timeout: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ready, self.expire, self.timeout, self.clock = ready, expire, float(timeout), clock
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False); self._wake_w.setblocking(False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ, None)
+        self._pending: list = []
+        self._lock = threading.Lock()
+        self._closing = False
+        self._thread: threading.Thread | None = None
+        self.parked = self.woken = self.expired = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True, name="keepalive")
+        self._thread.start()
+
+    def park(self, conn, addr) -> None:
+        with self._lock:
+            closing = self._closing
+            if not closing:
+                self._pending.append((conn, addr, self.clock()))
+                self.parked += 1
+        if closing:
+            self.expire(conn, addr); return
+        self._wake()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closing = True
+        self._wake()
+        if self._thread:
+            self._thread.join()
+        else:
+            for conn, addr, _ in self._pending:
+                self.expire(conn, addr)
+
+    def _wake(self) -> None:
+        try: self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError): pass
+
+    def _run(self) -> None:
+        sel = self._sel
+        while True:
+            for key, _ in sel.select(min(1.0, self.timeout)):
+                if key.data is None:
+                    try:
+                        while self._wake_r.recv(4096): pass
+                    except (BlockingIOError, OSError): pass
+                    continue
+                sel.unregister(key.fileobj)
+                self.woken += 1
+                self.ready(key.data[0], key.data[1])
+            with self._lock:
+                pending, self._pending = self._pending, []
+                closing = self._closing
+            for conn, addr, since in pending:
+                try:
+                    sel.register(conn, selectors.EVENT_READ, (conn, addr, since))
+                except (ValueError, OSError):   # closed under us
+                    self.expired += 1
+                    self.expire(conn, addr)
+            now = self.clock()
+            for key in list(sel.get_map().values()):
+                if key.data is not None and (closing or now - key.data[2] > self.timeout):
+                    sel.unregister(key.fileobj)
+                    self.expired += 1
+                    self.expire(key.data[0], key.data[1])
+            if closing:
+                sel.close(); self._wake_r.close(); self._wake_w.close()
+                return
+
+    def stats(self) -> dict:
+        return {"parked": max(0, len(self._sel.get_map()) - 1) if not self._closing else 0,
+                "parks": self.parked, "woken": self.woken, "expired": self.expired,
+                "timeout_s": self.timeout}
@@ -1,22 +1,87 @@
-import argparse, os, socket, threading, time, urllib.parse, email.utils, queue, json, signal, sys
+import argparse, os, socket, threading, time, urllib.parse, email.utils, json, signal, sys, selectors, heapq, zlib, functools, subprocess
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Tuple
+from shm import SharedStore
+from cache import FileCache, CacheEntry, ListingCache, CompressCache, PathCache, CODINGS, file_etag
+from counters import ShardedCounter, load_counts, save_counts
+from ratelimit import RateLimiter, gcra_step
+from httpparse import RequestParser, HTTPError
+from pool import AdaptivePool, KeepAliveWatcher
+from metrics import DEFAULT_SAMPLE, Metrics, flatten
 
 CRLF = "\r\n"
 SERVER_NAME = "CN-Lab-HTTP/1.0"
+SERVER_LINE = f"Server: {SERVER_NAME}{CRLF}".encode()
+ENCODED_SUFFIX = {"br": ".br", "gzip": ".gz"}
+COMPRESS_MAX = 4 * 1024 * 1024  # larger text files are sent as-is unless a precompressed sibling exists
+# Cache-Control by MIME type ("type/subtype", "type/*" or "*"); --cache-control overrides entries
+CACHE_CONTROL = {"text/html": "no-cache", "image/*": "public, max-age=86400",
+                 "application/pdf": "public, max-age=86400", "*": "no-cache"}
+METRICS = [
+    ("responses_total", "counter", "Responses sent, by status code."),
+    ("sent_bytes_total", "counter", "Header and body bytes handed to the socket or sendfile."),
+    ("request_duration_seconds", "histogram", "Time from a parsed request to its response being written (sampled)."),
+    ("phase_duration_seconds", "histogram",
+     "Per-request time in the rate limiter, in fs work (resolve, stat, read, render, compress) and in socket writes (sampled)."),
+]
+STATUS_LABELS = {c: (("code", str(c)),) for c in (200, 206, 301, 304, 400, 403, 404, 405, 416, 429, 431, 500, 503)}
+PHASE_RATELIMIT, PHASE_FS, PHASE_WRITE = (("phase", "ratelimit"),), (("phase", "fs"),), (("phase", "write"),)
+# hot restart: the new process finds the inherited listening socket and its readiness pipe here
+LISTEN_FD_ENV, READY_FD_ENV = "LAB2_LISTEN_FD", "LAB2_READY_FD"
 ALLOWED = {"text/html; charset=utf-8", "image/png", "application/pdf", "image/jpeg"}
 
+_now_date: tuple[int, str, bytes] = (0, "", b"")
+
 def http_date(ts: float | None = None) -> str:
-    return email.utils.formatdate(ts if ts is not None else None, usegmt=True)
+    if ts is None:
+        date_line(); return _now_date[1]
+    return email.utils.formatdate(ts, usegmt=True)
+
+def date_line() -> bytes:
+    """The "Date: ..." header line for the current second, formatted once per second."""
+    global _now_date
+    now = int(time.time())
+    d = _now_date
+    if d[0] != now:
+        txt = email.utils.formatdate(now, usegmt=True)
+        d = _now_date = (now, txt, f"Date: {txt}{CRLF}".encode("iso-8859-1"))
+    return d[2]
 
+@functools.lru_cache(maxsize=64)
 def start_line(code: int, reason: str) -> bytes:
-    return f"HTTP/1.0 {code} {reason}{CRLF}".encode("iso-8859-1")
+    return f"HTTP/1.1 {code} {reason}{CRLF}".encode("iso-8859-1")
+
+@functools.lru_cache(maxsize=64)
+def static_headers(ctype: str, ranges: bool = False) -> bytes:
+    """Header lines that only depend on the content type, pre-encoded."""
+    return SERVER_LINE + header_bytes({"Content-Type": ctype, "Accept-Ranges": "bytes" if ranges else ""})
+
+@functools.lru_cache(maxsize=1024)
+def conn_line(keep_alive: bool, timeout: int = 0, left: int = 0) -> bytes:
+    if not keep_alive: return f"Connection: close{CRLF}".encode()
+    return f"Connection: keep-alive{CRLF}Keep-Alive: timeout={timeout}, max={left}{CRLF}".encode()
+
+def header_bytes(headers: Dict[str, str]) -> bytes:
+    return "".join(f"{k}: {v}{CRLF}" for k, v in headers.items() if v != "").encode("iso-8859-1")
 
-def send_headers(conn: socket.socket, headers: Dict[str, str]) -> None:
-    for k, v in headers.items():
-        conn.sendall(f"{k}: {v}{CRLF}".encode("iso-8859-1"))
-    conn.sendall(CRLF.encode("iso-8859-1"))
+def send_vectored(conn, bufs: list, flags: int = 0) -> int:
+    """
+    Writes bufs with one sendmsg (writev) per kernel accept instead of one
+    sendall per piece. Returns the number of write calls made; 0 for the
+    event loop's BufferedConn, which defers the actual send.
+    """
+    sendmsg = getattr(conn, "sendmsg", None)
+    if sendmsg is None:
+        conn.sendall(b"".join(bufs)); return 0
+    bufs = [memoryview(b) for b in bufs if b]
+    calls = 0
+    while bufs:
+        n = sendmsg(bufs, (), flags); calls += 1
+        while bufs and n >= len(bufs[0]):
+            n -= len(bufs.pop(0))
+        if n: bufs[0] = bufs[0][n:]
+    return calls
 
 def guess_mime(p: Path) -> str:
     ext = p.suffix.lower()
@@ -26,6 +91,53 @@ def guess_mime(p: Path) -> str:
     if ext in (".jpg", ".jpeg"): return "image/jpeg"
     return "application/octet-stream"
 
+def compressible(ctype: str) -> bool:
+    """Text is worth compressing; PNG/JPEG/PDF are already compressed."""
+    return ctype.startswith("text/") or ctype.startswith("application/json")
+
+def accepted_encodings(header: str | None) -> set:
+    """
+    Content codings the client accepts (q > 0) from an Accept-Encoding header.
+    "*" stands for every coding the header does not name, so gzip;q=0 with *
+    still refuses gzip.
+    """
+    out, refused = set(), set()
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        coding, q = coding.strip().lower(), 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k.lower() == "q":
+                try: q = float(v)
+                except ValueError: q = 0.0
+        if coding: (out if q > 0 else refused).add(coding)
+    if "*" in out: out |= {"br", "gzip"} - refused
+    return out
+
+def parse_range(value: str, size: int) -> Tuple[int, int] | None:
+    """
+    Parses a single-range "bytes=a-b" header into an inclusive (start, end).
+    Returns None for anything we choose to ignore (multi-range, other units),
+    raises ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    first, last = first.strip(), last.strip()
+    # anything but digits (signs, a second dash, "bytes=-") is a malformed range and ignored
+    if not dash or not (first + last).isdecimal():
+        return None
+    if first == "":
+        n = int(last)
+        if n == 0 or size == 0: raise ValueError("empty suffix range")
+        return max(0, size - n), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
 def fmt_size(n: int) -> str:
     for u in ("B","KB","MB","GB","TB"):
         if n < 1024: return f"{n:.0f} {u}"
@@ -43,20 +155,39 @@ def breadcrumb(root: Path, here: Path) -> str:
         crumbs.append(f'<a href="{href}">{p}/</a>')
     return " ".join(crumbs)
 
-def listing_html(root: Path, here: Path, counters: Dict[str,int]) -> bytes:
+PARENT_ROW = '<tr><td>📁</td><td><a href="../">Parent directory/</a></td><td>-</td><td>-</td><td>-</td></tr>'
+
+def listing_rows(root: Path, here: Path) -> list[tuple[str, str | None, str]]:
+    """
+    Pre-rendered listing rows as (html before the hits cell, counter key, html after).
+    The counter key is None for directories, which show "-" instead of hits.
+    """
+    with os.scandir(here) as it:
+        entries = sorted(it, key=lambda x: (x.is_file(), x.name.lower()))
+    rel = here.relative_to(root).as_posix()
+    base = "/" if rel == "." else f"/{rel}/"
     rows = []
-    if here != root:
-        rows.append('<tr><td>📁</td><td><a href="../">Parent directory/</a></td><td>-</td><td>-</td><td>-</td></tr>')
-    for entry in sorted(here.iterdir(), key=lambda x: (x.is_file(), x.name.lower())):
-        name = entry.name + ("/" if entry.is_dir() else "")
+    for entry in entries:
+        is_dir = entry.is_dir()
+        name = entry.name + ("/" if is_dir else "")
         href = urllib.parse.quote(name)
         st = entry.stat()
-        size = "-" if entry.is_dir() else fmt_size(st.st_size)
+        size = "-" if is_dir else fmt_size(st.st_size)
         mtime = datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M")
-        icon = "📁" if entry.is_dir() else ("🖼️" if entry.suffix.lower() in {".png",".jpg",".jpeg"} else "📄")
-        relpath = str((here / entry.name).relative_to(root)).replace("\\","/")
-        hits = counters.get("/"+relpath, 0) if not entry.is_dir() else "-"
-        rows.append(f"<tr><td>{icon}</td><td><a href=\"{href}\">{name}</a></td><td>{size}</td><td>{mtime}</td><td>{hits}</td></tr>")
+        icon = "📁" if is_dir else ("🖼️" if os.path.splitext(entry.name)[1].lower() in {".png",".jpg",".jpeg"} else "📄")
+        rows.append((f"<tr><td>{icon}</td><td><a href=\"{href}\">{name}</a></td><td>{size}</td><td>{mtime}</td><td>",
+                     None if is_dir else base + entry.name, "</td></tr>"))
+    return rows
+
+def listing_page(root: Path, here: Path, rows: list, hits: list, page: int = 0, pages: int = 1, total: int = 0) -> bytes:
+    """Renders one page of rows; hits[i] fills the hits cell of rows[i]."""
+    body = [PARENT_ROW] if here != root and page == 0 else []
+    body.extend(f"{h}{n}{t}" for (h, _, t), n in zip(rows, hits))
+    pager = ""
+    if pages > 1:
+        prev = f'<a href="?page={page}">&laquo; prev</a>' if page > 0 else ""
+        nxt = f'<a href="?page={page + 2}">next &raquo;</a>' if page + 1 < pages else ""
+        pager = f'<p>Page {page + 1} of {pages} ({total} entries) {prev} {nxt}</p>'
     html = f"""<!doctype html>
 <html><head><meta charset="utf-8"><title>Index of {here}</title>
 <style>
@@ -70,61 +201,260 @@ th{{background:#f3f4f6}}
 <h2>Index of {breadcrumb(root, here)} <span class="badge">hits per file</span></h2>
 <table>
 <thead><tr><th></th><th>Name</th><th>Size</th><th>Last modified</th><th>Hits</th></tr></thead>
-<tbody>{''.join(rows)}</tbody></table>
+<tbody>{''.join(body)}</tbody></table>
+{pager}
 </body></html>"""
     return html.encode()
 
-class TokenBucket:
-    def __init__(self, rate: float, burst: int):
-        self.rate = float(rate)
-        self.burst = int(max(1, burst))
-        self.tokens = float(self.burst)
-        self.last = time.monotonic()
+def listing_html(root: Path, here: Path, counters: Dict[str,int]) -> bytes:
+    rows = listing_rows(root, here)
+    return listing_page(root, here, rows, [counters.get(k, 0) if k else "-" for _, k, _ in rows])
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/ is ignored on either side."""
+    if not header: return False
+    if header.strip() == "*": return True
+    etag = etag.removeprefix("W/")
+    return any(t.strip().removeprefix("W/") == etag for t in header.split(","))
+
+def http_time(value: str) -> float | None:
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def not_modified(req_headers: Dict[str, str] | None, etag: str, mtime: float) -> bool:
+    """RFC 9110 13.2.2: If-None-Match decides when present, otherwise If-Modified-Since."""
+    if not req_headers: return False
+    inm = req_headers.get("if-none-match")
+    if inm is not None:
+        return etag_matches(inm, etag)
+    since = http_time(req_headers.get("if-modified-since", ""))
+    return since is not None and int(mtime) <= since
+
+def if_range_matches(value: str, etag: str, mtime: float) -> bool:
+    """If-Range needs a strong ETag match or the exact Last-Modified date."""
+    value = value.strip()
+    if value.startswith(('"', "W/")):
+        return value == etag
+    return http_time(value) == int(mtime)
+
+def cache_control_for(policies: Dict[str, str], ctype: str) -> str:
+    base = ctype.split(";")[0].strip().lower()
+    for k in (base, base.split("/")[0] + "/*", "*"):
+        if k in policies: return policies[k]
+    return ""
 
-    def allow(self) -> Tuple[bool, float, float]:
-        now = time.monotonic()
-        elapsed = max(0.0, now - self.last)
-        self.last = now
-        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
-        if self.tokens >= 1.0:
-            self.tokens -= 1.0
-            reset = (1.0 - self.tokens) / self.rate if self.rate > 0 else 0.0
-            return True, self.tokens, reset
-        need = 1.0 - self.tokens
-        wait = need / self.rate if self.rate > 0 else 1.0
-        return False, self.tokens, wait
+def wants_keep_alive(reqline: str, headers: Dict[str, str]) -> bool:
+    tok = headers.get("connection", "").lower()
+    if "close" in tok: return False
+    # we never read request bodies, so a body would desync the next request
+    if headers.get("content-length", "0") not in ("", "0") or "transfer-encoding" in headers:
+        return False
+    if reqline.rsplit(" ", 1)[-1].upper() == "HTTP/1.1": return True
+    return "keep-alive" in tok
+
+class ClientConn:
+    """A client socket plus keep-alive state: the request parser (holding pipelined bytes), requests served."""
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.parser = RequestParser()
+        self.keep_alive = False
+        self.served = 0
+        self.trace: list | None = None  # [ratelimit s, write s] for a sampled request
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+class BufferedConn:
+    """Socket stand-in for the event loop: collects the response for non-blocking writes."""
+    def __init__(self, keep_alive: bool, served: int = 0):
+        self.keep_alive, self.served = keep_alive, served
+        self.trace: list | None = None
+        self.out = bytearray()
+        self.file: tuple[int, int, int] | None = None
+
+    def sendall(self, b: bytes) -> None:
+        self.out += b
+
+    def sendfile(self, file, offset: int = 0, count: int | None = None) -> None:
+        # keep our own fd: the caller closes file as soon as we return
+        if count is None: count = os.fstat(file.fileno()).st_size - offset
+        self.file = (os.dup(file.fileno()), offset, count)
+
+class EvConn:
+    def __init__(self, conn: socket.socket, addr):
+        self.conn, self.addr = conn, addr
+        self.parser = RequestParser()
+        self.req: Tuple[str, Dict[str, str]] | HTTPError | None = None
+        self.out = memoryview(b"")
+        self.file: tuple[int, int, int] | None = None  # (fd, offset, remaining)
+        self.keep_alive = False
+        self.served = 0
+        self.last = time.monotonic()
 
 class HTTPServer:
     def __init__(self, host: str, port: int, docroot: Path, mode: str,
                  rate: float, burst: int, race_mode: bool,
-                 workers: int | None = None, max_queue: int = 256, delay: float = 0.0):
+                 workers: int | None = None, max_queue: int = 256, delay: float = 0.0,
+                 keepalive_timeout: float = 5.0, max_requests: int = 100, cache_mb: float = 0.0,
+                 listing_page_size: int = 1000, counter_mode: str = "sharded",
+                 counters_file: str | None = None, counters_flush: float = 5.0,
+                 max_buckets: int = 100_000, bucket_ttl: float = 0.0, max_workers: int | None = None,
+                 queue_target: float = 0.02, queue_interval: float = 0.2, compress_mb: float = 16.0,
+                 cache_control: Dict[str, str] | None = None, metrics_sample: float = DEFAULT_SAMPLE,
+                 drain_timeout: float = 10.0, path_cache: int = 10_000):
         self.host, self.port, self.docroot = host, port, docroot.resolve()
         self.mode, self.rate, self.burst = mode, float(max(0.0, rate)), int(max(1, burst))
         self.sock: socket.socket | None = None
         self._stop = threading.Event()
         self._counters: Dict[str,int] = {}
         self._counter_lock = threading.Lock()
+        self._hits = ShardedCounter()
+        self._io = ShardedCounter()  # responses / write calls, for /__stats
         self.race_mode = bool(race_mode)
-        self._buckets: Dict[str, TokenBucket] = {}
-        self._buckets_lock = threading.Lock()
+        # sharded: lock-free production path; locked/race: the sleep-based lab demos
+        self.counter_mode = "race" if self.race_mode else counter_mode
+        self.counters_file = counters_file
+        self.counters_flush = float(max(0.1, counters_flush))
+        self.limiter = RateLimiter(self.rate, self.burst, max_keys=max_buckets, ttl=bucket_ttl)
         cores = os.cpu_count() or 4
         self.workers = int(workers or min(32, max(1, 2 * cores)))
-        self.q: queue.Queue[tuple[socket.socket, tuple[str,int]]] = queue.Queue(maxsize=max(1, max_queue))
+        # --workers is the floor; the pool grows towards max_workers under load
+        self.pool = AdaptivePool(self._handle_wrapper, self._shed, self.workers,
+                                 int(max_workers or max(self.workers, 8 * self.workers)),
+                                 target=queue_target, interval=queue_interval, max_queue=max_queue)
         self.delay = float(delay)
+        self.keepalive_timeout = float(max(0.1, keepalive_timeout))
+        # pool workers hand idle kept-alive connections to one selector thread instead of blocking in recv()
+        self.watcher = KeepAliveWatcher(self._resume, self._expire, self.keepalive_timeout) if mode == "pool" else None
+        self.max_requests = int(max(1, max_requests))
+        self.cache = FileCache(int(cache_mb * 1024 * 1024)) if cache_mb > 0 else None
+        self.listings = ListingCache(lambda here: listing_rows(self.docroot, here))
+        self.paths = PathCache(self.docroot, guess_mime, max_entries=path_cache)
+        self.listing_page_size = int(max(0, listing_page_size))
+        self.metrics = Metrics(metrics_sample)
+        for name, kind, help in METRICS:
+            self.metrics.describe(name, kind, help)
+        self.cache_control = {**CACHE_CONTROL, **(cache_control or {})}
+        self.compressed = CompressCache(int(compress_mb * 1024 * 1024)) if compress_mb > 0 else None
+        self.shared: SharedStore | None = None
+        self.worker_idx = 0
+        self.reuse_port = False
+        self._served_lock = threading.Lock()
+        self._local_keys: set = set()  # paths the shared counter table had no room for
+        self.drain_timeout = float(max(0.0, drain_timeout))
+        self._active = 0  # accepted connections not yet closed (blocking modes)
+        self._idle: set = set()  # kept-alive sockets waiting for their next request
+        self._conn_cv = threading.Condition()
+        self._handed_off = False
+        self._drain_until: float | None = None
+
+    def attach(self, store: SharedStore, idx: int):
+        """Join a worker fleet: counters and buckets live in the shared store."""
+        self.shared, self.worker_idx, self.reuse_port = store, idx, True
 
     def _setup_signals(self):
         def handler(signum, frame):
-            print(f"\n[!] Signal {signum} received, shutting down...")
+            if self._stop.is_set():
+                print(f"\n[!] Signal {signum} again, exiting without draining"); os._exit(1)
+            print(f"\n[!] Signal {signum} received, draining (up to {self.drain_timeout:.0f}s)...")
             self._stop.set()
-            try:
-                if self.sock:
-                    self.sock.close()
-            except: pass
+        def restart(signum, frame):
+            if not self._stop.is_set() and not self.shared:
+                threading.Thread(target=self._hot_restart, daemon=True, name="restart").start()
         for sig in (signal.SIGINT, signal.SIGTERM):
             signal.signal(sig, handler)
+        for sig in (signal.SIGHUP, signal.SIGUSR2):
+            signal.signal(sig, restart)
+
+    def _hot_restart(self, ready_timeout: float = 30.0):
+        """
+        Starts a fresh `python server.py ...` that inherits the listening socket,
+        waits until it reports ready, then drains this process. The socket is
+        never closed in between, so no connection is refused during a deploy.
+        """
+        assert self.sock
+        fd = self.sock.fileno()
+        r, w = os.pipe()
+        try:
+            self._flush_counters()
+            env = {**os.environ, LISTEN_FD_ENV: str(fd), READY_FD_ENV: str(w)}
+            proc = subprocess.Popen([sys.executable, *sys.argv], env=env, pass_fds=(fd, w))
+        except OSError as e:
+            os.close(r); os.close(w)
+            print(f"[!] hot restart failed: {e}"); return
+        os.close(w)
+        ready = selectors.DefaultSelector()
+        ready.register(r, selectors.EVENT_READ)
+        ok = bool(ready.select(ready_timeout)) and os.read(r, 1) == b"1"
+        ready.close(); os.close(r)
+        if not ok:
+            print(f"[!] hot restart: pid {proc.pid} did not become ready, keeping this process")
+            proc.kill(); return
+        print(f"[+] hot restart: pid {proc.pid} is serving, draining pid {os.getpid()}")
+        # the successor owns the counters file from here on
+        self._handed_off, self.counters_file = True, None
+        self._stop.set()
+
+    def _listen_socket(self) -> socket.socket:
+        inherited = os.environ.pop(LISTEN_FD_ENV, None)
+        if inherited:
+            return socket.socket(fileno=int(inherited))
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        s.bind((self.host, self.port)); s.listen(128)
+        return s
+
+    def _notify_ready(self):
+        fd = os.environ.pop(READY_FD_ENV, None)
+        if fd:
+            try: os.write(int(fd), b"1")
+            finally: os.close(int(fd))
+
+    def _conn_opened(self):
+        with self._conn_cv:
+            self._active += 1
+
+    def _conn_closed(self, sock=None):
+        with self._conn_cv:
+            self._idle.discard(sock)
+            self._active -= 1
+            self._conn_cv.notify_all()
+
+    def _drain_deadline(self) -> float:
+        if self._drain_until is None:
+            self._drain_until = time.monotonic() + self.drain_timeout
+        return self._drain_until
+
+    def _drain(self):
+        """After the accept loop stopped: lets queued and in-flight connections finish, up to drain_timeout."""
+        deadline = self._drain_deadline()
+        with self._conn_cv:
+            self._close_idle()
+            while self._active > 0:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    print(f"[!] drain timeout: abandoning {self._active} connection(s)"); return
+                self._conn_cv.wait(min(left, 0.5))
+                self._close_idle()
+
+    def _close_idle(self):
+        # caller holds _conn_cv; a shut-down read side makes the blocked recv() return EOF
+        for sock in list(self._idle):
+            try: sock.shutdown(socket.SHUT_RD)
+            except OSError: pass
+        self._idle.clear()
 
     def inc_counter(self, path: str):
-        if self.race_mode:
+        # a key the fleet's shared table cannot hold is counted in this process instead
+        if self.shared and path not in self._local_keys and self._shared_inc(path):
+            return
+        if self.counter_mode == "sharded":
+            self._hits.inc(path); return
+        if self.counter_mode == "race":
             cur = self._counters.get(path, 0)
             time.sleep(0.01)
             self._counters[path] = cur + 1
@@ -134,125 +464,445 @@ class HTTPServer:
                 time.sleep(0.01)
                 self._counters[path] = cur + 1
 
+    def _shared_inc(self, path: str) -> bool:
+        st = self.shared
+        assert st
+        if self.counter_mode == "sharded":
+            ok = st.incr(path)
+        elif self.counter_mode == "race":
+            cur = st.get_count(path)
+            time.sleep(0.01)
+            ok = st.set_count(path, cur + 1)
+        else:
+            with st.counters.lock:
+                cur = st.get_count(path)
+                time.sleep(0.01)
+                ok = st.set_count(path, cur + 1)
+        if not ok:
+            if not self._local_keys:
+                print(f"[!] worker {self.worker_idx}: shared counter table full ({st.counters.slots} slots) "
+                      f"or key too long; counting such paths per process (see counters_overflow in /__metrics)")
+            self._local_keys.add(path)
+        return ok
+
+    def count_for(self, path: str) -> int:
+        if self.shared and path not in self._local_keys:
+            return self.shared.get_count(path)
+        return self._hits.get(path) if self.counter_mode == "sharded" else self._counters.get(path, 0)
+
     def counters_snapshot(self) -> Dict[str,int]:
-        with self._counter_lock:
-            return dict(self._counters)
+        if self.counter_mode == "sharded":
+            local = self._hits.snapshot()
+        else:
+            with self._counter_lock:
+                local = dict(self._counters)
+        if self.shared:
+            snap = self.shared.counters_snapshot()
+            for k, n in local.items():
+                snap[k] = snap.get(k, 0) + n
+            return snap
+        return local
+
+    def counters_count(self) -> int:
+        """Number of counted paths, without merging the counts the way counters_snapshot() does."""
+        if self.shared:
+            # paths the shared table could not hold are the only ones counted here
+            return len(self.shared.counters) + len(self._local_keys)
+        return len(self._hits) if self.counter_mode == "sharded" else len(self._counters)
+
+    def _load_counters(self):
+        if not self.counters_file or self.shared: return
+        counts = load_counts(self.counters_file)
+        if self.counter_mode == "sharded":
+            self._hits = ShardedCounter(counts)
+        else:
+            self._counters.update(counts)
+
+    def _flush_counters(self):
+        # in a fleet, worker 0 writes the fleet-wide view for everyone
+        if not self.counters_file or (self.shared and self.worker_idx != 0): return
+        try:
+            save_counts(self.counters_file, self.counters_snapshot())
+        except OSError as e:
+            print(f"[!] counter flush failed: {e}")
+
+    def _flusher(self):
+        while not self._stop.wait(self.counters_flush):
+            self._flush_counters()
 
     def check_rate(self, ip: str) -> Tuple[bool, float, float]:
         if self.rate <= 0:
             return True, 0.0, 0.0
-        with self._buckets_lock:
-            b = self._buckets.get(ip)
-            if b is None:
-                b = self._buckets[ip] = TokenBucket(self.rate, self.burst)
-        return b.allow()
+        if self.shared:
+            lim = self.limiter
+            now = time.monotonic()
+            def step(v):
+                tat, res = gcra_step(v[0], now, lim.interval, lim.tau)
+                return (tat,), res
+            # a slot whose bucket has refilled is as good as empty
+            return self.shared.buckets.update(ip.encode(), (now,), step,
+                                              reusable=lambda v: v[0] + lim.ttl <= now)
+        return self.limiter.allow(ip)
 
     def start(self):
         self._setup_signals()
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s = self._listen_socket()
         s.settimeout(1.0)
-        s.bind((self.host, self.port)); s.listen(128)
         self.sock = s
-        print(f"[+] {SERVER_NAME} on {self.host}:{self.port} serving {self.docroot} ({self.mode})")
+        self._load_counters()
+        if self.counters_file:
+            threading.Thread(target=self._flusher, daemon=True, name="flush").start()
+        tag = f"{self.mode}, worker {self.worker_idx} pid {os.getpid()}" if self.shared else self.mode
+        print(f"[+] {SERVER_NAME} on {self.host}:{self.port} serving {self.docroot} ({tag})")
+        self._notify_ready()
         try:
             if self.mode == "threaded":
                 self._serve_threaded()
             elif self.mode == "pool":
                 self._serve_pool()
+            elif self.mode == "evloop":
+                self._serve_evloop()
             else:
                 self._serve_single()
         finally:
+            # after a hot restart the successor still holds its own copy of this socket
             try: s.close()
             except: pass
+            self._drain()
+            self._flush_counters()
 
     def _accept_loop(self):
+        """Next accepted connection; (None, None) once stopping and the backlog is empty."""
         assert self.sock
-        while not self._stop.is_set():
+        while True:
+            stopping = self._stop.is_set()
+            if stopping:
+                # a draining process still owes an answer to what is already in the backlog,
+                # unless a hot-restarted successor is accepting from the same socket
+                if self._handed_off or time.monotonic() > self._drain_deadline(): return None, None
+                self.sock.settimeout(0.0)
             try:
                 conn, addr = self.sock.accept()
-                return conn, addr
-            except socket.timeout:
+            except (socket.timeout, BlockingIOError):
+                if stopping: return None, None
                 continue
             except OSError:
-                break
-        return None, None
+                return None, None
+            # responses leave in whole writes already; Nagle would only hold back the tail
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._conn_opened()
+            return conn, addr
 
     def _serve_single(self):
-        while not self._stop.is_set():
+        while True:
             conn, addr = self._accept_loop()
-            if not conn: continue
-            try:
-                self._handle_wrapper(conn, addr)
-            finally:
-                try: conn.close()
-                except: pass
+            if not conn: break
+            self._handle_wrapper(conn, addr)
 
     def _serve_threaded(self):
-        while not self._stop.is_set():
+        while True:
             conn, addr = self._accept_loop()
-            if not conn: continue
+            if not conn: break
             t = threading.Thread(target=self._handle_wrapper, args=(conn, addr), daemon=True, name="req")
             t.start()
 
     def _serve_pool(self):
-        for i in range(self.workers):
-            threading.Thread(target=self._worker, daemon=True, name=f"w{i}").start()
-        while not self._stop.is_set():
-            conn, addr = self._accept_loop()
-            if not conn: continue
-            try:
-                self.q.put((conn, addr), block=True, timeout=1.0)
-            except queue.Full:
+        assert self.watcher
+        self.pool.start()
+        self.watcher.start()
+        try:
+            while True:
+                conn, addr = self._accept_loop()
+                if not conn: break
+                if not self.pool.submit(conn, addr):
+                    self._shed(conn, addr)
+        finally:
+            self.watcher.close()
+            self.pool.stop()
+
+    def _resume(self, conn: ClientConn, addr):
+        """A parked keep-alive connection has its next request arriving: back into the pool queue."""
+        if not self.pool.submit(conn, addr):
+            self._shed(conn, addr)
+
+    def _expire(self, conn: ClientConn, addr):
+        try: conn.close()
+        except: pass
+        self._conn_closed(conn.sock)
+
+    def _shed(self, conn, addr):
+        """Turns away a connection the pool will not serve: 503 without reading the request."""
+        c = conn if isinstance(conn, ClientConn) else ClientConn(conn)
+        c.keep_alive = False
+        try:
+            self._send_simple(c, 503, "Service Unavailable", b"Server overloaded", {"Retry-After": "1"})
+        except: pass
+        try: c.close()
+        except: pass
+        self._conn_closed(c.sock)
+
+    def _serve_evloop(self):
+        assert self.sock
+        self.sock.setblocking(False)
+        sel = selectors.DefaultSelector()
+        sel.register(self.sock, selectors.EVENT_READ, None)
+        self._ev_timers: list[tuple[float, int, EvConn]] = []
+        self._ev_seq = 0
+        next_sweep = time.monotonic() + 1.0
+        drain_until = None
+        try:
+            while True:
+                if self._stop.is_set():
+                    if drain_until is None:
+                        # stop accepting; in-flight requests and responses still finish
+                        drain_until = self._drain_deadline()
+                        sel.unregister(self.sock)
+                    for key in list(sel.get_map().values()):
+                        st = key.data
+                        if key.events == selectors.EVENT_READ and st.served and st.req is None and not len(st.parser):
+                            self._ev_close(sel, st)  # idle keep-alive; fresh connections still get their answer
+                    if not sel.get_map() and not self._ev_timers:
+                        break
+                    if time.monotonic() > drain_until:
+                        print(f"[!] drain timeout: abandoning {len(sel.get_map()) + len(self._ev_timers)} connection(s)")
+                        break
+                timers = self._ev_timers
+                timeout = 1.0
+                if timers:
+                    timeout = max(0.0, min(timeout, timers[0][0] - time.monotonic()))
                 try:
-                    self._send_simple(conn, 503, "Service Unavailable", b"Server overloaded")
-                except: pass
-                try: conn.close()
+                    events = sel.select(timeout)
+                except OSError:
+                    break
+                for key, mask in events:
+                    st = key.data
+                    if st is None:
+                        self._ev_accept(sel)
+                    elif mask & selectors.EVENT_READ:
+                        self._ev_read(sel, st)
+                    elif mask & selectors.EVENT_WRITE:
+                        self._ev_write(sel, st)
+                now = time.monotonic()
+                while timers and timers[0][0] <= now:
+                    self._ev_respond(sel, heapq.heappop(timers)[2])
+                if now >= next_sweep:
+                    next_sweep = now + 1.0
+                    for key in list(sel.get_map().values()):
+                        st = key.data
+                        if st is not None and key.events == selectors.EVENT_READ and now - st.last > self.keepalive_timeout:
+                            self._ev_close(sel, st)
+        finally:
+            for key in list(sel.get_map().values()):
+                if key.data is not None:
+                    self._ev_close(sel, key.data)
+            for _, _, st in self._ev_timers:
+                try: st.conn.close()
                 except: pass
+            sel.close()
 
-    def _worker(self):
-        while not self._stop.is_set():
-            try:
-                conn, addr = self.q.get(timeout=1.0)
-            except queue.Empty:
-                continue
+    def _ev_accept(self, sel):
+        assert self.sock
+        for _ in range(64):
             try:
-                self._handle_wrapper(conn, addr)
-            finally:
-                self.q.task_done()
-                try: conn.close()
-                except: pass
+                conn, addr = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            conn.setblocking(False)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sel.register(conn, selectors.EVENT_READ, EvConn(conn, addr))
+
+    def _ev_read(self, sel, st: EvConn):
+        try:
+            chunk = st.conn.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            chunk = b""
+        if not chunk:
+            self._ev_close(sel, st); return
+        st.parser.feed(chunk)
+        st.last = time.monotonic()
+        if self._ev_ready(st):
+            sel.unregister(st.conn)
+            self._ev_schedule(st)
+
+    def _ev_ready(self, st: EvConn) -> bool:
+        """Parks the next complete request (or parse error) on st; False while the head is incomplete."""
+        try:
+            st.req = st.parser.next()
+        except HTTPError as e:
+            st.req = e
+        return st.req is not None
+
+    def _ev_schedule(self, st: EvConn):
+        self._ev_seq += 1
+        heapq.heappush(self._ev_timers, (time.monotonic() + self.delay, self._ev_seq, st))
+
+    def _ev_respond(self, sel, st: EvConn):
+        req, st.req = st.req, None
+        if req is None:
+            self._ev_close(sel, st); return
+        try:
+            if isinstance(req, HTTPError):
+                bc = BufferedConn(False, st.served)
+                self._send_simple(bc, req.code, req.reason, str(req).encode())
+            else:
+                bc = BufferedConn(self._keep_alive(st, *req), st.served)
+                self._dispatch(bc, st.addr, *req)
+        except Exception as e:
+            bc.keep_alive = False
+            try: self._send_simple(bc, 500, "Internal Server Error", str(e).encode())
+            except: pass
+        st.served += 1
+        st.keep_alive = bc.keep_alive
+        st.out = memoryview(bytes(bc.out))
+        st.file = bc.file
+        if not st.out and not st.file:
+            self._ev_close(sel, st); return
+        sel.register(st.conn, selectors.EVENT_WRITE, st)
+        self._ev_write(sel, st)
+
+    def _ev_write(self, sel, st: EvConn):
+        try:
+            if st.out:
+                more = socket.MSG_MORE if st.file and hasattr(socket, "MSG_MORE") else 0
+                st.out = st.out[st.conn.send(st.out, more):]
+                self._io.inc("writes")
+                if st.out: return
+            if st.file and not self._ev_send_file(st):
+                return
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._ev_close(sel, st); return
+        if not st.keep_alive or self._stop.is_set():
+            self._ev_close(sel, st); return
+        st.last = time.monotonic()
+        if self._ev_ready(st):
+            # pipelined request already buffered
+            sel.unregister(st.conn)
+            self._ev_schedule(st)
+        else:
+            sel.modify(st.conn, selectors.EVENT_READ, st)
+
+    def _ev_send_file(self, st: EvConn) -> bool:
+        """Pushes the next slice of the pending file body; True once it is fully sent."""
+        assert st.file
+        fd, off, left = st.file
+        if hasattr(os, "sendfile"):
+            n = os.sendfile(st.conn.fileno(), fd, off, min(left, 1 << 20))
+        else:
+            n = st.conn.send(os.pread(fd, min(left, 1 << 16), off))
+        if n == 0:
+            raise OSError("file truncated while sending")
+        left -= n
+        if left > 0:
+            st.file = (fd, off + n, left); return False
+        os.close(fd); st.file = None
+        return True
+
+    def _ev_close(self, sel, st: EvConn):
+        if st.file:
+            os.close(st.file[0]); st.file = None
+        try: sel.unregister(st.conn)
+        except (KeyError, ValueError): pass
+        try: st.conn.close()
+        except: pass
 
     def _handle_wrapper(self, conn, addr):
+        # a ClientConn comes back from the keep-alive watcher with its parser and request count
+        c = conn if isinstance(conn, ClientConn) else ClientConn(conn)
+        parked = False
         try:
-            self._handle(conn, addr)
+            parked = self._handle(c, addr)
         except Exception as e:
+            c.keep_alive = False
             try:
-                self._send_simple(conn, 500, "Internal Server Error", str(e).encode())
+                self._send_simple(c, 500, "Internal Server Error", str(e).encode())
             except: pass
+        finally:
+            if not parked:
+                try: c.close()
+                except: pass
+                self._conn_closed(c.sock)
+
+    def _read_request(self, conn: ClientConn, timeout: float = 5.0) -> Tuple[str, Dict[str, str]]:
+        """Next request head on conn; ("", {}) on EOF or idle timeout. Raises HTTPError on bad input."""
+        conn.settimeout(timeout)
+        parser = conn.parser
+        while True:
+            req = parser.next()
+            if req: return req
+            try:
+                chunk = conn.recv(65536)
+            except (socket.timeout, ConnectionError):
+                return "", {}
+            if not chunk: return "", {}
+            parser.feed(chunk)
+
+    def _keep_alive(self, conn, reqline: str, headers: Dict[str, str]) -> bool:
+        # single mode has one thread for every client: an idle kept-alive connection would hold up the
+        # accept loop, so it only stays open for requests that are already pipelined into the buffer
+        return (wants_keep_alive(reqline, headers) and not self._stop.is_set()
+                and conn.served + 1 < self.max_requests and (self.mode != "single" or len(conn.parser) > 0))
 
-    def _read_request(self, conn) -> Tuple[str, Dict[str, str]]:
-        data = b""
-        conn.settimeout(5.0)
-        while CRLF.encode()*2 not in data:
-            chunk = conn.recv(4096)
-            if not chunk: break
-            data += chunk
-            if len(data) > 64*1024: break
-        txt = data.decode("iso-8859-1", errors="replace")
-        lines = txt.split(CRLF)
-        if not lines or not lines[0]: return "", {}
-        reqline = lines[0]; headers = {}
-        for line in lines[1:]:
-            if not line: break
-            if ":" in line:
-                k,v = line.split(":",1); headers[k.strip().lower()] = v.strip()
-        return reqline, headers
-
-    def _handle(self, conn: socket.socket, addr):
-        if self.delay > 0: time.sleep(self.delay)
+    def _handle(self, conn: ClientConn, addr) -> bool:
+        """Serves requests on conn; True once it was parked with the keep-alive watcher (still open)."""
+        timeout = 5.0
+        # the first request is always answered; while stopping, _keep_alive ends the loop after it
+        while True:
+            try:
+                reqline, headers = self._read_request(conn, timeout)
+                if conn.sock in self._idle:
+                    with self._conn_cv: self._idle.discard(conn.sock)
+            except HTTPError as e:
+                conn.keep_alive = False
+                self._send_simple(conn, e.code, e.reason, str(e).encode()); return False
+            if not reqline: return False
+            conn.keep_alive = self._keep_alive(conn, reqline, headers)
+            if self.delay > 0: time.sleep(self.delay)
+            self._dispatch(conn, addr, reqline, headers)
+            conn.served += 1
+            if not conn.keep_alive: return False
+            timeout = self.keepalive_timeout
+            if not len(conn.parser):
+                if self.watcher:
+                    self.watcher.park(conn, addr); return True
+                with self._conn_cv:
+                    if self._stop.is_set(): return False
+                    self._idle.add(conn.sock)
+
+    def _dispatch(self, conn, addr, reqline: str, headers: Dict[str, str]):
+        if not self.metrics.sampled():
+            conn.trace = None
+            self._route(conn, addr, reqline, headers); return
+        t0 = time.perf_counter()
+        conn.trace = [0.0, 0.0]
+        try:
+            self._route(conn, addr, reqline, headers)
+        finally:
+            total = time.perf_counter() - t0
+            limiter, write = conn.trace
+            conn.trace = None
+            m = self.metrics
+            m.observe("request_duration_seconds", total)
+            m.observe("phase_duration_seconds", limiter, PHASE_RATELIMIT)
+            m.observe("phase_duration_seconds", write, PHASE_WRITE)
+            m.observe("phase_duration_seconds", max(0.0, total - limiter - write), PHASE_FS)
+
+    def _route(self, conn, addr, reqline: str, headers: Dict[str, str]):
+        if self.shared:
+            with self._served_lock:
+                self.shared.worker_served(self.worker_idx)
         ip, _ = addr
-        allowed, remaining_tokens, wait = self.check_rate(ip)
+        if conn.trace is None:
+            allowed, remaining_tokens, wait = self.check_rate(ip)
+        else:
+            t = time.perf_counter()
+            allowed, remaining_tokens, wait = self.check_rate(ip)
+            conn.trace[0] += time.perf_counter() - t
         if not allowed:
             extra = {
                 "Retry-After": str(int(wait)),
@@ -261,11 +911,10 @@ class HTTPServer:
             }
             self._send_simple(conn, 429, "Too Many Requests", b"Rate limit exceeded", extra)
             return
-        reqline, headers = self._read_request(conn)
-        if not reqline: return
         try:
             method, target, _ = reqline.split()
         except ValueError:
+            conn.keep_alive = False
             self._send_simple(conn, 400, "Bad Request", b"Malformed request line"); return
         if target == "/__health":
             self._send_simple(conn, 200, "OK", b"ok", {"Content-Type":"text/plain; charset=utf-8"}); return
@@ -273,105 +922,394 @@ class HTTPServer:
             snap = self.counters_snapshot()
             body = json.dumps(snap, indent=2, sort_keys=True).encode()
             self._send_simple(conn, 200, "OK", body, {"Content-Type":"application/json; charset=utf-8"}); return
+        if target == "/__metrics":
+            const = (("worker", str(self.worker_idx)),) if self.shared else ()
+            body = self.metrics.render(flatten(self.stats()), const).encode()
+            self._send_simple(conn, 200, "OK", body, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}); return
         if target == "/__stats":
-            body = json.dumps({
-                "mode": self.mode, "workers": self.workers,
-                "rate": self.rate, "burst": self.burst,
-                "files_counted": len(self._counters),
-                "buckets": len(self._buckets),
-            }, indent=2).encode()
-            self._send_simple(conn, 200, "OK", body, {"Content-Type":"application/json; charset=utf-8"}); return
+            self._send_simple(conn, 200, "OK", json.dumps(self.stats(), indent=2).encode(),
+                              {"Content-Type":"application/json; charset=utf-8"}); return
         if method not in ("GET","HEAD"):
             self._send_simple(conn, 405, "Method Not Allowed", b"Only GET/HEAD", {"Allow":"GET, HEAD"}); return
         extra_ok = {
             "X-RateLimit-Limit": str(self.rate),
             "X-RateLimit-Remaining": str(int(remaining_tokens)) if self.rate > 0 else "",
         }
-        self._serve_path(conn, target, method, extra_ok)
+        self._serve_path(conn, target, method, extra_ok, headers)
+
+    def stats(self) -> dict:
+        st = {
+            "mode": self.mode, "workers": self.workers,
+            "rate": self.rate, "burst": self.burst,
+            "counter_mode": self.counter_mode,
+            "files_counted": self.counters_count(),
+            "buckets": len(self.limiter),
+            "ratelimit": self.limiter.stats(),
+        }
+        st["listings"] = self.listings.stats()
+        st["paths"] = self.paths.stats()
+        if self.mode == "pool":
+            st["pool"] = self.pool.stats()
+            if self.watcher: st["keepalive"] = self.watcher.stats()
+        io = self._io.snapshot()
+        n = max(1, io.get("responses", 0))
+        st["io"] = {"responses": io.get("responses", 0), "writes": io.get("writes", 0),
+                    "syscalls_per_response": round(io.get("writes", 0) / n, 2),
+                    "legacy_syscalls_per_response": round(io.get("legacy_writes", 0) / n, 2),
+                    "saved": io.get("legacy_writes", 0) - io.get("writes", 0)}
+        st["compression"] = {**(self.compressed.stats() if self.compressed else {"enabled": False}),
+                             "precompressed": io.get("precompressed", 0),
+                             "responses": {c: io.get(f"encoded_{c}", 0) for c in ENCODED_SUFFIX}}
+        if self.cache:
+            st["cache"] = self.cache.stats()
+        if self.shared:
+            fleet = self.shared.fleet()
+            st.update({
+                "buckets": len(self.shared.buckets),
+                "counters": {**self.shared.counter_stats(), "local_keys": len(self._local_keys)},
+                "ratelimit": {"slots": self.shared.buckets.slots, "used": len(self.shared.buckets),
+                              "recycled": self.shared.buckets.recycled.value,
+                              "overflow": self.shared.buckets.overflow.value},
+                "processes": self.shared.processes,
+                "worker": self.worker_idx,
+                "requests_total": sum(w["requests"] for w in fleet),
+                "restarts_total": sum(w["restarts"] for w in fleet),
+                "fleet": fleet,
+            })
+        return st
 
-    def _serve_path(self, conn, target: str, method: str, extra_headers: Dict[str,str]):
+    def _serve_path(self, conn, target: str, method: str, extra_headers: Dict[str,str],
+                    req_headers: Dict[str,str] | None = None):
         parsed = urllib.parse.urlsplit(target)
-        path = urllib.parse.unquote(parsed.path)
-        if not path.startswith("/"): path = "/" + path
-        fs = (self.docroot / path.lstrip("/")).resolve()
         try:
-            if not str(fs).startswith(str(self.docroot)):
+            r = self.paths.get(parsed.path)
+            path, fs = r.path, r.fs
+            if r.kind == "forbidden":
                 self._send_simple(conn, 403, "Forbidden", b"Forbidden"); return
             self.inc_counter(path)
-            if fs.is_dir():
+            # negotiated text goes through _send_file, which owns the compressed variants
+            if self.cache and r.kind == "file" and not path.endswith("/") and not self._codings(r.ctype, req_headers):
+                entry = self.cache.get(str(fs))
+                if entry is None and r.ctype in ALLOWED:
+                    ctype = r.ctype
+                    entry = self.cache.load(fs, ctype, lambda st: header_bytes({
+                        "Server": SERVER_NAME, "Content-Type": ctype, "Accept-Ranges": "bytes",
+                        "Last-Modified": http_date(st.st_mtime), "ETag": file_etag(st),
+                        "Cache-Control": cache_control_for(self.cache_control, ctype),
+                        "Vary": "Accept-Encoding" if compressible(ctype) else ""}))
+                if entry:
+                    self._send_cached(conn, entry, method, extra_headers, req_headers); return
+            if r.kind == "dir":
                 if not path.endswith("/"):
-                    conn.sendall(start_line(301,"Moved Permanently"))
-                    hdr = {
-                        "Date": http_date(None), "Server": SERVER_NAME,
-                        "Location": urllib.parse.quote(path + "/"),
-                        "Connection": "close", "Content-Length":"0",
-                    }
-                    hdr.update(extra_headers)
-                    send_headers(conn, hdr); return
-                idx = fs / "index.html"
-                if idx.exists() and idx.is_file():
-                    self._send_file(conn, idx, "text/html; charset=utf-8", method, extra_headers)
+                    self._respond(conn, 301, "Moved Permanently",
+                                  {"Location": urllib.parse.quote(path + "/"), **extra_headers},
+                                  static=SERVER_LINE); return
+                if r.index:
+                    self._send_file(conn, r.index, "text/html; charset=utf-8", method, extra_headers, req_headers)
                 else:
-                    body = listing_html(self.docroot, fs, self.counters_snapshot())
-                    self._send_simple(conn, 200, "OK", body, {"Content-Type":"text/html; charset=utf-8", **extra_headers})
+                    self._send_listing(conn, fs, parsed.query, method, extra_headers, req_headers)
                 return
-            if not fs.is_file():
+            if r.kind != "file":
                 self._send_simple(conn, 404, "Not Found", b"File not found"); return
-            ctype = guess_mime(fs)
-            if ctype not in ALLOWED:
+            if r.ctype not in ALLOWED:
                 self._send_simple(conn, 404, "Not Found", b"Unknown file type"); return
-            self._send_file(conn, fs, ctype, method, extra_headers)
+            self._send_file(conn, fs, r.ctype, method, extra_headers, req_headers)
+        except (FileNotFoundError, NotADirectoryError):
+            # removed after it was resolved; the inotify event or TTL drops the entry
+            self._send_simple(conn, 404, "Not Found", b"File not found")
         except PermissionError:
             self._send_simple(conn, 403, "Forbidden", b"Forbidden")
         except Exception as e:
             self._send_simple(conn, 500, "Internal Server Error", str(e).encode())
 
-    def _send_file(self, conn, path: Path, ctype: str, method: str, extra_headers: Dict[str,str]):
-        body = path.read_bytes()
-        conn.sendall(start_line(200,"OK"))
-        headers = {
-            "Date": http_date(None), "Server": SERVER_NAME,
-            "Content-Type": ctype, "Content-Length": str(len(body)),
-            "Last-Modified": http_date(path.stat().st_mtime),
-            "Connection": "close",
-        }
-        headers.update({k:v for k,v in extra_headers.items() if v})
-        send_headers(conn, headers)
-        if method != "HEAD":
-            conn.sendall(body)
-
-    def _send_simple(self, conn, code, reason, body: bytes, extra: Dict[str,str]|None=None):
-        conn.sendall(start_line(code, reason))
-        headers = {
-            "Date": http_date(None), "Server": SERVER_NAME,
-            "Content-Type": "text/plain; charset=utf-8",
-            "Content-Length": str(len(body)), "Connection":"close",
-        }
-        if extra: headers.update(extra)
-        send_headers(conn, headers)
-        conn.sendall(body)
+    def _send_listing(self, conn, fs: Path, query: str, method: str, extra_headers: Dict[str,str],
+                      req_headers: Dict[str,str] | None = None):
+        listing = self.listings.get(fs)
+        rows, total = listing.rows, len(listing.rows)
+        page, pages = 0, 1
+        if self.listing_page_size and total > self.listing_page_size:
+            pages = (total + self.listing_page_size - 1) // self.listing_page_size
+            try:
+                page = min(pages, max(1, int(urllib.parse.parse_qs(query).get("page", ["1"])[0]))) - 1
+            except ValueError:
+                page = 0
+            rows = rows[page * self.listing_page_size:(page + 1) * self.listing_page_size]
+        # the rows' digest covers names, sizes and dates; the hits column changes on its own
+        hits = [self.count_for(k) if k else "-" for _, k, _ in rows]
+        etag = f'l{listing.mtime_ns:x}-{page}-{zlib.crc32(repr(hits).encode(), listing.digest):08x}'
+        coding = next(iter(self._codings("text/html", req_headers, on_the_fly=True)), "")
+        tagged = f'"{etag}-{coding}"' if coding else f'"{etag}"'
+        cache_headers = {"ETag": tagged, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if etag_matches((req_headers or {}).get("if-none-match"), tagged):
+            self._send_not_modified(conn, {**cache_headers, **extra_headers}); return
+        render = lambda: listing_page(self.docroot, fs, rows, hits, page, pages, total)
+        if coding:
+            assert self.compressed
+            body = self.compressed.get((etag,), coding, render)
+            cache_headers["Content-Encoding"] = coding
+            self._io.inc(f"encoded_{coding}")
+        else:
+            body = render()
+        self._send_simple(conn, 200, "OK", body, {"Content-Type":"text/html; charset=utf-8",
+                                                  **cache_headers, **extra_headers}, method=method)
+
+    def _codings(self, ctype: str, req_headers: Dict[str,str] | None, on_the_fly: bool = False) -> list:
+        """
+        Content codings to try for this response, best first; empty means identity.
+        Range requests always get identity so offsets keep meaning the file's bytes.
+        """
+        if not req_headers or not compressible(ctype) or "range" in req_headers:
+            return []
+        acc = accepted_encodings(req_headers.get("accept-encoding"))
+        if on_the_fly:
+            return [c for c in CODINGS if c in acc] if self.compressed else []
+        return [c for c in ENCODED_SUFFIX if c in acc]
+
+    def _send_not_modified(self, conn, extra: Dict[str,str]):
+        self._respond(conn, 304, "Not Modified", extra, static=SERVER_LINE, length=False)
+
+    def _range(self, conn, req_headers: Dict[str,str] | None, size: int, etag: str = "", mtime: float = 0.0):
+        """
+        Resolves the Range header against size into (code, reason, start, length, headers).
+        A failed If-Range means the whole file. Returns None after answering 416 itself.
+        """
+        rng = (req_headers or {}).get("range")
+        if rng and "if-range" in req_headers and not if_range_matches(req_headers["if-range"], etag, mtime):
+            rng = None
+        if rng:
+            try:
+                span = parse_range(rng, size)
+            except ValueError:
+                self._send_simple(conn, 416, "Range Not Satisfiable", b"Range not satisfiable",
+                                  {"Content-Range": f"bytes */{size}"}); return None
+            if span:
+                start, end = span
+                return 206, "Partial Content", start, end - start + 1, {"Content-Range": f"bytes {start}-{end}/{size}"}
+        return 200, "OK", 0, size, {}
+
+    def _respond(self, conn, code: int, reason: str, headers: Dict[str,str], body=b"",
+                 static: bytes = b"", method: str = "GET", file: tuple | None = None, length: bool = True):
+        """
+        Writes one response. The status line, Date and static header bytes are
+        cached; together with the dynamic headers and a small body they leave in
+        a single sendmsg. file=(path, offset, count) is streamed with sendfile
+        after the head, which is sent with MSG_MORE so both share a packet.
+        """
+        trace = conn.trace
+        if trace is not None: t0 = time.perf_counter()
+        size = file[2] if file else len(body)
+        head = [start_line(code, reason), date_line(), static]
+        if length: head.append(f"Content-Length: {size}{CRLF}".encode())
+        head += [header_bytes(headers), self._conn_line(conn), CRLF.encode()]
+        bufs = [b"".join(head)]
+        send_body = method != "HEAD" and size > 0
+        if send_body and not file: bufs.append(body)
+        more = send_body and file is not None and hasattr(socket, "MSG_MORE")
+        writes = send_vectored(conn, bufs, socket.MSG_MORE if more else 0)
+        # the old layout: one sendall per header line, the blank line and the body
+        self._io.inc("responses"); self._io.inc("writes", writes)
+        self._io.inc("legacy_writes", bufs[0].count(b"\n") + int(send_body and not file))
+        self.metrics.inc("responses_total", STATUS_LABELS.get(code) or (("code", str(code)),))
+        self.metrics.inc("sent_bytes_total", (), len(bufs[0]) + (size if send_body else 0))
+        if send_body and file:
+            path, offset, count = file
+            # socket.sendfile uses os.sendfile where available, chunked send() otherwise
+            with open(path, "rb") as f:
+                conn.sendfile(f, offset, count)
+        if trace is not None: trace[1] += time.perf_counter() - t0
+
+    def _conn_line(self, conn) -> bytes:
+        if not getattr(conn, "keep_alive", False): return conn_line(False)
+        return conn_line(True, int(self.keepalive_timeout), self.max_requests - conn.served - 1)
+
+    def _send_file(self, conn, path: Path, ctype: str, method: str, extra_headers: Dict[str,str],
+                   req_headers: Dict[str,str] | None = None):
+        st = path.stat()
+        etag = file_etag(st)
+        extra_headers = {"ETag": etag, "Cache-Control": cache_control_for(self.cache_control, ctype), **extra_headers}
+        if compressible(ctype):
+            extra_headers["Vary"] = "Accept-Encoding"
+            if self._send_encoded(conn, path, st, ctype, method, extra_headers, req_headers): return
+        if not_modified(req_headers, etag, st.st_mtime):
+            self._send_not_modified(conn, extra_headers); return
+        rng = self._range(conn, req_headers, st.st_size, etag, st.st_mtime)
+        if rng is None: return
+        code, reason, start, length, range_headers = rng
+        self._respond(conn, code, reason, {"Last-Modified": http_date(st.st_mtime), **range_headers, **extra_headers},
+                      static=static_headers(ctype, True), method=method, file=(path, start, length))
+
+    def _send_encoded(self, conn, path: Path, st: os.stat_result, ctype: str, method: str,
+                      extra_headers: Dict[str,str], req_headers: Dict[str,str] | None) -> bool:
+        """
+        Sends a .br/.gz sibling or an on-the-fly compressed body (or a 304 for
+        it); False to fall back to identity. Each coding gets its own ETag.
+        """
+        headers = {"Last-Modified": http_date(st.st_mtime), **extra_headers}
+        tagged = lambda coding: {**headers, "ETag": f'{headers["ETag"][:-1]}-{coding}"'}
+        for coding in self._codings(ctype, req_headers):
+            sib = path.with_name(path.name + ENCODED_SUFFIX[coding])
+            try:
+                sst = sib.stat()
+            except OSError:
+                continue
+            if sst.st_mtime < st.st_mtime: continue  # stale sibling
+            h = tagged(coding)
+            if not_modified(req_headers, h["ETag"], st.st_mtime):
+                self._send_not_modified(conn, h); return True
+            self._io.inc("precompressed"); self._io.inc(f"encoded_{coding}")
+            self._respond(conn, 200, "OK", {"Content-Encoding": coding, **h}, static=static_headers(ctype),
+                          method=method, file=(sib, 0, sst.st_size))
+            return True
+        codings = self._codings(ctype, req_headers, on_the_fly=True)
+        if not codings or st.st_size > COMPRESS_MAX:
+            return False
+        assert self.compressed
+        h = tagged(codings[0])
+        if not_modified(req_headers, h["ETag"], st.st_mtime):
+            self._send_not_modified(conn, h); return True
+        body = self.compressed.get((str(path), st.st_mtime_ns, st.st_size), codings[0], path.read_bytes)
+        if len(body) >= st.st_size:
+            return False
+        self._io.inc(f"encoded_{codings[0]}")
+        self._respond(conn, 200, "OK", {"Content-Encoding": codings[0], **h}, body,
+                      static=static_headers(ctype), method=method)
+        return True
+
+    def _send_cached(self, conn, e: CacheEntry, method: str, extra_headers: Dict[str,str],
+                     req_headers: Dict[str,str] | None = None):
+        if not_modified(req_headers, e.etag, e.mtime):
+            self._send_not_modified(conn, {"ETag": e.etag, "Cache-Control": cache_control_for(self.cache_control, e.ctype),
+                                           "Vary": "Accept-Encoding" if compressible(e.ctype) else "",
+                                           **extra_headers}); return
+        rng = self._range(conn, req_headers, e.size, e.etag, e.mtime)
+        if rng is None: return
+        code, reason, start, length, range_headers = rng
+        self._respond(conn, code, reason, {**range_headers, **extra_headers},
+                      memoryview(e.body)[start:start + length], static=e.head, method=method)
+
+    def _send_simple(self, conn, code, reason, body: bytes, extra: Dict[str,str]|None=None, method: str = "GET"):
+        extra = dict(extra or {})
+        ctype = extra.pop("Content-Type", "text/plain; charset=utf-8")
+        self._respond(conn, code, reason, extra, body, static=static_headers(ctype), method=method)
 
 def parse_args():
-    p = argparse.ArgumentParser(description="HTTP/1.0 file server (Lab 2)")
+    p = argparse.ArgumentParser(description="HTTP/1.1 file server (Lab 2)")
     p.add_argument("-H","--host", default="0.0.0.0")
     p.add_argument("-p","--port", type=int, default=8088)
     p.add_argument("-d","--docroot", default="/app/content")
-    p.add_argument("--mode", choices=["single","threaded","pool"], default="pool")
-    p.add_argument("--workers", type=int)
-    p.add_argument("--max-queue", type=int, default=256)
+    p.add_argument("--mode", choices=["single","threaded","pool","evloop"], default="pool")
+    p.add_argument("--workers", type=int, help="pool: minimum worker threads (default 2x cores, max 32)")
+    p.add_argument("--max-workers", type=int, help="pool: upper bound when growing (default 8x --workers)")
+    p.add_argument("--max-queue", type=int, default=256, help="pool: hard cap on queued connections")
+    p.add_argument("--queue-target-ms", type=float, default=20.0, help="pool: acceptable queue wait before CoDel sheds")
+    p.add_argument("--queue-interval-ms", type=float, default=200.0, help="pool: how long the wait may stay above target")
     p.add_argument("--delay", type=float, default=1.0)
     p.add_argument("--rate", type=float, default=0.0)
     p.add_argument("--burst", type=int, default=5)
-    p.add_argument("--race", action="store_true")
+    p.add_argument("--max-buckets", type=int, default=100_000, help="cap on tracked client IPs")
+    p.add_argument("--bucket-ttl", type=float, default=0.0, help="idle seconds after refill before an IP is forgotten")
+    p.add_argument("--race", action="store_true", help="racy read-sleep-write counter demo (same as --counters race)")
+    p.add_argument("--counters", choices=["sharded","locked","race"], default="sharded",
+                   help="sharded = lock-free per-thread counters; locked/race = sleep-based lab demos")
+    p.add_argument("--counters-file", help="persist hit counters to this JSON file")
+    p.add_argument("--counters-flush", type=float, default=5.0, help="seconds between counter flushes")
+    p.add_argument("--keepalive-timeout", type=float, default=5.0, help="idle seconds before a kept-alive connection is closed")
+    p.add_argument("--max-requests", type=int, default=100, help="requests served per connection before closing")
+    p.add_argument("--cache-mb", type=float, default=0.0, help="in-memory hot-file cache budget in MB (0 = off)")
+    p.add_argument("--compress-mb", type=float, default=16.0, help="cache budget for on-the-fly gzip/br bodies in MB (0 = only .gz/.br siblings)")
+    p.add_argument("--cache-control", action="append", metavar="TYPE=POLICY",
+                   help='Cache-Control per MIME type, e.g. "image/*=public, max-age=604800" (repeatable)')
+    p.add_argument("--path-cache", type=int, default=10_000, help="resolved request paths kept, 404/403 included (0 = resolve every request)")
+    p.add_argument("--listing-page-size", type=int, default=1000, help="directory entries per listing page (0 = no paging)")
+    p.add_argument("--metrics-sample", type=float, default=DEFAULT_SAMPLE,
+                   help="fraction of requests timed for /__metrics histograms (counters are always exact)")
+    p.add_argument("--drain-timeout", type=float, default=10.0,
+                   help="on SIGTERM/SIGINT or after a SIGHUP/SIGUSR2 hot restart: seconds to finish in-flight requests")
+    p.add_argument("--processes", type=int, default=1, help="fork N SO_REUSEPORT workers (1 = no fleet)")
+    p.add_argument("--counter-slots", type=int, default=0,
+                   help="fleet: shared hit-counter slots (0 = twice the docroot's file count, at least 4096)")
     return p.parse_args()
 
+def make_server(a) -> HTTPServer:
+    return HTTPServer(a.host, a.port, Path(a.docroot), a.mode, a.rate, a.burst, a.race,
+                      workers=a.workers, max_queue=a.max_queue, delay=a.delay,
+                      keepalive_timeout=a.keepalive_timeout, max_requests=a.max_requests,
+                      cache_mb=a.cache_mb, listing_page_size=a.listing_page_size,
+                      counter_mode=a.counters, counters_file=a.counters_file, counters_flush=a.counters_flush,
+                      max_buckets=a.max_buckets, bucket_ttl=a.bucket_ttl, max_workers=a.max_workers,
+                      queue_target=a.queue_target_ms / 1000.0, queue_interval=a.queue_interval_ms / 1000.0,
+                      compress_mb=a.compress_mb,
+                      cache_control=dict(c.split("=", 1) for c in a.cache_control or []),
+                      metrics_sample=a.metrics_sample, drain_timeout=a.drain_timeout,
+                      path_cache=a.path_cache)
+
+def count_files(root: Path) -> int:
+    return sum(len(files) for _, _, files in os.walk(root))
+
+def serve_fleet(a):
+    """Supervisor: forks a.processes workers sharing one SharedStore and restarts any that die."""
+    slots = a.counter_slots or max(4096, 2 * count_files(Path(a.docroot)))
+    store = SharedStore(a.processes, counter_slots=slots)
+    if a.counters_file:
+        for path, n in load_counts(a.counters_file).items():
+            if not store.set_count(path, n):
+                print(f"[!] {a.counters_file}: no shared counter slot for {path}, its count starts over")
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(idx: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                store.worker_start(idx, os.getpid())
+                srv = make_server(a); srv.attach(store, idx); srv.start()
+            except BaseException as e:
+                print(f"[!] worker {idx} crashed: {e}"); code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        children[pid] = idx
+
+    def handler(signum, frame):
+        nonlocal stopping
+        stopping = True
+        print(f"\n[!] Signal {signum} received, stopping {len(children)} workers...")
+        for pid in list(children):
+            try: os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError: pass
+
+    def no_restart(signum, frame):
+        print("[!] hot restart needs --processes 1; SIGTERM drains the fleet")
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, handler)
+    for sig in (signal.SIGHUP, signal.SIGUSR2):
+        signal.signal(sig, no_restart)
+    print(f"[+] supervisor pid {os.getpid()} starting {a.processes} workers on {a.host}:{a.port}")
+    for i in range(a.processes):
+        spawn(i)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        idx = children.pop(pid, None)
+        if idx is None: continue
+        store.worker_exit(idx, restarted=not stopping)
+        if not stopping:
+            print(f"[!] worker {idx} (pid {pid}) exited with {status}, restarting")
+            time.sleep(0.1)
+            spawn(idx)
+
 def main():
     a = parse_args()
     root = Path(a.docroot)
     if not root.exists() or not root.is_dir():
         raise SystemExit(f"Docroot missing: {root}")
-    HTTPServer(a.host, a.port, root, a.mode, a.rate, a.burst, a.race,
-               workers=a.workers, max_queue=a.max_queue, delay=a.delay).start()
+    if a.processes > 1:
+        serve_fleet(a)
+    else:
+        make_server(a).start()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
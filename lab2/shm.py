@@ -0,0 +1,138 @@
+import mmap, struct, time, zlib, multiprocessing
+from typing import Callable, Dict, Iterator, Tuple
+
+_ctx = multiprocessing.get_context("fork")
+
+class ShmTable:
+    """
+    Fixed-size open-addressing hash table living in an anonymous shared mmap.
+
+    Created in the supervisor before fork(), so every worker process sees the
+    same pages. Keys are bytes up to key_size; values are a fixed struct.
+    One cross-process lock guards the table.
+    """
+    def __init__(self, slots: int, key_size: int, val_fmt: str):
+        self.slots, self.key_size = int(slots), int(key_size)
+        self.rec = struct.Struct(f"<H{self.key_size}s{val_fmt}")
+        self.buf = mmap.mmap(-1, self.rec.size * self.slots)
+        self.lock = _ctx.Lock()
+        self.used = _ctx.Value("i", 0, lock=False)
+        self.overflow = _ctx.Value("Q", 0, lock=False)
+        self.recycled = _ctx.Value("Q", 0, lock=False)
+
+    def _find(self, key: bytes, reusable: Callable | None = None) -> Tuple[int, bool]:
+        """
+        Returns (slot, found). slot is -1 when the key is absent and the table is full.
+        With reusable(vals), an absent key may take over the first slot whose
+        value reusable() accepts; its previous key simply stops being found.
+        """
+        i = zlib.crc32(key) % self.slots
+        spare = -1
+        for _ in range(self.slots):
+            rec = self.rec.unpack_from(self.buf, i * self.rec.size)
+            klen = rec[0]
+            if klen == 0:
+                return (spare if spare >= 0 else i), False
+            if rec[1][:klen] == key:
+                return i, True
+            if spare < 0 and reusable is not None and reusable(rec[2:]):
+                spare = i
+            i = (i + 1) % self.slots
+        return spare, False
+
+    def _unlocked_get(self, key: bytes):
+        i, found = self._find(key)
+        if not found: return None
+        return self.rec.unpack_from(self.buf, i * self.rec.size)[2:]
+
+    def _unlocked_put(self, key: bytes, vals, reusable: Callable | None = None) -> bool:
+        if len(key) > self.key_size:
+            self.overflow.value += 1; return False
+        i, found = self._find(key, reusable)
+        if i < 0:
+            self.overflow.value += 1; return False
+        if not found:
+            if struct.unpack_from("<H", self.buf, i * self.rec.size)[0]:
+                self.recycled.value += 1
+            else:
+                self.used.value += 1
+        self.rec.pack_into(self.buf, i * self.rec.size, len(key), key, *vals)
+        return True
+
+    def get(self, key: bytes):
+        with self.lock:
+            return self._unlocked_get(key)
+
+    def update(self, key: bytes, default, fn: Callable, reusable: Callable | None = None):
+        """Atomically replaces the value for key with fn(old)[0]; returns fn(old)[1]."""
+        with self.lock:
+            old = self._unlocked_get(key)
+            new, result = fn(tuple(default) if old is None else old)
+            self._unlocked_put(key, new, reusable)
+            return result
+
+    def items(self) -> Iterator[Tuple[bytes, tuple]]:
+        with self.lock:
+            raw = bytes(self.buf)
+        for i in range(self.slots):
+            rec = self.rec.unpack_from(raw, i * self.rec.size)
+            if rec[0]:
+                yield rec[1][:rec[0]], rec[2:]
+
+    def __len__(self) -> int:
+        return self.used.value
+
+class SharedStore:
+    """Per-path counters, per-IP GCRA rate-limit state and per-worker stats shared by a worker fleet."""
+    WORKER = struct.Struct("<qIQd")  # pid, restarts, requests, started
+
+    def __init__(self, processes: int, counter_slots: int = 4096, bucket_slots: int = 65536):
+        self.processes = int(processes)
+        self.counters = ShmTable(max(1, counter_slots), 256, "Q")
+        self.buckets = ShmTable(bucket_slots, 46, "d")  # GCRA theoretical arrival time
+        self.workers = mmap.mmap(-1, self.WORKER.size * self.processes)
+
+    # counters; incr/set_count return False when the table cannot hold the key
+    # (full, or longer than the key size), and the caller has to count it elsewhere
+    def incr(self, path: str, n: int = 1) -> bool:
+        with self.counters.lock:
+            key = path.encode()
+            v = self.counters._unlocked_get(key)
+            return self.counters._unlocked_put(key, ((v[0] if v else 0) + n,))
+
+    def get_count(self, path: str) -> int:
+        v = self.counters._unlocked_get(path.encode())
+        return v[0] if v else 0
+
+    def set_count(self, path: str, n: int) -> bool:
+        return self.counters._unlocked_put(path.encode(), (n,))
+
+    def counter_stats(self) -> Dict[str, int]:
+        t = self.counters
+        return {"slots": t.slots, "used": len(t), "overflow": t.overflow.value}
+
+    def counters_snapshot(self) -> Dict[str, int]:
+        return {k.decode(errors="replace"): v[0] for k, v in self.counters.items()}
+
+    # worker slots
+    def worker_start(self, idx: int, pid: int) -> None:
+        _, restarts, _, _ = self.WORKER.unpack_from(self.workers, idx * self.WORKER.size)
+        self.WORKER.pack_into(self.workers, idx * self.WORKER.size, pid, restarts, 0, time.time())
+
+    def worker_exit(self, idx: int, restarted: bool) -> None:
+        _, restarts, req, started = self.WORKER.unpack_from(self.workers, idx * self.WORKER.size)
+        self.WORKER.pack_into(self.workers, idx * self.WORKER.size, 0, restarts + int(restarted), req, started)
+
+    def worker_served(self, idx: int, n: int = 1) -> None:
+        # single writer per slot (caller serializes its own threads)
+        off = idx * self.WORKER.size
+        pid, restarts, req, started = self.WORKER.unpack_from(self.workers, off)
+        self.WORKER.pack_into(self.workers, off, pid, restarts, req + n, started)
+
+    def fleet(self) -> list:
+        now = time.time(); out = []
+        for i in range(self.processes):
+            pid, restarts, req, started = self.WORKER.unpack_from(self.workers, i * self.WORKER.size)
+            out.append({"worker": i, "pid": pid, "alive": pid != 0, "restarts": restarts,
+                        "requests": req, "uptime": round(now - started, 1) if pid else 0})
+        return out
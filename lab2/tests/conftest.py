@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+# the lab2 modules import each other as top-level modules, as when server.py is run directly
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def serve():
+    """Runs an HTTPServer's accept loop in a thread (no signal handlers); returns its port."""
+    started = []
+
+    def run(srv):
+        s = srv._listen_socket()
+        s.settimeout(0.1)
+        srv.sock = s
+        t = threading.Thread(target=getattr(srv, f"_serve_{srv.mode}"), daemon=True)
+        t.start()
+        started.append((srv, t))
+        return s.getsockname()[1]
+
+    yield run
+    for srv, t in started:
+        srv._stop.set()
+        t.join(5)
+        srv.sock.close()
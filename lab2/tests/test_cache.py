@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from cache import FileCache, ListingCache, PathCache
+
+
+def head(st):
+    return b""
+
+
+def wait_for(cond, timeout: float = 2.0) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if cond(): return True
+        time.sleep(0.01)
+    return cond()
+
+
+def test_file_cache_copies_small_files_and_skips_large(tmp_path: Path):
+    small, large = tmp_path / "a.html", tmp_path / "b.pdf"
+    small.write_bytes(b"x" * 100)
+    large.write_bytes(b"y" * 300_000)
+    c = FileCache(64 * 1024 * 1024, use_inotify=False)
+    e = c.load(small, "text/html", head)
+    assert isinstance(e.body, bytes) and e.size == 100
+    assert c.load(large, "application/pdf", head) is None
+    small.write_bytes(b"")  # truncating the file cannot reach the cached copy
+    assert c.get(str(small)).body == b"x" * 100
+
+
+def test_file_cache_revalidates_by_mtime_without_inotify(tmp_path: Path):
+    f = tmp_path / "a.html"
+    f.write_bytes(b"old")
+    c = FileCache(1 << 20, revalidate=0.0, use_inotify=False)
+    c.load(f, "text/html", head)
+    assert c.get(str(f)) is not None
+    f.write_bytes(b"newer")
+    os.utime(f, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert c.get(str(f)) is None
+    assert c.stats()["invalidations"] == 1
+
+
+def test_file_cache_drops_entries_on_inotify(tmp_path: Path):
+    f = tmp_path / "a.html"
+    f.write_bytes(b"old")
+    c = FileCache(1 << 20)
+    if c.inotify is None: return  # no inotify here; covered by the mtime test
+    c.load(f, "text/html", head)
+    f.write_bytes(b"new")
+    assert wait_for(lambda: c.get(str(f)) is None)
+
+
+def test_file_cache_evicts_least_recently_used(tmp_path: Path):
+    c = FileCache(250, max_entry=100, use_inotify=False)
+    paths = []
+    for name in "abc":
+        p = tmp_path / name
+        p.write_bytes(b"z" * 100)
+        paths.append(p)
+    c.load(paths[0], "text/html", head)
+    c.load(paths[1], "text/html", head)
+    c.get(str(paths[0]))
+    c.load(paths[2], "text/html", head)
+    assert c.get(str(paths[1])) is None and c.get(str(paths[0])) is not None
+
+
+def test_path_cache_invalidates_on_create_and_delete(tmp_path: Path):
+    pc = PathCache(tmp_path, lambda p: "text/html", ttl=0.05)
+    assert pc.get("/new.html").kind == "missing"
+    (tmp_path / "new.html").write_text("hi")
+    assert wait_for(lambda: pc.get("/new.html").kind == "file")
+    (tmp_path / "new.html").unlink()
+    assert wait_for(lambda: pc.get("/new.html").kind == "missing")
+
+
+def test_path_cache_forbids_escapes(tmp_path: Path):
+    root = tmp_path / "www"
+    root.mkdir()
+    (tmp_path / "www-old").mkdir()
+    (tmp_path / "www-old" / "secret.html").write_text("no")
+    (root / "link").symlink_to(tmp_path / "www-old")
+    pc = PathCache(root, lambda p: "text/html")
+    assert pc.get("/../www-old/secret.html").kind == "forbidden"
+    assert pc.get("/link/secret.html").kind == "forbidden"
+
+
+def test_listing_cache_rebuilds_on_change_and_keeps_digest(tmp_path: Path):
+    builds = []
+    def build(here: Path):
+        builds.append(here)
+        return sorted(os.listdir(here))
+    lc = ListingCache(build, ttl=0.0, use_inotify=False)
+    first = lc.get(tmp_path)
+    again = lc.get(tmp_path)  # ttl 0: rebuilt, same rows
+    assert len(builds) == 2 and again.digest == first.digest
+    (tmp_path / "x.html").write_text("x")
+    assert lc.get(tmp_path).digest != first.digest
+
+
+def test_listing_cache_reuses_rows_until_mtime_moves(tmp_path: Path):
+    builds = []
+    lc = ListingCache(lambda here: builds.append(here) or sorted(os.listdir(here)), ttl=60.0, use_inotify=False)
+    first = lc.get(tmp_path)
+    assert lc.get(tmp_path) is first and len(builds) == 1
+    time.sleep(0.01)
+    (tmp_path / "x.html").write_text("x")
+    assert lc.get(tmp_path).rows == ["x.html"] and len(builds) == 2
+    assert lc.stats()["hits"] == 1 and lc.stats()["misses"] == 2
+
+
+def test_listing_cache_builds_a_miss_once(tmp_path: Path):
+    started, release = threading.Event(), threading.Event()
+    builds = []
+
+    def build(here: Path):
+        builds.append(here)
+        started.set()
+        release.wait(5)
+        return ["row"]
+
+    lc = ListingCache(build, ttl=60.0, use_inotify=False)
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(lc.get(tmp_path))) for _ in range(8)]
+    threads[0].start()
+    assert started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    assert wait_for(lambda: lc.stats()["coalesced"] >= 7)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert len(builds) == 1 and len(out) == 8 and all(e is out[0] for e in out)
+
+
+def test_listing_cache_failed_build_lets_the_next_caller_retry(tmp_path: Path):
+    calls = []
+
+    def build(here: Path):
+        calls.append(here)
+        if len(calls) == 1:
+            raise OSError("scandir failed")
+        return ["row"]
+
+    lc = ListingCache(build, ttl=60.0, use_inotify=False)
+    with pytest.raises(OSError):
+        lc.get(tmp_path)
+    assert lc.get(tmp_path).rows == ["row"] and len(calls) == 2
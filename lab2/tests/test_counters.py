@@ -0,0 +1,71 @@
+import threading
+from pathlib import Path
+
+from counters import ShardedCounter, load_counts, save_counts
+from server import HTTPServer
+
+
+def run_threads(n, target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(n)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+
+def test_concurrent_increments_all_land():
+    c = ShardedCounter({"/a": 5})
+    start = threading.Barrier(8)
+
+    def work(i):
+        start.wait()
+        for _ in range(5000):
+            c.inc("/a"); c.inc(f"/t{i}", 2)
+
+    run_threads(8, work)
+    snap = c.snapshot()
+    assert snap["/a"] == 5 + 8 * 5000
+    assert all(snap[f"/t{i}"] == 10000 for i in range(8))
+    assert c.get("/a") == snap["/a"] and len(c) == len(snap) == 9
+
+
+def test_shards_of_exited_threads_are_folded():
+    c = ShardedCounter()
+    stop = threading.Event()
+    live = threading.Thread(target=lambda: (c.inc("/live"), stop.wait(5)))
+    live.start()
+    run_threads(10, lambda i: c.inc("/x", i + 1))
+    assert len(c._shards) == 11
+    assert c.snapshot() == {"/live": 1, "/x": 55}
+    assert [t for t, _ in c._shards] == [live]      # dead shards went into the base
+    assert c._base == {"/x": 55}
+    stop.set(); live.join()
+    assert c.snapshot() == {"/live": 1, "/x": 55} and c._shards == []
+
+
+def test_registering_folds_dead_shards_every_64_threads():
+    c = ShardedCounter()
+    for _ in range(3):
+        run_threads(64, lambda i: c.inc("/x"))
+    assert len(c._shards) < 64          # no snapshot() was needed to keep the list short
+    assert c.get("/x") == 192 and len(c) == 1
+
+
+def test_len_counts_keys_without_merging():
+    c = ShardedCounter({"/old": 1})
+    c.inc("/a"); c.inc("/a"); c.inc("/b", 0)
+    run_threads(2, lambda i: c.inc("/a"))
+    assert len(c) == 3 and set(c.snapshot()) == {"/old", "/a", "/b"}
+
+
+def test_server_counts_files_in_every_mode(tmp_path: Path):
+    for mode in ("sharded", "locked"):
+        srv = HTTPServer("127.0.0.1", 0, tmp_path, "threaded", 0.0, 1, False, counter_mode=mode)
+        srv.inc_counter("/a"); srv.inc_counter("/b"); srv.inc_counter("/a")
+        assert srv.stats()["files_counted"] == 2 == len(srv.counters_snapshot())
+
+
+def test_counts_round_trip(tmp_path: Path):
+    path = str(tmp_path / "counts.json")
+    assert load_counts(path) == {}
+    save_counts(path, {"/a": 3, "/b": 1})
+    assert load_counts(path) == {"/a": 3, "/b": 1}
+    assert ShardedCounter(load_counts(path)).snapshot() == {"/a": 3, "/b": 1}
@@ -0,0 +1,96 @@
+import pytest
+
+from httpparse import HTTPError, RequestParser
+
+
+GET = b"GET /a.html HTTP/1.1\r\nHost: x\r\nAccept: */*\r\n\r\n"
+
+
+def test_single_buffer_request():
+    p = RequestParser()
+    p.feed(GET)
+    assert p.next() == ("GET /a.html HTTP/1.1", {"host": "x", "accept": "*/*"})
+    assert len(p) == 0 and p.next() is None
+
+
+def test_partial_reads_byte_by_byte():
+    p = RequestParser()
+    for i in range(len(GET) - 1):
+        p.feed(GET[i:i + 1])
+        assert p.next() is None
+    p.feed(GET[-1:])
+    assert p.next() == ("GET /a.html HTTP/1.1", {"host": "x", "accept": "*/*"})
+
+
+def test_terminator_split_across_reads():
+    p = RequestParser()
+    p.feed(GET[:-3])
+    assert p.next() is None
+    p.feed(GET[-3:])
+    assert p.next()[0] == "GET /a.html HTTP/1.1"
+
+
+def test_pipelined_requests_stay_buffered():
+    second = b"HEAD /b HTTP/1.1\r\nHost: y\r\n\r\n"
+    p = RequestParser()
+    p.feed(GET + b"\r\n" + second + b"GET /c")   # stray CRLF between requests, third one partial
+    assert p.next()[0] == "GET /a.html HTTP/1.1"
+    assert p.next() == ("HEAD /b HTTP/1.1", {"host": "y"})
+    assert p.next() is None and bytes(p.buf) == b"GET /c"
+    p.feed(b" HTTP/1.1\r\n\r\n")
+    assert p.next() == ("GET /c HTTP/1.1", {})
+
+
+def test_repeated_headers_are_joined():
+    p = RequestParser()
+    p.feed(b"GET / HTTP/1.1\r\nAccept: a\r\naccept: b\r\n\r\n")
+    assert p.next()[1] == {"accept": "a, b"}
+
+
+@pytest.mark.parametrize("head", [
+    b"GET /\r\n\r\n",
+    b"GET / HTTP/1.1 extra\r\n\r\n",
+    b"GET / HTTP/1.1\r\nNoColon\r\n\r\n",
+    b"GET / HTTP/1.1\r\n: empty name\r\n\r\n",
+    b"GET / HTTP/1.1\r\nHost : x\r\n\r\n",
+])
+def test_malformed_is_400(head):
+    p = RequestParser()
+    p.feed(head)
+    with pytest.raises(HTTPError) as e:
+        p.next()
+    assert e.value.code == 400
+
+
+def test_oversize_head_is_431_before_terminator():
+    p = RequestParser(max_head=1024, max_line=512)
+    p.feed(b"GET / HTTP/1.1\r\n" + b"X-A: " + b"v" * 400 + b"\r\n")
+    assert p.next() is None
+    p.feed((b"X-B: " + b"v" * 400 + b"\r\n") * 2)
+    with pytest.raises(HTTPError) as e:
+        p.next()
+    assert e.value.code == 431
+
+
+def test_oversize_header_line_is_431():
+    p = RequestParser(max_line=64)
+    p.feed(b"GET / HTTP/1.1\r\nX-A: " + b"v" * 100 + b"\r\n\r\n")
+    with pytest.raises(HTTPError) as e:
+        p.next()
+    assert e.value.code == 431
+
+
+def test_too_many_headers_is_431():
+    p = RequestParser(max_headers=3)
+    p.feed(b"GET / HTTP/1.1\r\n" + b"".join(b"X-%d: v\r\n" % i for i in range(4)) + b"\r\n")
+    with pytest.raises(HTTPError) as e:
+        p.next()
+    assert e.value.code == 431
+
+
+def test_long_request_line_is_414():
+    p = RequestParser(max_line=64)
+    p.feed(b"GET /" + b"a" * 100)
+    with pytest.raises(HTTPError) as e:
+        p.next()
+    assert e.value.code == 414
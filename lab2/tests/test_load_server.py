@@ -0,0 +1,83 @@
+import math
+import random
+
+import pytest
+
+from load_server import Histogram
+
+REL = 1 / (1 << (Histogram.SUB - 1))   # widest bucket relative to the values in it, ~1.6%
+
+
+def exact(values, q):
+    s = sorted(values)
+    return s[max(1, math.ceil(q / 100 * len(s))) - 1]
+
+
+def test_small_values_are_exact():
+    for v in range(1 << Histogram.SUB):
+        assert Histogram._index(v) == v and Histogram._value(v) == v
+
+
+def test_buckets_are_contiguous_and_narrow():
+    prev = -1
+    for v in list(range(1 << 16)) + [random.Random(1).randrange(1 << 40) for _ in range(10000)]:
+        i = Histogram._index(v)
+        top = Histogram._value(i)
+        assert v <= top <= v + v * REL, v
+        assert Histogram._index(top) == i
+        if v < 1 << 16:
+            assert i in (prev, prev + 1)   # no gaps between neighbouring buckets
+            prev = i
+
+
+def test_boundaries():
+    assert Histogram._index(127) == 127 and Histogram._index(128) == 128
+    assert Histogram._value(Histogram._index(128)) == 129    # 128..129 share a bucket
+    assert Histogram._value(Histogram._index(256)) == 259    # 256..259
+    assert Histogram._index(255) + 1 == Histogram._index(256)
+
+
+@pytest.mark.parametrize("name, draw", [
+    ("uniform", lambda r: r.uniform(100, 20_000)),
+    ("exponential", lambda r: r.expovariate(1 / 3000)),
+    ("lognormal", lambda r: r.lognormvariate(8, 1.5)),
+    ("bimodal", lambda r: r.gauss(500, 50) if r.random() < 0.9 else r.gauss(250_000, 10_000)),
+])
+def test_percentiles_within_relative_error(name, draw):
+    r = random.Random(name)
+    values = [max(0, int(draw(r))) for _ in range(50_000)]
+    h = Histogram()
+    for v in values:
+        h.record(v)
+    for q in (50, 90, 99, 99.9):
+        want = exact(values, q)
+        assert want <= h.percentile(q) <= want + want * REL, (q, want, h.percentile(q))
+    assert h.percentile(100) == h.hi == max(values)
+    assert h.lo == min(values) and h.n == len(values) and h.total == sum(values)
+
+
+def test_max_is_exact_and_caps_percentiles():
+    h = Histogram()
+    for v in (10, 20, 1000):
+        h.record(v)
+    assert h.percentile(99) == 1000       # the bucket's top would be 1007
+    assert h.summary() == {"count": 3, "min": 0.01, "mean": 0.343, "p50": 0.02, "p90": 1.0,
+                           "p99": 1.0, "p999": 1.0, "max": 1.0}
+
+
+def test_merge_matches_recording_everything():
+    r = random.Random(7)
+    values = [int(r.expovariate(1 / 5000)) for _ in range(10_000)]
+    whole, a, b = Histogram(), Histogram(), Histogram()
+    for i, v in enumerate(values):
+        whole.record(v)
+        (a if i % 3 else b).record(v)
+    a.merge(b); a.merge(Histogram())
+    assert (a.counts, a.n, a.total, a.lo, a.hi) == (whole.counts, whole.n, whole.total, whole.lo, whole.hi)
+
+
+def test_empty_and_negative():
+    h = Histogram()
+    assert h.percentile(50) == 0 and h.summary()["max"] == 0
+    h.record(-5); h.record(0.9)
+    assert h.counts == {0: 2} and h.lo == h.hi == 0
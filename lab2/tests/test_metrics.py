@@ -0,0 +1,122 @@
+import random
+import re
+import socket
+from pathlib import Path
+
+import pytest
+
+import metrics
+from metrics import BUCKETS, DEFAULT_SAMPLE, Metrics, flatten
+from server import HTTPServer
+
+SAMPLE = re.compile(r'([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*",?)*\})? (\S+)$')
+
+
+def parse(text: str) -> dict:
+    """Families from a text exposition, checking the format as it goes."""
+    assert text.endswith("\n")
+    families, current = {}, None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name = line.split(" ", 3)[2]
+            assert name not in families, f"{name} described twice"
+            families[name] = current = {"help": line, "type": None, "samples": []}
+        elif line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert current is families.get(name) and current["type"] is None, f"TYPE {name} without its HELP"
+            current["type"] = kind
+        else:
+            m = SAMPLE.match(line)
+            assert m, f"malformed sample line {line!r}"
+            name, labels, value = m.group(1), m.group(2) or "", float(m.group(3))
+            base = re.sub(r"_(bucket|sum|count)$", "", name) if current["type"] == "histogram" else name
+            assert current is families.get(base), f"{name} outside its family"
+            current["samples"].append((name, labels, value))
+    return families
+
+
+def test_counters_have_help_type_and_labels():
+    m = Metrics(prefix="t")
+    m.describe("hits_total", "counter", "Hits.")
+    m.inc("hits_total", (("code", "200"),))
+    m.inc("hits_total", (("code", "200"),), 2)
+    m.inc("hits_total", (("code", "404"),))
+    m.inc("odd_total", (("path", 'a"b\\c\nd'),))
+    fam = parse(m.render(const=(("worker", "3"),)))
+    assert fam["t_hits_total"]["help"] == "# HELP t_hits_total Hits."
+    assert fam["t_hits_total"]["type"] == "counter"
+    assert fam["t_hits_total"]["samples"] == [("t_hits_total", '{worker="3",code="200"}', 3),
+                                              ("t_hits_total", '{worker="3",code="404"}', 1)]
+    assert fam["t_odd_total"]["type"] == "untyped"
+    assert fam["t_odd_total"]["samples"][0][1] == '{worker="3",path="a\\"b\\\\c\\nd"}'
+
+
+def test_histogram_buckets_are_cumulative():
+    m = Metrics(prefix="t")
+    m.describe("lat_seconds", "histogram", "Latency.")
+    values = [0.00005, 0.0001, 0.003, 0.003, 0.7, 20.0]     # 0.0001 is on a bound: le is inclusive
+    for v in values:
+        m.observe("lat_seconds", v, (("phase", "fs"),))
+    m.observe("lat_seconds", 0.2)
+    fam = parse(m.render())["t_lat_seconds"]
+    assert fam["type"] == "histogram"
+    fs = [(n, l, v) for n, l, v in fam["samples"] if 'phase="fs"' in l]
+    buckets = [v for n, _, v in fs if n == "t_lat_seconds_bucket"]
+    les = [re.search(r'le="([^"]+)"', l).group(1) for n, l, _ in fs if n == "t_lat_seconds_bucket"]
+    assert les == [repr(b) for b in BUCKETS] + ["+Inf"]
+    assert buckets == sorted(buckets)
+    assert buckets == [sum(v <= le for v in values) for le in BUCKETS] + [len(values)]
+    assert ("t_lat_seconds_sum", '{phase="fs"}', pytest.approx(sum(values))) in fs
+    assert ("t_lat_seconds_count", '{phase="fs"}', len(values)) in fs
+    assert ("t_lat_seconds_count", "", 1) in fam["samples"]   # the unlabelled series is separate
+
+
+def test_undescribed_histogram_still_renders():
+    m = Metrics(prefix="t")
+    m.observe("x_seconds", 0.01)
+    fam = parse(m.render())["t_x_seconds"]
+    assert fam["type"] == "histogram" and ("t_x_seconds_count", "", 1) in fam["samples"]
+
+
+def test_gauges_from_flattened_stats():
+    stats = {"mode": "pool", "pool": {"busy": 2, "codel": {"dropping": True}}, "hit-ratio": 0.5, "fleet": [1]}
+    assert flatten(stats) == {"pool_busy": 2, "pool_codel_dropping": 1, "hit_ratio": 0.5}
+    fam = parse(Metrics(prefix="t").render(flatten(stats), (("worker", "0"),)))
+    assert fam["t_pool_busy"]["type"] == "gauge"
+    assert fam["t_pool_busy"]["samples"] == [("t_pool_busy", '{worker="0"}', 2)]
+
+
+def test_sampling_rate(monkeypatch):
+    assert not any(Metrics(sample=0.0).sampled() for _ in range(1000))
+    assert all(Metrics(sample=1.0).sampled() for _ in range(1000))
+    assert Metrics(sample=7).sample == 1.0 and Metrics(sample=-1).sample == 0.0
+    monkeypatch.setattr(metrics, "random", random.Random(42))
+    m = Metrics()
+    assert m.sample == DEFAULT_SAMPLE
+    hits = sum(m.sampled() for _ in range(20_000))
+    assert abs(hits / 20_000 - DEFAULT_SAMPLE) < 0.01
+
+
+def get(port: int, path: str) -> bytes:
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as s:
+        s.sendall(f"GET {path} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n".encode())
+        data = b""
+        while chunk := s.recv(65536):
+            data += chunk
+    return data.split(b"\r\n\r\n", 1)[1]
+
+
+@pytest.mark.parametrize("sample, timed", [(0.0, 0), (1.0, 20)])
+def test_server_scrape_is_well_formed(tmp_path: Path, serve, sample, timed):
+    (tmp_path / "a.html").write_text("hi")
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "threaded", 0.0, 1, False, metrics_sample=sample))
+    for _ in range(10):
+        get(port, "/a.html"); get(port, "/missing.html")
+    fam = parse(get(port, "/__metrics").decode())
+    responses = {l: v for _, l, v in fam["lab2_responses_total"]["samples"]}
+    assert responses == {'{code="200"}': 10, '{code="404"}': 10}        # counters are never sampled
+    assert fam["lab2_responses_total"]["type"] == "counter"
+    count = [v for n, _, v in fam.get("lab2_request_duration_seconds", {"samples": []})["samples"]
+             if n.endswith("_count")]
+    assert sum(count) == timed
+    assert all(f["type"] for f in fam.values())
@@ -0,0 +1,188 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from pool import AdaptivePool, KeepAliveWatcher
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def wait_for(cond, timeout: float = 2.0) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if cond(): return True
+        time.sleep(0.01)
+    return cond()
+
+
+def kick(pool):
+    # idle workers sleep on the real clock; wake them to look at the fake one
+    with pool._cv:
+        pool._cv.notify_all()
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def shed_at(pool, wait, now):
+    with pool._cv:
+        pool._q.append((now - wait, None, None))   # something still queued behind the head
+        try:
+            return pool._should_shed(wait, now)
+        finally:
+            pool._q.clear()
+
+
+def test_sheds_only_after_a_full_interval_above_target(clock):
+    pool = AdaptivePool(None, None, 1, 1, target=0.02, interval=0.2, clock=clock)
+    assert not shed_at(pool, 0.05, 10.0)        # first time above target starts the interval
+    assert not shed_at(pool, 0.05, 10.19)
+    assert shed_at(pool, 0.05, 10.2)
+    assert pool._dropping and pool._drops == 1
+
+
+def test_a_wait_below_target_restarts_the_interval(clock):
+    pool = AdaptivePool(None, None, 1, 1, target=0.02, interval=0.2, clock=clock)
+    assert not shed_at(pool, 0.05, 10.0)
+    assert not shed_at(pool, 0.01, 10.1)
+    assert not shed_at(pool, 0.05, 10.15)
+    assert not shed_at(pool, 0.05, 10.3)         # only 0.15 s since it went above again
+    assert shed_at(pool, 0.05, 10.35)
+
+
+def test_an_empty_queue_never_sheds(clock):
+    pool = AdaptivePool(None, None, 1, 1, target=0.02, interval=0.2, clock=clock)
+    with pool._cv:
+        assert not pool._should_shed(1.0, 10.0)
+        assert not pool._should_shed(1.0, 11.0)
+
+
+def test_drop_rate_grows_with_sqrt_drops(clock):
+    pool = AdaptivePool(None, None, 1, 1, target=0.02, interval=0.2, clock=clock)
+    shed_at(pool, 0.05, 10.0)
+    assert shed_at(pool, 0.05, 10.2)
+    gaps, t, last = [], 10.2, 10.2
+    while len(gaps) < 3:
+        t = round(t + 0.001, 3)
+        if shed_at(pool, 0.05, t):
+            gaps.append(t - last); last = t
+    assert gaps[0] == pytest.approx(0.2, abs=0.002)              # interval / sqrt(1)
+    assert gaps[1] == pytest.approx(0.2 / 2 ** 0.5, abs=0.002)
+    assert gaps[2] == pytest.approx(0.2 / 3 ** 0.5, abs=0.002)
+    assert pool._drops == 4
+
+
+def test_queued_connections_are_stamped_with_the_clock(clock):
+    shed, served = [], []
+    gate = threading.Event()
+
+    def handle(conn, addr):
+        gate.wait(2)
+        clock.now += 0.3        # every request takes 300 ms of fake time
+        served.append(conn)
+
+    pool = AdaptivePool(handle, lambda c, a: shed.append(c), 1, 1, target=0.02, interval=0.2,
+                        clock=clock)
+    pool.start()
+    pool.submit(0, None)
+    assert wait_for(lambda: pool.stats()["busy"] == 1)
+    for i in (1, 2, 3):
+        pool.submit(i, None)
+    gate.set()
+    assert wait_for(lambda: len(served) + len(shed) == 4)
+    pool.stop()
+    # 1 waits 300 ms and starts the interval, 2 waits 600 ms and is shed,
+    # 3 is the last one queued so it is served however long it waited
+    assert (served, shed) == ([0, 1, 3], [2])
+    assert pool.stats()["wait_ms"]["max"] == pytest.approx(600.0)
+
+
+def test_grows_to_max_then_retires_to_min_when_idle(clock):
+    gate = threading.Event()
+    pool = AdaptivePool(lambda c, a: gate.wait(2), None, 1, 4, idle=5.0, clock=clock)
+    pool.start()
+    for i in range(6):
+        assert pool.submit(i, None)
+    assert wait_for(lambda: pool.stats()["busy"] == 4)
+    st = pool.stats()
+    assert (st["size"], st["peak"], st["queued"]) == (4, 4, 2)
+    gate.set()
+    assert wait_for(lambda: pool.stats()["served"] == 6)
+
+    kick(pool)
+    time.sleep(0.05)
+    assert pool.stats()["size"] == 4               # not idle long enough yet
+    clock.now += 5.1
+    kick(pool)
+    assert wait_for(lambda: pool.stats()["size"] == 1)
+    assert pool.stats()["retired"] == 3
+    clock.now += 60.0
+    kick(pool)
+    time.sleep(0.05)
+    assert pool.stats()["size"] == 1               # never below min
+    pool.stop()
+
+
+def test_full_queue_refuses_without_queueing(clock):
+    gate = threading.Event()
+    pool = AdaptivePool(lambda c, a: gate.wait(2), None, 1, 1, max_queue=2, clock=clock)
+    pool.start()
+    assert pool.submit(0, None)
+    assert wait_for(lambda: pool.stats()["busy"] == 1)
+    assert pool.submit(1, None) and pool.submit(2, None)
+    assert not pool.submit(3, None)
+    assert pool.stats()["rejected_full"] == 1
+    gate.set(); pool.stop()
+
+
+def test_watcher_hands_back_readable_and_expires_idle(clock):
+    ready, expired = [], []
+    w = KeepAliveWatcher(lambda c, a: ready.append(a), lambda c, a: (expired.append(a), c.close()),
+                         timeout=5.0, clock=clock)
+    w.start()
+    pairs = [socket.socketpair() for _ in range(2)]
+    try:
+        w.park(pairs[0][0], "busy")
+        w.park(pairs[1][0], "idle")
+        assert wait_for(lambda: w.stats()["parked"] == 2)
+
+        clock.now += 4.0
+        pairs[0][1].sendall(b"GET / HTTP/1.1\r\n")
+        assert wait_for(lambda: ready == ["busy"])
+        assert expired == [] and w.stats()["parked"] == 1
+
+        clock.now += 1.5        # the idle one is now past the timeout
+        w._wake()
+        assert wait_for(lambda: expired == ["idle"])
+        st = w.stats()
+        assert (st["parked"], st["parks"], st["woken"], st["expired"]) == (0, 2, 1, 1)
+    finally:
+        w.close()
+        for a, b in pairs:
+            a.close(); b.close()
+
+
+def test_watcher_close_expires_everything_parked(clock):
+    expired = []
+    w = KeepAliveWatcher(None, lambda c, a: expired.append(a), timeout=5.0, clock=clock)
+    w.start()
+    a, b = socket.socketpair()
+    try:
+        w.park(a, "x")
+        assert wait_for(lambda: w.stats()["parked"] == 1)
+        w.close()
+        assert expired == ["x"]
+        w.park(b, "late")               # parked after close goes straight to expire
+        assert expired == ["x", "late"]
+    finally:
+        a.close(); b.close()
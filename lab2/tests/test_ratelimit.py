@@ -0,0 +1,81 @@
+import pytest
+
+import ratelimit
+from ratelimit import RateLimiter, gcra_step
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", c)
+    return c
+
+
+def test_gcra_allows_a_burst_then_denies():
+    interval, burst = 0.1, 5
+    tat, now = 0.0, 50.0
+    remaining = []
+    for _ in range(burst):
+        tat, (ok, tokens, _) = gcra_step(tat, now, interval, burst * interval)
+        assert ok
+        remaining.append(round(tokens, 6))
+    assert remaining == [4, 3, 2, 1, 0]
+    held = tat
+    tat, (ok, tokens, wait) = gcra_step(tat, now, interval, burst * interval)
+    assert not ok and tokens == 0 and wait == pytest.approx(interval)
+    assert tat == held   # a denied request does not push the TAT further out
+
+
+def test_gcra_refills_one_token_per_interval():
+    interval, tau = 0.1, 0.5
+    tat = 0.0
+    for _ in range(5):
+        tat, _ = gcra_step(tat, 50.0, interval, tau)
+    _, (ok, _, _) = gcra_step(tat, 50.05, interval, tau)
+    assert not ok
+    tat, (ok, tokens, _) = gcra_step(tat, 50.1, interval, tau)
+    assert ok and tokens == pytest.approx(0)
+    # idle long enough and the whole burst is back, no more
+    _, (ok, tokens, _) = gcra_step(tat, 60.0, interval, tau)
+    assert ok and tokens == pytest.approx(4)
+
+
+def test_limiter_burst_and_refill(clock):
+    rl = RateLimiter(rate=10, burst=3)
+    assert [rl.allow("a")[0] for _ in range(4)] == [True, True, True, False]
+    assert rl.allow("b")[0]   # keys are independent
+    clock.now += 0.1
+    assert rl.allow("a")[0] and not rl.allow("a")[0]
+    st = rl.stats()
+    assert (st["allowed"], st["denied"]) == (5, 2)
+
+
+def test_limiter_off_when_rate_is_zero(clock):
+    rl = RateLimiter(rate=0, burst=1)
+    assert all(rl.allow("a")[0] for _ in range(100))
+    assert len(rl) == 0
+
+
+def test_limiter_expires_refilled_keys(clock):
+    rl = RateLimiter(rate=10, burst=2, shards=1, ttl=1.0)
+    rl.allow("a"); rl.allow("b")
+    clock.now += 5.0
+    rl.allow("c")
+    assert len(rl) == 1 and rl.stats()["expired"] == 2
+
+
+def test_limiter_evicts_least_recent_over_cap(clock):
+    rl = RateLimiter(rate=10, burst=2, max_keys=2, shards=1, ttl=60.0)
+    for k in "abc":
+        rl.allow(k)
+    assert len(rl) == 2 and rl.stats()["evicted"] == 1
+    rl.allow("a")   # evicted, so it starts with a full burst again
+    assert rl.allow("a")[0]
@@ -0,0 +1,301 @@
+import gzip
+import socket
+import time
+from pathlib import Path
+
+import pytest
+
+import server
+from server import (HTTPServer, accepted_encodings, etag_matches, http_date, if_range_matches, not_modified,
+                    parse_range)
+
+
+class Client:
+    """One connection; responses are read through a buffered file, so pipelined ones stay queued."""
+
+    def __init__(self, port: int):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        self.f = self.sock.makefile("rb")
+
+    def send(self, path: str = "/a.html", keep_alive: bool = True, times: int = 1, **headers: str) -> None:
+        conn = "keep-alive" if keep_alive else "close"
+        extra = "".join(f"{k.replace('_', '-')}: {v}\r\n" for k, v in headers.items())
+        self.sock.sendall(f"GET {path} HTTP/1.1\r\nHost: x\r\nConnection: {conn}\r\n{extra}\r\n".encode() * times)
+
+    def response(self) -> bytes:
+        """Status line and headers of the next response; the body is kept in self.body."""
+        head = b""
+        while not head.endswith(b"\r\n\r\n"):
+            line = self.f.readline()
+            assert line, "connection closed"
+            head += line
+        length = [l for l in head.split(b"\r\n") if l.lower().startswith(b"content-length:")]
+        self.body = self.f.read(int(length[0].split(b":")[1])) if length else b""
+        return head
+
+    def header(self, head: bytes, name: str) -> str:
+        return next(l.split(b":", 1)[1].strip().decode() for l in head.split(b"\r\n")
+                    if l.lower().startswith(name.lower().encode() + b":"))
+
+    def close(self) -> None:
+        self.f.close(); self.sock.close()
+
+
+def test_single_mode_does_not_wait_on_idle_keep_alive(tmp_path: Path, serve):
+    (tmp_path / "a.html").write_text("hi")
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "single", 0.0, 1, False, keepalive_timeout=5.0))
+    idle = Client(port)
+    idle.send()
+    assert b"Connection: close" in idle.response()
+    t = time.monotonic()
+    other = Client(port)
+    other.send()
+    assert other.response().startswith(b"HTTP/1.1 200")
+    assert time.monotonic() - t < 1.0
+    idle.close(); other.close()
+
+
+def test_single_mode_still_answers_pipelined_requests(tmp_path: Path, serve):
+    (tmp_path / "a.html").write_text("hi")
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "single", 0.0, 1, False))
+    c = Client(port)
+    c.send(times=2)
+    first, second = c.response(), c.response()
+    assert b"Connection: keep-alive" in first and b"Connection: close" in second
+    c.close()
+
+
+def test_threaded_mode_keeps_idle_connections(tmp_path: Path, serve):
+    (tmp_path / "a.html").write_text("hi")
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "threaded", 0.0, 1, False, keepalive_timeout=1.0))
+    c = Client(port)
+    c.send()
+    assert b"Connection: keep-alive" in c.response()
+    c.send()
+    assert c.response().startswith(b"HTTP/1.1 200")
+    c.close()
+
+
+def test_listing_etag_304_and_change(tmp_path: Path, serve):
+    for name in "abc":
+        (tmp_path / f"{name}.html").write_text(name)
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "threaded", 0.0, 1, False))
+    c = Client(port)
+    c.send("/")
+    head = c.response()
+    assert head.startswith(b"HTTP/1.1 200") and b"b.html" in c.body
+    etag = c.header(head, "ETag")
+    c.send("/", If_None_Match=etag)
+    assert c.response().startswith(b"HTTP/1.1 304")
+    c.send("/", If_None_Match=f'"other", {etag}')
+    assert c.response().startswith(b"HTTP/1.1 304")
+    time.sleep(0.01)
+    (tmp_path / "d.html").write_text("d")   # moves the directory's mtime
+    c.send("/", If_None_Match=etag)
+    head = c.response()
+    assert head.startswith(b"HTTP/1.1 200") and b"d.html" in c.body and c.header(head, "ETag") != etag
+    c.close()
+
+
+def test_listing_pages(tmp_path: Path, serve):
+    for name in "abcde":
+        (tmp_path / f"{name}.html").write_text(name)
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "threaded", 0.0, 1, False, listing_page_size=2))
+    c = Client(port)
+    pages = {}
+    for q in ("", "?page=2", "?page=3", "?page=99", "?page=x"):
+        c.send("/" + q)
+        head = c.response()
+        assert head.startswith(b"HTTP/1.1 200")
+        pages[q] = (sorted(n for n in "abcde" if f"{n}.html".encode() in c.body), c.header(head, "ETag"))
+    assert pages[""][0] == ["a", "b"] and pages["?page=2"][0] == ["c", "d"] and pages["?page=3"][0] == ["e"]
+    assert pages["?page=99"] == pages["?page=3"] and pages["?page=x"] == pages[""]   # clamped / default
+    assert len({pages[q][1] for q in ("", "?page=2", "?page=3")}) == 3
+    c.close()
+
+
+@pytest.mark.parametrize("value, span", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=0-0", (0, 0)),
+    ("Bytes = 5-6", (5, 6)),
+    ("bytes=90-", (90, 99)),           # open-ended
+    ("bytes=50-500", (50, 99)),        # end clamped to the file
+    ("bytes=-10", (90, 99)),           # suffix
+    ("bytes=-500", (0, 99)),           # suffix longer than the file
+    ("bytes=0-1,5-6", None),           # multi-range: served whole
+    ("items=0-9", None),
+    ("bytes=", None),
+    ("bytes=-", None),
+    ("bytes=5", None),
+    ("bytes=a-b", None),
+    ("bytes=+1-5", None),
+    ("bytes=--5", None),
+    ("bytes=5--1", None),
+])
+def test_parse_range(value, span):
+    assert parse_range(value, 100) == span
+
+
+@pytest.mark.parametrize("value, size", [
+    ("bytes=10-5", 100),               # start > end
+    ("bytes=100-", 100),               # start == size
+    ("bytes=150-200", 100),
+    ("bytes=-0", 100),
+    ("bytes=0-", 0),
+    ("bytes=-5", 0),
+])
+def test_parse_range_unsatisfiable(value, size):
+    with pytest.raises(ValueError):
+        parse_range(value, size)
+
+
+def test_range_responses(tmp_path: Path, serve):
+    data = bytes(range(100))
+    (tmp_path / "a.pdf").write_bytes(data)
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "threaded", 0.0, 1, False))
+    c = Client(port)
+    for rng, body, content_range in (("bytes=10-19", data[10:20], "bytes 10-19/100"),
+                                     ("bytes=-5", data[95:], "bytes 95-99/100"),
+                                     ("bytes=98-", data[98:], "bytes 98-99/100")):
+        c.send("/a.pdf", Range=rng)
+        head = c.response()
+        assert head.startswith(b"HTTP/1.1 206") and c.body == body
+        assert c.header(head, "Content-Range") == content_range
+    for rng in ("bytes=0-1,5-6", "lines=1-2", "bytes=x-"):
+        c.send("/a.pdf", Range=rng)
+        head = c.response()
+        assert head.startswith(b"HTTP/1.1 200") and c.body == data and b"Content-Range" not in head
+    c.send("/a.pdf", Range="bytes=100-")
+    head = c.response()
+    assert head.startswith(b"HTTP/1.1 416") and c.header(head, "Content-Range") == "bytes */100"
+    c.send("/a.pdf")
+    assert c.response().startswith(b"HTTP/1.1 200")   # the 416 kept the connection usable
+    c.close()
+
+
+@pytest.mark.parametrize("header, codings", [
+    (None, set()),
+    ("", set()),
+    ("gzip", {"gzip"}),
+    ("gzip, br", {"gzip", "br"}),
+    ("GZIP;Q=0.5", {"gzip"}),
+    ("gzip;q=0", set()),
+    ("gzip;q=0.000, br", {"br"}),
+    ("br;q=abc, gzip", {"gzip"}),     # an unreadable q counts as 0
+    ("*", {"*", "br", "gzip"}),
+    ("*;q=0", set()),
+    ("gzip;q=0, *", {"*", "br"}),     # * does not bring back a refused coding
+    ("br;q=0, *;q=0.1", {"*", "gzip"}),
+    (" , ;q=1", set()),
+])
+def test_accepted_encodings(header, codings):
+    assert accepted_encodings(header) == codings
+
+
+def test_codings_prefer_br_and_skip_ranges(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(server, "CODINGS", ("br", "gzip"))
+    srv = HTTPServer("127.0.0.1", 0, tmp_path, "threaded", 0.0, 1, False)
+    html = "text/html; charset=utf-8"
+    codings = lambda ctype=html, fly=False, **h: srv._codings(ctype, {k.replace("_", "-"): v for k, v in h.items()}, fly)
+    assert codings(accept_encoding="gzip, br") == ["br", "gzip"]   # our order, not the header's
+    assert codings(accept_encoding="gzip;q=1, br;q=0") == ["gzip"]
+    assert codings(accept_encoding="*", fly=True) == ["br", "gzip"]
+    assert codings(accept_encoding="identity") == []
+    assert codings(accept_encoding="gzip, br", range="bytes=0-9") == []
+    assert codings(accept_encoding="gzip, br", range="bytes=0-9", fly=True) == []
+    assert codings("image/png", accept_encoding="gzip") == []
+    assert srv._codings(html, None) == []
+    srv.compressed = None
+    assert codings(accept_encoding="gzip", fly=True) == [] and codings(accept_encoding="gzip") == ["gzip"]
+
+
+def test_ranges_are_served_uncompressed(tmp_path: Path, serve):
+    data = b"hello, world " * 200
+    (tmp_path / "a.html").write_bytes(data)
+    (tmp_path / "b.html").write_bytes(data)
+    (tmp_path / "b.html.gz").write_bytes(gzip.compress(data))
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "threaded", 0.0, 1, False))
+    c = Client(port)
+    for path in ("/a.html", "/b.html"):     # compressed on the fly, and a precompressed sibling
+        c.send(path, Accept_Encoding="gzip")
+        head = c.response()
+        assert c.header(head, "Content-Encoding") == "gzip" and gzip.decompress(c.body) == data
+        c.send(path, Accept_Encoding="gzip", Range="bytes=0-9")
+        head = c.response()
+        assert head.startswith(b"HTTP/1.1 206") and b"Content-Encoding" not in head
+        assert c.body == data[:10] and c.header(head, "Content-Range") == f"bytes 0-9/{len(data)}"
+    c.close()
+
+
+@pytest.mark.parametrize("header, etag, match", [
+    (None, '"a"', False),
+    ('"a"', '"a"', True),
+    ('"b"', '"a"', False),
+    ('W/"a"', '"a"', True),            # weak comparison
+    ('"a"', 'W/"a"', True),
+    ('"b", W/"a"', '"a"', True),
+    (' "b" ,"a" ', '"a"', True),
+    ("*", '"a"', True),
+    ('"a', '"a"', False),
+])
+def test_etag_matches(header, etag, match):
+    assert etag_matches(header, etag) is match
+
+
+MTIME = 1_700_000_000.7
+LAST_MODIFIED = http_date(MTIME)           # whole seconds, as sent in Last-Modified
+
+
+@pytest.mark.parametrize("headers, modified", [
+    (None, True),
+    ({}, True),
+    ({"if-none-match": '"a"'}, False),
+    ({"if-none-match": '"b"'}, True),
+    ({"if-none-match": "*"}, False),
+    ({"if-modified-since": LAST_MODIFIED}, False),
+    ({"if-modified-since": http_date(MTIME + 60)}, False),
+    ({"if-modified-since": http_date(MTIME - 60)}, True),
+    ({"if-modified-since": "yesterday"}, True),
+    # If-None-Match decides whenever it is present, even if the date says otherwise
+    ({"if-none-match": '"b"', "if-modified-since": LAST_MODIFIED}, True),
+    ({"if-none-match": '"a"', "if-modified-since": http_date(MTIME - 60)}, False),
+])
+def test_not_modified(headers, modified):
+    assert not_modified(headers, '"a"', MTIME) is not modified
+
+
+@pytest.mark.parametrize("value, match", [
+    ('"a"', True),
+    (' "a" ', True),
+    ('"b"', False),
+    ('W/"a"', False),                  # If-Range needs a strong match
+    (LAST_MODIFIED, True),
+    (http_date(MTIME + 60), False),    # only the exact date counts
+    (http_date(MTIME - 60), False),
+    ("*", False),
+    ("garbage", False),
+])
+def test_if_range_matches(value, match):
+    assert if_range_matches(value, '"a"', MTIME) is match
+
+
+def test_conditional_requests(tmp_path: Path, serve):
+    data = bytes(range(100))
+    (tmp_path / "a.pdf").write_bytes(data)
+    port = serve(HTTPServer("127.0.0.1", 0, tmp_path, "threaded", 0.0, 1, False))
+    c = Client(port)
+    c.send("/a.pdf")
+    head = c.response()
+    etag, last_modified = c.header(head, "ETag"), c.header(head, "Last-Modified")
+    for cond in ({"If_None_Match": etag}, {"If_None_Match": "W/" + etag}, {"If_Modified_Since": last_modified},
+                 {"If_None_Match": f'"x", {etag}', "If_Modified_Since": "Thu, 01 Jan 1970 00:00:00 GMT"}):
+        c.send("/a.pdf", **cond)
+        head = c.response()
+        assert head.startswith(b"HTTP/1.1 304") and c.body == b"" and c.header(head, "ETag") == etag
+    c.send("/a.pdf", If_None_Match='"x"', If_Modified_Since=last_modified)
+    assert c.response().startswith(b"HTTP/1.1 200") and c.body == data
+    for if_range, code, body in ((etag, b"206", data[:10]), (last_modified, b"206", data[:10]),
+                                 ('"stale"', b"200", data), ("W/" + etag, b"200", data)):
+        c.send("/a.pdf", Range="bytes=0-9", If_Range=if_range)
+        assert c.response().startswith(b"HTTP/1.1 " + code) and c.body == body
+    c.close()
@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from server import HTTPServer
+from shm import SharedStore, ShmTable
+
+
+def test_table_counts_overflow_when_full():
+    t = ShmTable(4, 16, "Q")
+    for i in range(4):
+        assert t._unlocked_put(f"k{i}".encode(), (i,))
+    assert not t._unlocked_put(b"k4", (4,))
+    assert t._unlocked_get(b"k2") == (2,)
+    assert t._unlocked_put(b"k2", (20,))  # existing keys still update
+    assert len(t) == 4 and t.overflow.value == 1
+
+
+def test_store_rejects_long_keys():
+    store = SharedStore(1, counter_slots=8)
+    assert store.incr("/a") and store.incr("/a")
+    assert not store.incr("/" + "x" * 300)
+    assert store.get_count("/a") == 2
+    assert store.counter_stats() == {"slots": 8, "used": 1, "overflow": 1}
+
+
+def test_server_counts_overflowing_keys_locally(tmp_path: Path):
+    store = SharedStore(1, counter_slots=2)
+    srv = HTTPServer("127.0.0.1", 0, tmp_path, "single", 0.0, 1, False, path_cache=0)
+    srv.attach(store, 0)
+    long = "/" + "y" * 300
+    for path in ("/a", "/b", "/c", "/c", long):
+        srv.inc_counter(path)
+    assert srv.counters_snapshot() == {"/a": 1, "/b": 1, "/c": 2, long: 1}
+    assert srv.count_for("/c") == 2 and srv.count_for("/a") == 1
+    counters = srv.stats()["counters"]  # "/c" is only tried once
+    assert counters["overflow"] == 2 and counters["local_keys"] == 2
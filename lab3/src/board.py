@@ -1,7 +1,13 @@
 # src/board.py
 from __future__ import annotations
+import asyncio
+import os
+import sys
+import time
+from array import array
+from collections import deque
 from dataclasses import dataclass
-from threading import RLock
+from threading import Condition, Lock, RLock
 from typing import Dict, List, Optional, Tuple
 
 Coord = Tuple[int, int]  # (row, col)
@@ -13,6 +19,66 @@ class Cell:
     matched: bool = False
 
 
+REP_CHECK_MODES = ("off", "local", "sampled", "full")
+
+
+class RepCheck:
+    """
+    When a board verifies its rep invariant, and what that has cost so far.
+
+    Modes:
+      - off:     never, not even at construction
+      - local:   the cells a mutation touched
+      - sampled: like local, plus a full scan every `every` mutations
+      - full:    a full scan after every mutation, O(rows*cols) under the lock
+                 (the default; "off" under python -O, where the asserts would
+                 not fire anyway)
+    The spec is "mode" or "sampled:N", from the constructor argument or else
+    the BOARD_REP_CHECK environment variable. Counters are only updated by
+    the owning board while it holds its lock.
+    """
+    __slots__ = ("mode", "every", "mutations", "local_checks", "full_checks", "seconds")
+
+    def __init__(self, spec: Optional[str] = None):
+        spec = spec or os.environ.get("BOARD_REP_CHECK") or ("full" if __debug__ else "off")
+        mode, _, every = spec.strip().lower().partition(":")
+        if mode not in REP_CHECK_MODES:
+            raise ValueError(f"rep check mode must be one of {', '.join(REP_CHECK_MODES)}")
+        self.mode = mode
+        self.every = max(1, int(every)) if every else 1000
+        self.mutations = self.local_checks = self.full_checks = 0
+        self.seconds = 0.0
+
+    def initial(self, board) -> None:
+        if self.mode == "off":
+            return
+        t = time.perf_counter()
+        board._check_rep()
+        self.full_checks += 1
+        self.seconds += time.perf_counter() - t
+
+    def after(self, board, touched: tuple) -> None:
+        """Called by board after a mutation of the cells in touched."""
+        mode = self.mode
+        if mode == "off":
+            return
+        self.mutations += 1
+        t = time.perf_counter()
+        if mode == "full" or (mode == "sampled" and self.mutations % self.every == 0):
+            board._check_rep()
+            self.full_checks += 1
+        else:
+            for cell in touched:
+                board._check_cell(cell)
+            self.local_checks += len(touched)
+        self.seconds += time.perf_counter() - t
+
+    def stats(self) -> Dict:
+        return {"mode": self.mode, "every": self.every if self.mode == "sampled" else None,
+                "mutations": self.mutations, "local_checks": self.local_checks,
+                "full_checks": self.full_checks, "seconds": round(self.seconds, 6)}
+
+
 class Board:
     """
     Mutable Board ADT.
@@ -23,9 +89,11 @@ class Board:
       - matched => face_up (usually true; you can enforce your exact rule)
     Safety:
       - guarded by an internal lock to be safe under concurrent HTTP requests
+    Checking:
+      - see RepCheck; rep_check overrides BOARD_REP_CHECK for this board
     """
 
-    def __init__(self, rows: int, cols: int, values: List[str]):
+    def __init__(self, rows: int, cols: int, values: List[str], rep_check: Optional[str] = None):
         if rows <= 0 or cols <= 0:
             raise ValueError("rows/cols must be positive")
         if len(values) != rows * cols:
@@ -34,6 +102,7 @@ class Board:
         self._rows = rows
         self._cols = cols
         self._lock = RLock()
+        self._rep = RepCheck(rep_check)
 
         self._grid: List[List[Cell]] = []
         i = 0
@@ -44,7 +113,7 @@ class Board:
                 i += 1
             self._grid.append(row_cells)
 
-        self._check_rep()
+        self._rep.initial(self)
 
     def _check_rep(self) -> None:
         assert len(self._grid) == self._rows
@@ -56,9 +125,35 @@ class Board:
                     # choose the invariant your rules want:
                     assert cell.face_up is True
 
+    def _check_cell(self, pos: Coord) -> None:
+        cell = self._grid[pos[0]][pos[1]]
+        assert isinstance(cell.value, str)
+        if cell.matched:
+            assert cell.face_up is True
+
+    def rep_check_stats(self) -> Dict:
+        with self._lock:
+            return self._rep.stats()
+
     def size(self) -> Tuple[int, int]:
         return (self._rows, self._cols)
 
+    @staticmethod
+    def estimate_nbytes(rows: int, cols: int) -> int:
+        """A lower bound on nbytes() of a rows x cols board, known before building it."""
+        per_cell = 8 + sys.getsizeof(Cell("")) + sys.getsizeof("")
+        return sys.getsizeof([]) * (rows + 1) + 8 * rows + rows * cols * per_cell
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the grid (lists, cells and values)."""
+        with self._lock:
+            total = sys.getsizeof(self._grid)
+            for row in self._grid:
+                total += sys.getsizeof(row)
+                for cell in row:
+                    total += sys.getsizeof(cell) + sys.getsizeof(cell.value)
+            return total
+
     def peek(self, pos: Coord) -> Cell:
         r, c = pos
         with self._lock:
@@ -77,7 +172,7 @@ class Board:
                 raise ValueError("already face up")
 
             self._grid[r][c] = Cell(value=cell.value, face_up=True, matched=False)
-            self._check_rep()
+            self._rep.after(self, (pos,))
             return cell.value
 
     def flip_down(self, pos: Coord) -> None:
@@ -90,7 +185,7 @@ class Board:
             if not cell.face_up:
                 return
             self._grid[r][c] = Cell(value=cell.value, face_up=False, matched=False)
-            self._check_rep()
+            self._rep.after(self, (pos,))
 
     def mark_matched(self, pos1: Coord, pos2: Coord) -> None:
         """Mark two positions as permanently matched."""
@@ -106,9 +201,454 @@ class Board:
 
             self._grid[pos1[0]][pos1[1]] = Cell(value=c1.value, face_up=True, matched=True)
             self._grid[pos2[0]][pos2[1]] = Cell(value=c2.value, face_up=True, matched=True)
-            self._check_rep()
+            self._rep.after(self, (pos1, pos2))
 
     def _validate_coord(self, pos: Coord) -> None:
         r, c = pos
         if not (0 <= r < self._rows and 0 <= c < self._cols):
-            raise ValueError("invalid coordinate")
\ No newline at end of file
+            raise ValueError("invalid coordinate")
+
+
+FACE_UP = 1
+MATCHED = 2
+
+
+class CompactBoard:
+    """
+    Board with the same API, stored in flat arrays instead of Cell objects.
+
+    Rep:
+      - cell (r, c) lives at index i = r * cols + c
+      - _ids[i] is the cell's value id; _values[id] is the value (each
+        distinct value is stored once). array('H') while there are at most
+        65536 distinct values, array('I') beyond that
+      - _state[i] holds FACE_UP | MATCHED bits
+      - matched => face_up
+    Mutations change one byte and allocate nothing; peek() builds a Cell on
+    demand. Under a "local" or "off" RepCheck they are O(1).
+    Safety:
+      - guarded by an internal lock, like Board
+    """
+    __slots__ = ("_rows", "_cols", "_lock", "_rep", "_values", "_ids", "_state")
+
+    def __init__(self, rows: int, cols: int, values: List[str], rep_check: Optional[str] = None):
+        if rows <= 0 or cols <= 0:
+            raise ValueError("rows/cols must be positive")
+        if len(values) != rows * cols:
+            raise ValueError("values length must equal rows*cols")
+
+        self._rows = rows
+        self._cols = cols
+        self._lock = RLock()
+        self._rep = RepCheck(rep_check)
+
+        index: Dict[str, int] = {}
+        ids = [index.setdefault(v, len(index)) for v in values]
+        self._values: List[str] = list(index)
+        self._ids = array("H" if len(index) <= 1 << 16 else "I", ids)
+        self._state = bytearray(rows * cols)
+        # _ids and _values never change after this, so their part of the rep is checked once
+        assert all(isinstance(v, str) for v in self._values)
+
+        self._rep.initial(self)
+
+    def _check_rep(self) -> None:
+        assert len(self._ids) == len(self._state) == self._rows * self._cols
+        # states are 0, FACE_UP or FACE_UP | MATCHED; MATCHED alone breaks the invariant
+        assert MATCHED not in self._state
+
+    def _check_cell(self, i: int) -> None:
+        s = self._state[i]
+        assert not (s & MATCHED) or s & FACE_UP
+
+    def rep_check_stats(self) -> Dict:
+        with self._lock:
+            return self._rep.stats()
+
+    def size(self) -> Tuple[int, int]:
+        return (self._rows, self._cols)
+
+    @staticmethod
+    def estimate_nbytes(rows: int, cols: int) -> int:
+        """A lower bound on nbytes() of a rows x cols board, known before building it."""
+        return sys.getsizeof(array("H")) + sys.getsizeof(bytearray()) + sys.getsizeof([]) + 3 * rows * cols
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the arrays and the distinct values."""
+        return (sys.getsizeof(self._ids) + sys.getsizeof(self._state) + sys.getsizeof(self._values)
+                + sum(sys.getsizeof(v) for v in self._values))
+
+    def _index(self, pos: Coord) -> int:
+        r, c = pos
+        if not (0 <= r < self._rows and 0 <= c < self._cols):
+            raise ValueError("invalid coordinate")
+        return r * self._cols + c
+
+    def peek(self, pos: Coord) -> Cell:
+        with self._lock:
+            i = self._index(pos)
+            s = self._state[i]
+            return Cell(value=self._values[self._ids[i]], face_up=bool(s & FACE_UP), matched=bool(s & MATCHED))
+
+    def flip_up(self, pos: Coord) -> str:
+        """Flip a card face-up and return its value (if allowed by rules)."""
+        with self._lock:
+            i = self._index(pos)
+            s = self._state[i]
+            if s & MATCHED:
+                raise ValueError("cannot flip a matched card")
+            if s & FACE_UP:
+                raise ValueError("already face up")
+            self._state[i] = FACE_UP
+            self._rep.after(self, (i,))
+            return self._values[self._ids[i]]
+
+    def flip_down(self, pos: Coord) -> None:
+        with self._lock:
+            i = self._index(pos)
+            s = self._state[i]
+            if s & MATCHED:
+                raise ValueError("cannot flip down a matched card")
+            if not s & FACE_UP:
+                return
+            self._state[i] = 0
+            self._rep.after(self, (i,))
+
+    def mark_matched(self, pos1: Coord, pos2: Coord) -> None:
+        """Mark two positions as permanently matched."""
+        with self._lock:
+            i, j = self._index(pos1), self._index(pos2)
+            if not (self._state[i] & FACE_UP and self._state[j] & FACE_UP):
+                raise ValueError("both must be face up to match")
+            if self._ids[i] != self._ids[j]:
+                raise ValueError("values do not match")
+            self._state[i] = self._state[j] = FACE_UP | MATCHED
+            self._rep.after(self, (i, j))
+
+
+BOARD_ENGINES = {"grid": Board, "compact": CompactBoard}
+
+
+REMOVED = 4
+
+
+class _Stripe:
+    """One lock and the controller/waiter bookkeeping of the cells it guards."""
+    __slots__ = ("lock", "owner", "waiting", "waits", "wakeups")
+
+    def __init__(self):
+        self.lock = Lock()
+        self.owner: Dict[int, str] = {}      # cell -> controlling player
+        self.waiting: Dict[int, list] = {}   # cell -> [Condition on lock, waiter count]
+        self.waits = 0
+        self.wakeups = 0
+
+
+class _Player:
+    __slots__ = ("lock", "held", "turn")
+
+    def __init__(self):
+        self.lock = Lock()      # one flip at a time per player
+        self.held: List[int] = []   # cards controlled: [], [first] or a matched [first, second]
+        self.turn: List[int] = []   # cards flipped this turn, settled on the next first flip
+
+
+class ConcurrentBoard:
+    """
+    Memory Scramble board for players flipping at the same time, as in simulation.py.
+
+    Rules:
+      - a first flip takes control of the card, turning it face up; if another
+        player controls it, it waits until the card is released or removed
+      - a second flip never waits: a removed or controlled card fails and
+        gives up the first card. A match keeps control of both cards,
+        a mismatch gives up both (they stay face up)
+      - on the player's next first flip a matched pair is removed, and the
+        previous cards are turned face down unless someone took them
+    Rep:
+      - cards are stored like CompactBoard: _values, _ids and _state[i], which
+        is 0 (face down), FACE_UP or REMOVED
+      - cell i belongs to stripe i % len(_stripes); its lock guards _state[i]
+        and the cell's controller, stripe.owner.get(i)
+      - controlled => face up
+    Safety:
+      - waiters on a cell sleep on a Condition of their own (created on
+        demand over the stripe lock), so releasing or removing card A never
+        wakes a waiter on card B
+      - a waiting player controls no cards and a flip holds one stripe lock
+        at a time (look takes them all, in order), so waiting cannot deadlock
+    """
+
+    def __init__(self, rows: int, cols: int, values: List[str], stripes: int = 64):
+        if rows <= 0 or cols <= 0:
+            raise ValueError("rows/cols must be positive")
+        if len(values) != rows * cols:
+            raise ValueError("values length must equal rows*cols")
+
+        self._rows = rows
+        self._cols = cols
+        index: Dict[str, int] = {}
+        ids = [index.setdefault(v, len(index)) for v in values]
+        self._values: List[str] = list(index)
+        self._ids = array("H" if len(index) <= 1 << 16 else "I", ids)
+        self._state = bytearray(rows * cols)
+        self._stripes = [_Stripe() for _ in range(max(1, min(int(stripes), rows * cols)))]
+        self._players: Dict[str, _Player] = {}
+        self._players_lock = Lock()
+        self._check_rep()
+
+    @classmethod
+    def parse_from_file(cls, path: str, stripes: int = 64) -> "ConcurrentBoard":
+        """Reads "ROWSxCOLS" followed by one card value per line."""
+        with open(path, encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+        rows, sep, cols = lines[0].partition("x") if lines else ("", "", "")
+        if not sep or not rows.isdigit() or not cols.isdigit():
+            raise ValueError(f"{path}: first line must be ROWSxCOLS")
+        return cls(int(rows), int(cols), lines[1:], stripes)
+
+    def _check_rep(self) -> None:
+        assert len(self._ids) == len(self._state) == self._rows * self._cols
+        assert all(isinstance(v, str) for v in self._values)
+        n = len(self._stripes)
+        for k, st in enumerate(self._stripes):
+            for i in st.owner:
+                assert i % n == k and self._state[i] == FACE_UP
+
+    def size(self) -> Tuple[int, int]:
+        return (self._rows, self._cols)
+
+    get_dimensions = size
+
+    def _index(self, row: int, col: int) -> int:
+        if not (0 <= row < self._rows and 0 <= col < self._cols):
+            raise ValueError("invalid coordinate")
+        return row * self._cols + col
+
+    def _player(self, player: str) -> _Player:
+        p = self._players.get(player)
+        if p is None:
+            with self._players_lock:
+                p = self._players.setdefault(player, _Player())
+        return p
+
+    def flip(self, player: str, row: int, col: int) -> str:
+        """Flips (row, col) for player and returns the card, blocking as the rules say."""
+        i = self._index(row, col)
+        p = self._player(player)
+        with p.lock:
+            if len(p.held) == 1:
+                return self._second(p, player, i, (row, col))
+            self._settle(p)
+            return self._first(p, player, i, (row, col))
+
+    def leave(self, player: str) -> None:
+        """Gives up player's cards as their next first flip would, without flipping."""
+        p = self._players.get(player)
+        if p is None:
+            return
+        with p.lock:
+            if len(p.held) == 1:
+                self._release(p.held[0])
+                p.held = []
+            self._settle(p)
+
+    def _first(self, p: _Player, player: str, i: int, pos: Coord) -> str:
+        st = self._stripes[i % len(self._stripes)]
+        with st.lock:
+            owner = st.owner
+            if i in owner:
+                w = st.waiting.get(i)
+                if w is None:
+                    w = st.waiting[i] = [Condition(st.lock), 0]
+                w[1] += 1
+                st.waits += 1
+                try:
+                    while i in owner:
+                        w[0].wait()
+                        st.wakeups += 1
+                finally:
+                    w[1] -= 1
+                    if not w[1]:
+                        del st.waiting[i]
+            if self._state[i] & REMOVED:
+                raise ValueError(f"no card at {pos}")
+            owner[i] = player
+            self._state[i] = FACE_UP
+        p.held = [i]
+        p.turn = [i]
+        return self._values[self._ids[i]]
+
+    def _second(self, p: _Player, player: str, j: int, pos: Coord) -> str:
+        first = p.held[0]
+        st = self._stripes[j % len(self._stripes)]
+        with st.lock:
+            if self._state[j] & REMOVED:
+                problem = f"no card at {pos}"
+            elif j in st.owner:
+                problem = f"card at {pos} is controlled"
+            else:
+                problem = None
+                st.owner[j] = player
+                self._state[j] = FACE_UP
+        if problem:
+            self._release(first)
+            p.held = []
+            raise ValueError(problem)
+        p.turn.append(j)
+        if self._ids[first] == self._ids[j]:
+            p.held.append(j)
+        else:
+            self._release(first)
+            self._release(j)
+            p.held = []
+        return self._values[self._ids[j]]
+
+    def _settle(self, p: _Player) -> None:
+        """Removes a matched pair, or turns last turn's free cards face down."""
+        matched = len(p.held) == 2
+        for i in p.turn:
+            st = self._stripes[i % len(self._stripes)]
+            with st.lock:
+                if matched:
+                    self._state[i] = REMOVED
+                    del st.owner[i]
+                    w = st.waiting.get(i)
+                    if w:
+                        w[0].notify_all()   # they all fail now
+                elif self._state[i] == FACE_UP and i not in st.owner:
+                    self._state[i] = 0
+        p.held = []
+        p.turn = []
+
+    def _release(self, i: int) -> None:
+        st = self._stripes[i % len(self._stripes)]
+        with st.lock:
+            del st.owner[i]
+            w = st.waiting.get(i)
+            if w:
+                w[0].notify()   # only one of them can take it
+
+    def look(self, player: Optional[str] = None) -> str:
+        """The board as player sees it: "ROWSxCOLS", then none/down/up X/my X per cell."""
+        stripes = self._stripes
+        n = len(stripes)
+        for st in stripes:
+            st.lock.acquire()
+        try:
+            lines = [f"{self._rows}x{self._cols}"]
+            for i, s in enumerate(self._state):
+                if s & REMOVED:
+                    lines.append("none")
+                elif not s:
+                    lines.append("down")
+                else:
+                    mine = player is not None and stripes[i % n].owner.get(i) == player
+                    lines.append(("my " if mine else "up ") + self._values[self._ids[i]])
+        finally:
+            for st in stripes:
+                st.lock.release()
+        return "\n".join(lines) + "\n"
+
+    def to_string(self) -> str:
+        return self.look()
+
+    __str__ = to_string
+
+    def stats(self) -> Dict:
+        """Players seen, and how often first flips waited and their waiters were woken."""
+        waits = sum(st.waits for st in self._stripes)
+        wakeups = sum(st.wakeups for st in self._stripes)
+        return {"players": len(self._players), "stripes": len(self._stripes),
+                "waits": waits, "wakeups": wakeups}
+
+
+class _Waiters:
+    """Futures of the coroutines waiting for one cell, with Condition's notify()/notify_all()."""
+    __slots__ = ("futures",)
+
+    def __init__(self):
+        self.futures: deque = deque()
+
+    def notify(self, n: int = 1) -> None:
+        futures = self.futures
+        while n and futures:
+            f = futures.popleft()
+            if not f.done():   # skip waiters that were cancelled
+                f.set_result(None)
+                n -= 1
+
+    def notify_all(self) -> None:
+        self.notify(len(self.futures))
+
+
+class AsyncBoard(ConcurrentBoard):
+    """
+    ConcurrentBoard for players that are coroutines on one event loop.
+
+    flip() and leave() are coroutines; everything else is as in
+    ConcurrentBoard, which also provides the rules. There is a single stripe,
+    and its lock is never contended because only the loop's thread touches
+    the board. A first flip of a controlled card awaits a future queued on
+    that cell (a _Waiters in place of the Condition), so a waiting player
+    costs one future instead of a thread. A player's flips are serialized by
+    an asyncio.Lock.
+    Not thread-safe: use it from the loop it is awaited on.
+    """
+
+    def __init__(self, rows: int, cols: int, values: List[str], stripes: int = 1):
+        super().__init__(rows, cols, values, 1)
+
+    def _player(self, player: str) -> _Player:
+        p = self._players.get(player)
+        if p is None:
+            p = self._players[player] = _Player()
+            p.lock = asyncio.Lock()
+        return p
+
+    async def flip(self, player: str, row: int, col: int) -> str:
+        """Flips (row, col) for player and returns the card, waiting as the rules say."""
+        i = self._index(row, col)
+        p = self._player(player)
+        async with p.lock:
+            if len(p.held) == 1:
+                return self._second(p, player, i, (row, col))
+            self._settle(p)
+            st = self._stripes[0]
+            if i in st.owner:
+                await self._wait(st, i)
+            return self._first(p, player, i, (row, col))
+
+    async def _wait(self, st: _Stripe, i: int) -> None:
+        w = st.waiting.get(i)
+        if w is None:
+            w = st.waiting[i] = [_Waiters(), 0]
+        w[1] += 1
+        st.waits += 1
+        loop = asyncio.get_running_loop()
+        try:
+            while i in st.owner:
+                fut = loop.create_future()
+                w[0].futures.append(fut)
+                try:
+                    await fut
+                except asyncio.CancelledError:
+                    if not fut.cancelled():
+                        w[0].notify()   # woken and cancelled at once: pass the wakeup on
+                    raise
+                st.wakeups += 1
+        finally:
+            w[1] -= 1
+            if not w[1]:
+                del st.waiting[i]
+
+    async def leave(self, player: str) -> None:
+        """Gives up player's cards as their next first flip would, without flipping."""
+        p = self._players.get(player)
+        if p is None:
+            return
+        async with p.lock:
+            if len(p.held) == 1:
+                self._release(p.held[0])
+                p.held = []
+            self._settle(p)
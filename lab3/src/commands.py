@@ -2,18 +2,32 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, Optional, Tuple, List
-from board import Board, Coord
+from board import BOARD_ENGINES, Board, CompactBoard, Coord
 
 @dataclass
 class GameState:
-    board: Board
+    board: Board | CompactBoard
     # Track the current “turn state” (example: 0/1/2 flips this turn)
     first_pick: Optional[Coord] = None
     second_pick: Optional[Coord] = None
 
 
-def new_game(rows: int, cols: int, values: List[str]) -> GameState:
-    return GameState(board=Board(rows, cols, values))
+def new_game(rows: int, cols: int, values: List[str], engine: str = "grid",
+             rep_check: Optional[str] = None) -> GameState:
+    """
+    engine picks the board representation: "grid" (Board) or "compact" (CompactBoard);
+    rep_check its invariant checking (see board.RepCheck), BOARD_REP_CHECK when None.
+    """
+    if engine not in BOARD_ENGINES:
+        raise ValueError(f"unknown board engine {engine!r}")
+    return GameState(board=BOARD_ENGINES[engine](rows, cols, values, rep_check))
+
+
+def board_nbytes(rows: int, cols: int, engine: str = "grid") -> int:
+    """A lower bound on the memory new_game() would take, so callers can refuse before building."""
+    if engine not in BOARD_ENGINES:
+        raise ValueError(f"unknown board engine {engine!r}")
+    return BOARD_ENGINES[engine].estimate_nbytes(rows, cols)
 
 
 def pick(state: GameState, pos: Coord) -> Dict:
@@ -0,0 +1,215 @@
+# src/registry.py
+from __future__ import annotations
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+import commands
+from commands import GameState
+
+
+class RegistryFull(RuntimeError):
+    """No room for another game even after evicting idle ones."""
+
+
+@dataclass
+class Game:
+    game_id: str
+    state: GameState
+    size: int
+    created: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    players: List[str] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    # lock statistics, only written while holding `lock`
+    acquisitions: int = 0
+    contended: int = 0
+    wait_s: float = 0.0
+    wait_max: float = 0.0
+
+    def summary(self) -> Dict:
+        rows, cols = self.state.board.size()
+        now = time.monotonic()
+        return {"game_id": self.game_id, "rows": rows, "cols": cols, "engine": type(self.state.board).__name__,
+                "players": list(self.players),
+                "bytes": self.size, "age_s": round(now - self.created, 1),
+                "idle_s": round(now - self.last_used, 1)}
+
+
+class GameRegistry:
+    """
+    Games keyed by id, each with its own lock.
+
+    Lookups are plain dict reads, so requests for different games never touch
+    a shared lock; the registry lock is only taken to add or evict a game.
+    Games idle for longer than `idle_ttl` are evicted, and the boards' combined
+    footprint is kept under `max_bytes` by evicting least recently used idle
+    games first (a game whose lock is held is never evicted).
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, idle_ttl: float = 600.0,
+                 max_games: int = 10_000, sweep_interval: float = 5.0):
+        self.max_bytes = int(max_bytes)
+        self.idle_ttl = float(idle_ttl)
+        self.max_games = int(max_games)
+        self.sweep_interval = float(sweep_interval)
+        self._games: Dict[str, Game] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+        self.created = 0
+        self.evicted_idle = 0
+        self.evicted_budget = 0
+        self.rejected = 0
+        # lock statistics of games that have been evicted or replaced
+        self._retired = {"acquisitions": 0, "contended": 0, "wait_s": 0.0, "wait_max": 0.0}
+        self._retired_checks = {"mutations": 0, "local_checks": 0, "full_checks": 0, "seconds": 0.0}
+
+    def create(self, rows: int, cols: int, values: List[str], player: Optional[str] = None,
+               game_id: Optional[str] = None, engine: str = "grid", rep_check: Optional[str] = None) -> Game:
+        """
+        Starts a game (replacing `game_id` if it exists); raises RegistryFull when over budget.
+
+        The board's size is estimated from rows, cols and engine and checked
+        first, so a game that cannot fit is refused before it is allocated;
+        the real footprint is checked again once the board exists.
+        """
+        estimate = commands.board_nbytes(rows, cols, engine)
+        with self._lock:
+            self._sweep(time.monotonic())
+            self._make_room(estimate, rows, cols)
+        state = commands.new_game(rows, cols, values, engine, rep_check)
+        game = Game(game_id or secrets.token_hex(6), state, state.board.nbytes())
+        if player:
+            game.players.append(player)
+        with self._lock:
+            old = self._games.pop(game.game_id, None)
+            if old is not None:
+                self._retire(old)
+            self._make_room(game.size, rows, cols)
+            self._games[game.game_id] = game
+            self._bytes += game.size
+            self.created += 1
+        return game
+
+    def _make_room(self, size: int, rows: int, cols: int) -> None:
+        # caller holds _lock; evicts idle games until `size` more bytes and one more game fit,
+        # but none for a game that would not fit in an empty registry
+        while size <= self.max_bytes and self._games and (self._bytes + size > self.max_bytes or len(self._games) >= self.max_games):
+            if not self._evict_lru():
+                break
+        if self._bytes + size > self.max_bytes or len(self._games) >= self.max_games:
+            self.rejected += 1
+            raise RegistryFull(f"no room for a {rows}x{cols} game")
+
+    def get(self, game_id: str) -> Game:
+        game = self._games.get(game_id)
+        if game is None:
+            raise KeyError(game_id)
+        game.last_used = time.monotonic()
+        return game
+
+    def join(self, game_id: str, player: str) -> Game:
+        with self.play(game_id) as game:
+            if player not in game.players:
+                game.players.append(player)
+            return game
+
+    @contextmanager
+    def play(self, game_id: str) -> Iterator[Game]:
+        """Holds the game's own lock for the duration of one command."""
+        game = self.get(game_id)
+        lock = game.lock
+        if not lock.acquire(blocking=False):
+            t0 = time.perf_counter()
+            lock.acquire()
+            wait = time.perf_counter() - t0
+            game.contended += 1
+            game.wait_s += wait
+            game.wait_max = max(game.wait_max, wait)
+        try:
+            game.acquisitions += 1
+            yield game
+        finally:
+            game.last_used = time.monotonic()
+            lock.release()
+
+    def list(self) -> List[Dict]:
+        self.sweep()
+        return [g.summary() for g in list(self._games.values())]
+
+    def sweep(self) -> None:
+        with self._lock:
+            self._sweep(time.monotonic())
+
+    def _sweep(self, now: float) -> None:
+        # caller holds _lock
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        for game in [g for g in self._games.values() if now - g.last_used > self.idle_ttl]:
+            if not game.lock.locked():
+                self._remove(game)
+                self.evicted_idle += 1
+
+    def _evict_lru(self) -> bool:
+        # caller holds _lock
+        idle = [g for g in self._games.values() if not g.lock.locked()]
+        if not idle:
+            return False
+        self._remove(min(idle, key=lambda g: g.last_used))
+        self.evicted_budget += 1
+        return True
+
+    def _remove(self, game: Game) -> None:
+        del self._games[game.game_id]
+        self._retire(game)
+
+    def _retire(self, game: Game) -> None:
+        self._bytes -= game.size
+        r = self._retired
+        r["acquisitions"] += game.acquisitions
+        r["contended"] += game.contended
+        r["wait_s"] += game.wait_s
+        r["wait_max"] = max(r["wait_max"], game.wait_max)
+        checks = game.state.board.rep_check_stats()
+        for k in self._retired_checks:
+            self._retired_checks[k] += checks[k]
+
+    def stats(self, top: int = 5) -> Dict:
+        self.sweep()
+        with self._lock:
+            games = list(self._games.values())
+            acq, cont = self._retired["acquisitions"], self._retired["contended"]
+            wait_s, wait_max = self._retired["wait_s"], self._retired["wait_max"]
+            checks = dict(self._retired_checks)
+            out = {"games": len(games), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                   "max_games": self.max_games, "idle_ttl_s": self.idle_ttl,
+                   "created": self.created, "evicted_idle": self.evicted_idle,
+                   "evicted_budget": self.evicted_budget, "rejected": self.rejected}
+        players, modes = 0, {}
+        for g in games:
+            acq += g.acquisitions; cont += g.contended
+            wait_s += g.wait_s; wait_max = max(wait_max, g.wait_max)
+            players += len(g.players)
+            rep = g.state.board.rep_check_stats()
+            modes[rep["mode"]] = modes.get(rep["mode"], 0) + 1
+            for k in checks:
+                checks[k] += rep[k]
+        out["players"] = players
+        checks["seconds"] = round(checks["seconds"], 6)
+        out["rep_check"] = {"modes": modes, **checks,
+                            "us_per_mutation": round(checks["seconds"] / checks["mutations"] * 1e6, 3)
+                            if checks["mutations"] else 0.0}
+        out["locks"] = {"acquisitions": acq, "contended": cont,
+                        "contended_ratio": round(cont / acq, 4) if acq else 0.0,
+                        "wait_ms_total": round(wait_s * 1e3, 3),
+                        "wait_ms_mean": round(wait_s / cont * 1e3, 3) if cont else 0.0,
+                        "wait_ms_max": round(wait_max * 1e3, 3)}
+        hot = sorted((g for g in games if g.contended), key=lambda g: g.wait_s, reverse=True)[:top]
+        out["most_contended"] = [{"game_id": g.game_id, "contended": g.contended,
+                                  "wait_ms_total": round(g.wait_s * 1e3, 3)} for g in hot]
+        return out
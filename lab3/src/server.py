@@ -3,53 +3,107 @@ from __future__ import annotations
 from flask import Flask, request, jsonify
 from typing import List
 import commands
+from registry import GameRegistry, RegistryFull
 
 app = Flask(__name__)
 
-# For a real lab, you probably need multiple games/sessions.
-# This is a single in-memory game for simplicity.
-STATE = None
+# Every game lives in the registry under its own id and lock, so requests for
+# different games run in parallel. The original single-game endpoints
+# (/new, /pick, /resolve) keep working on the game with id DEFAULT_GAME.
+REGISTRY = GameRegistry(max_bytes=64 * 1024 * 1024, idle_ttl=600.0)
+DEFAULT_GAME = "default"
 
 
-@app.post("/new")
-def api_new():
-    global STATE
-    data = request.get_json(force=True)
+def error(message: str, code: int = 400):
+    return jsonify({"status": "error", "message": message}), code
 
+
+def create_game(data, game_id: str | None = None):
     rows = int(data["rows"])
     cols = int(data["cols"])
     values: List[str] = list(data["values"])  # must be rows*cols
-    STATE = commands.new_game(rows, cols, values)
+    return REGISTRY.create(rows, cols, values, data.get("player"), game_id,
+                           data.get("engine", "grid"), data.get("rep_check"))
+
+
+def play(game_id: str, command, *args):
+    try:
+        with REGISTRY.play(game_id) as game:
+            return jsonify(command(game.state, *args))
+    except KeyError:
+        if game_id == DEFAULT_GAME:
+            return error("game not created")
+        return error(f"unknown game {game_id}", 404)
+    except Exception as e:
+        return error(str(e))
+
+
+@app.post("/games")
+def api_create():
+    try:
+        game = create_game(request.get_json(force=True))
+    except RegistryFull as e:
+        return error(str(e), 503)
+    except (KeyError, TypeError, ValueError) as e:
+        return error(f"bad game: {e}")
+    return jsonify({"status": "ok", "game_id": game.game_id})
+
+
+@app.get("/games")
+def api_list():
+    return jsonify({"status": "ok", "games": REGISTRY.list()})
+
+
+@app.post("/games/<game_id>/join")
+def api_join(game_id: str):
+    player = str((request.get_json(silent=True) or {}).get("player", ""))
+    if not player:
+        return error("player required")
+    try:
+        game = REGISTRY.join(game_id, player)
+    except KeyError:
+        return error(f"unknown game {game_id}", 404)
+    return jsonify({"status": "ok", "game_id": game_id, "players": list(game.players)})
+
+
+@app.post("/games/<game_id>/pick")
+def api_game_pick(game_id: str):
+    data = request.get_json(force=True)
+    return play(game_id, commands.pick, (int(data["row"]), int(data["col"])))
+
+
+@app.post("/games/<game_id>/resolve")
+def api_game_resolve(game_id: str):
+    return play(game_id, commands.resolve_mismatch)
+
+
+@app.get("/stats")
+def api_stats():
+    return jsonify(REGISTRY.stats())
+
+
+@app.post("/new")
+def api_new():
+    try:
+        create_game(request.get_json(force=True), DEFAULT_GAME)
+    except RegistryFull as e:
+        return error(str(e), 503)
     return jsonify({"status": "ok"})
 
 
 @app.post("/pick")
 def api_pick():
-    if STATE is None:
-        return jsonify({"status": "error", "message": "game not created"}), 400
-
     data = request.get_json(force=True)
     r = int(data["row"])
     c = int(data["col"])
-
-    try:
-        result = commands.pick(STATE, (r, c))
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 400
+    return play(DEFAULT_GAME, commands.pick, (r, c))
 
 
 @app.post("/resolve")
 def api_resolve():
-    if STATE is None:
-        return jsonify({"status": "error", "message": "game not created"}), 400
-    try:
-        result = commands.resolve_mismatch(STATE)
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 400
+    return play(DEFAULT_GAME, commands.resolve_mismatch)
 
 
 if __name__ == "__main__":
-    # debug=True only for development
-    app.run(host="127.0.0.1", port=5000, debug=True)
\ No newline at end of file
+    # debug=True only for development; threaded so games are served concurrently
+    app.run(host="127.0.0.1", port=5000, debug=True, threaded=True)
@@ -8,16 +8,20 @@ import asyncio
 import random
 import time
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 # Adjust import to your project
 # Expecting:
 #   Board.parse_from_file(path) -> Board
 #   board.get_dimensions() -> (rows, cols)
-#   board.flip(player_id, row, col)  (blocking allowed)
+#   await board.flip(player_id, row, col)  (waits for controlled cards)
 #   board.look(player_id) -> str
 #   board.__str__ or board.to_string() -> str
-from board import Board  # change if your module path differs
+# AsyncBoard runs every player in this event loop; no thread per move
+from board import AsyncBoard as Board  # change if your module path differs
+
+BOARDS = Path(__file__).resolve().parent.parent / "Boards"
 
 
 Coord = Tuple[int, int]
@@ -54,19 +58,13 @@ def count_my_cards(look_text: str) -> int:
     return sum(1 for line in lines if line.startswith("my "))
 
 
-# ---- adapter: run potentially-blocking board methods safely in threads ----
-
-async def call_blocking(func, *args, **kwargs):
-    return await asyncio.to_thread(func, *args, **kwargs)
-
-
 # ----- main concurrent simulation -----
 
 async def simulation_main() -> None:
     print("MEMORY SCRAMBLE - CONCURRENT SIMULATION")
 
-    filename = "boards/ab.txt"
-    board: Board = await call_blocking(Board.parse_from_file, filename)
+    filename = BOARDS / "ab.txt"
+    board: Board = Board.parse_from_file(filename)
     rows, cols = board.get_dimensions()
 
     print(f"\nLoaded board: {rows}x{cols} from {filename}")
@@ -101,7 +99,7 @@ async def simulation_main() -> None:
                 print(f"{color}[{player_id}] Attempt {jj+1}: Flipping FIRST card at {first}{reset}")
 
                 start = now_ms()
-                await call_blocking(board.flip, player_id, first[0], first[1])
+                await board.flip(player_id, first[0], first[1])
                 stats.total_flips += 1
 
                 wait_time = now_ms() - start
@@ -116,11 +114,11 @@ async def simulation_main() -> None:
                 second = (random_int(rows), random_int(cols))
                 print(f"{color}[{player_id}] Attempt {jj+1}: Flipping SECOND card at {second}{reset}")
 
-                await call_blocking(board.flip, player_id, second[0], second[1])
+                await board.flip(player_id, second[0], second[1])
                 stats.total_flips += 1
 
                 # determine match by looking at board state
-                board_state = await call_blocking(board.look, player_id)
+                board_state = board.look(player_id)
                 my_cards = count_my_cards(board_state)
                 if my_cards == 2:
                     stats.successful_matches += 1
@@ -151,12 +149,12 @@ async def simulation_main() -> None:
 async def test_waiting_scenario() -> None:
     print("TEST: Multiple Players Waiting for Same Card")
 
-    board: Board = await call_blocking(Board.parse_from_file, "boards/ab.txt")
+    board: Board = Board.parse_from_file(BOARDS / "ab.txt")
 
     print("\nScenario: Alice controls (0,0), Bob and Charlie both want it")
 
     print("\n[Alice] Flipping (0,0)...")
-    await call_blocking(board.flip, "alice", 0, 0)
+    await board.flip("alice", 0, 0)
     print("[Alice] Now controls (0,0)")
 
     print("\n[Bob] Trying to flip (0,0) - should WAIT...")
@@ -164,48 +162,57 @@ async def test_waiting_scenario() -> None:
 
     async def bob_try():
         start = now_ms()
-        await call_blocking(board.flip, "bob", 0, 0)
+        await board.flip("bob", 0, 0)
         waited = int(now_ms() - start)
         print(f"[Bob] Got the card after waiting {waited}ms!")
+        return "bob"
 
     async def charlie_try():
         start = now_ms()
-        await call_blocking(board.flip, "charlie", 0, 0)
+        await board.flip("charlie", 0, 0)
         waited = int(now_ms() - start)
         print(f"[Charlie] Got the card after waiting {waited}ms!")
+        return "charlie"
 
     bob_task = asyncio.create_task(bob_try())
     charlie_task = asyncio.create_task(charlie_try())
 
     await timeout_ms(10)
+    if bob_task.done() or charlie_task.done():
+        raise RuntimeError("Test failed: a waiter got (0,0) while Alice controlled it")
     print("\n[System] Bob and Charlie are now waiting...")
 
     print("\n[Alice] Flipping (0,1) - will release (0,0)...")
-    await call_blocking(board.flip, "alice", 0, 1)
+    await board.flip("alice", 0, 1)
     print("[Alice] Released (0,0), no match")
 
     # one of Bob/Charlie should proceed now
     done, pending = await asyncio.wait({bob_task, charlie_task}, return_when=asyncio.FIRST_COMPLETED)
-    # cancel the other (optional; or let it finish if you want)
-    for t in pending:
-        t.cancel()
+    # the other keeps waiting until the winner gives (0,0) up with a mismatch
+    winner = done.pop().result()
+    await timeout_ms(10)
+    if len(pending) != 1 or pending.pop().done():
+        raise RuntimeError("Test failed: both waiters got (0,0)")
+    await board.flip(winner, 0, 1)
+    print(f"[{winner.capitalize()}] Released (0,0), no match")
+    await asyncio.wait_for(asyncio.gather(bob_task, charlie_task), timeout=5)
     print("\nTest passed: Waiting mechanism works correctly\n")
 
 
 async def test_matched_cards_scenario() -> None:
     print("TEST: Matched Cards Cleanup")
 
-    board: Board = await call_blocking(Board.parse_from_file, "boards/ab.txt")
+    board: Board = Board.parse_from_file(BOARDS / "ab.txt")
 
     print("\nScenario: Alice matches two cards, Bob waits for one")
 
     # Assumes (0,0) and (0,2) are a match on boards/ab.txt like your TS example
     print("\n[Alice] Flipping (0,0)...")
-    await call_blocking(board.flip, "alice", 0, 0)
+    await board.flip("alice", 0, 0)
     print("[Alice] Flipping (0,2)...")
-    await call_blocking(board.flip, "alice", 0, 2)
+    await board.flip("alice", 0, 2)
 
-    alice_view = await call_blocking(board.look, "alice")
+    alice_view = board.look("alice")
     print("\n[Alice] Board state:")
     print(alice_view)
 
@@ -221,12 +228,13 @@ async def test_matched_cards_scenario() -> None:
     async def bob_try():
         nonlocal bob_got_error
         try:
-            await call_blocking(board.flip, "bob", 0, 0)
-            # This should NOT happen if the card is removed during waiting
-            raise RuntimeError("Test failed: Bob got a removed card")
+            await board.flip("bob", 0, 0)
         except Exception as e:
             bob_got_error = True
             print(f"[Bob] Failed as expected: {e}")
+        else:
+            # This should NOT happen if the card is removed during waiting
+            raise RuntimeError("Test failed: Bob got a removed card")
 
     bob_task = asyncio.create_task(bob_try())
 
@@ -234,7 +242,7 @@ async def test_matched_cards_scenario() -> None:
     print("[System] Bob is waiting...")
 
     print("\n[Alice] Making next move - matched cards should be removed")
-    await call_blocking(board.flip, "alice", 1, 1)
+    await board.flip("alice", 1, 1)
 
     await bob_task
 
@@ -0,0 +1,376 @@
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+from board import MATCHED, AsyncBoard, Board, Cell, CompactBoard, ConcurrentBoard, RepCheck
+
+
+def make_values(rows: int, cols: int, seed: int) -> list:
+    vals = [f"v{i // 2}" for i in range(rows * cols)]
+    random.Random(seed).shuffle(vals)
+    return vals
+
+
+def outcome(fn, *args):
+    """fn's result, or the ValueError message it raised."""
+    try:
+        return fn(*args)
+    except ValueError as e:
+        return ("error", str(e))
+
+
+def cells(board, rows: int, cols: int) -> list:
+    return [board.peek((r, c)) for r in range(rows) for c in range(cols)]
+
+
+def test_flip_and_match():
+    b = Board(2, 2, ["A", "A", "B", "B"])
+    assert b.flip_up((0, 0)) == "A" and b.flip_up((0, 1)) == "A"
+    b.mark_matched((0, 0), (0, 1))
+    assert b.peek((0, 0)).matched and b.peek((0, 1)).matched
+    with pytest.raises(ValueError):
+        b.flip_up((0, 0))
+
+
+@pytest.mark.parametrize("engine", [Board, CompactBoard])
+@pytest.mark.parametrize("rep_check", ["full", "local", "off"])
+def test_rejects_bad_input(engine, rep_check):
+    with pytest.raises(ValueError):
+        engine(0, 2, [], rep_check)
+    with pytest.raises(ValueError):
+        engine(2, 2, ["A"], rep_check)
+    b = engine(1, 2, ["A", "B"], rep_check)
+    for bad in [(1, 0), (0, 2), (-1, 0)]:
+        with pytest.raises(ValueError):
+            b.flip_up(bad)
+    b.flip_up((0, 0)); b.flip_up((0, 1))
+    with pytest.raises(ValueError):
+        b.mark_matched((0, 0), (0, 1))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_compact_board_matches_board(seed):
+    rows, cols = 4, 5
+    values = make_values(rows, cols, seed)
+    grid, compact = Board(rows, cols, values, "full"), CompactBoard(rows, cols, values, "full")
+    rnd = random.Random(seed)
+    pos = lambda: (rnd.randrange(rows), rnd.randrange(cols))
+    for _ in range(300):
+        op = rnd.choice(["up", "up", "down", "match"])
+        if op == "match":
+            args, name = (pos(), pos()), "mark_matched"
+        else:
+            args, name = (pos(),), "flip_up" if op == "up" else "flip_down"
+        assert outcome(getattr(grid, name), *args) == outcome(getattr(compact, name), *args)
+        assert cells(grid, rows, cols) == cells(compact, rows, cols)
+    assert grid.rep_check_stats()["mutations"] == compact.rep_check_stats()["mutations"]
+
+
+def corrupt(board, pos):
+    """Leaves pos matched but face down, as a buggy mutation would; returns it as the board's touched key."""
+    if isinstance(board, CompactBoard):
+        i = board._index(pos)
+        board._state[i] = MATCHED
+        return i
+    board._grid[pos[0]][pos[1]] = Cell(board.peek(pos).value, face_up=False, matched=True)
+    return pos
+
+
+@pytest.mark.parametrize("engine", [Board, CompactBoard])
+@pytest.mark.parametrize("rep_check", ["local", "sampled:5", "full"])
+def test_rep_check_catches_a_broken_touched_cell(engine, rep_check):
+    b = engine(2, 2, ["A", "A", "B", "B"], rep_check)
+    touched = corrupt(b, (1, 1))
+    with pytest.raises(AssertionError):
+        b._rep.after(b, (touched,))          # the check a mutation of (1, 1) would run
+    assert b.rep_check_stats()["mutations"] == 1
+
+
+@pytest.mark.parametrize("engine", [Board, CompactBoard])
+def test_only_scans_find_a_broken_untouched_cell(engine):
+    values = ["A", "A", "B", "B", "C", "C"]
+    local, sampled, full = (engine(2, 3, values, spec) for spec in ("local", "sampled:3", "full"))
+    for b in (local, sampled, full):
+        corrupt(b, (1, 2))
+    with pytest.raises(AssertionError):
+        full.flip_up((0, 0))
+    for b in (local, sampled):
+        b.flip_up((0, 0)); b.flip_down((0, 0))    # local checks of (0, 0) pass
+    with pytest.raises(AssertionError):
+        sampled.flip_up((0, 1))                   # third mutation: full scan
+    local.flip_up((0, 1))
+    assert local.rep_check_stats()["full_checks"] == 1     # construction only, never again
+
+
+@pytest.mark.parametrize("engine", [Board, CompactBoard])
+def test_rep_check_stats_follow_the_mode(engine):
+    def play(spec):
+        b = engine(2, 2, ["A", "A", "B", "B"], spec)
+        b.flip_up((0, 0)); b.flip_down((0, 0))               # one cell each
+        b.flip_down((0, 0))                                  # already down: not a mutation
+        b.flip_up((0, 0)); b.flip_up((0, 1))
+        b.mark_matched((0, 0), (0, 1))                       # two cells
+        b.flip_up((1, 0))
+        return {k: v for k, v in b.rep_check_stats().items() if k != "seconds"}
+
+    base = {"every": None, "mutations": 6}
+    assert play("off") == {"mode": "off", "every": None, "mutations": 0, "local_checks": 0, "full_checks": 0}
+    assert play("local") == {**base, "mode": "local", "local_checks": 7, "full_checks": 1}
+    assert play("full") == {**base, "mode": "full", "local_checks": 0, "full_checks": 7}
+    # mutations 2, 4 and 6 are full scans; 1, 3 and the match (5th, two cells) are checked locally
+    assert play("sampled:2") == {**base, "mode": "sampled", "every": 2, "local_checks": 4, "full_checks": 4}
+
+
+def test_rep_check_spec(monkeypatch):
+    monkeypatch.setenv("BOARD_REP_CHECK", "sampled:7")
+    assert (RepCheck().mode, RepCheck().every) == ("sampled", 7)
+    assert RepCheck("LOCAL").mode == "local"          # the argument wins over the environment
+    assert RepCheck("sampled").every == 1000 and RepCheck("sampled:0").every == 1
+    monkeypatch.delenv("BOARD_REP_CHECK")
+    assert RepCheck().mode == ("full" if __debug__ else "off")
+    with pytest.raises(ValueError):
+        RepCheck("sometimes")
+    rc = RepCheck("off")
+    rc.initial(None); rc.after(None, ((0, 0),))       # never touches the board
+    assert rc.stats()["seconds"] == 0.0 and rc.stats()["mutations"] == 0
+
+
+class Reference:
+    """
+    ConcurrentBoard's rules played one move at a time on a Board, with
+    control tracked beside it; a removed card is a matched one. A first flip
+    of a card someone else controls would wait, so scripts never make one.
+    """
+
+    def __init__(self, rows: int, cols: int, values: list):
+        self.rows, self.cols = rows, cols
+        self.board = Board(rows, cols, values, "full")
+        self.owner: dict = {}   # pos -> controlling player
+        self.held: dict = {}    # player -> [first] or a matched [first, second]
+        self.turn: dict = {}    # player -> cards flipped this turn
+
+    def blocks(self, player: str, pos) -> bool:
+        return len(self.held.get(player, [])) != 1 and self.owner.get(pos) not in (None, player)
+
+    def flip(self, player: str, row: int, col: int) -> str:
+        pos = (row, col)
+        cell = self.board.peek(pos)
+        if len(self.held.get(player, [])) == 1:
+            return self._second(player, pos, cell)
+        self._settle(player)
+        cell = self.board.peek(pos)
+        if cell.matched:
+            raise ValueError(f"no card at {pos}")
+        self._take(player, pos, cell)
+        self.held[player] = [pos]
+        self.turn[player] = [pos]
+        return cell.value
+
+    def _second(self, player: str, pos, cell) -> str:
+        first = self.held[player][0]
+        problem = (f"no card at {pos}" if cell.matched
+                   else f"card at {pos} is controlled" if pos in self.owner else None)
+        if problem:
+            del self.owner[first]
+            self.held[player] = []
+            raise ValueError(problem)
+        self._take(player, pos, cell)
+        self.turn[player].append(pos)
+        if self.board.peek(first).value == cell.value:
+            self.held[player].append(pos)
+        else:
+            del self.owner[first], self.owner[pos]
+            self.held[player] = []
+        return cell.value
+
+    def _take(self, player: str, pos, cell) -> None:
+        self.owner[pos] = player
+        if not cell.face_up:
+            self.board.flip_up(pos)
+
+    def _settle(self, player: str) -> None:
+        turn = self.turn.get(player, [])
+        if len(self.held.get(player, [])) == 2:
+            self.board.mark_matched(*turn)
+            for pos in turn:
+                del self.owner[pos]
+        else:
+            for pos in turn:
+                cell = self.board.peek(pos)
+                if pos not in self.owner and cell.face_up and not cell.matched:
+                    self.board.flip_down(pos)
+        self.held[player] = []
+        self.turn[player] = []
+
+    def leave(self, player: str) -> None:
+        if len(self.held.get(player, [])) == 1:
+            del self.owner[self.held[player][0]]
+            self.held[player] = []
+        self._settle(player)
+
+    def look(self, player=None) -> str:
+        lines = [f"{self.rows}x{self.cols}"]
+        for r in range(self.rows):
+            for c in range(self.cols):
+                cell = self.board.peek((r, c))
+                if cell.matched:
+                    lines.append("none")
+                elif not cell.face_up:
+                    lines.append("down")
+                else:
+                    mine = player is not None and self.owner.get((r, c)) == player
+                    lines.append(("my " if mine else "up ") + cell.value)
+        return "\n".join(lines) + "\n"
+
+
+def play_script(seed: int, rows: int, cols: int, players: int, moves: int):
+    """Yields (reference, move) for a seeded script of flips and leaves that never blocks."""
+    ref = Reference(rows, cols, make_values(rows, cols, seed))
+    rnd = random.Random(seed)
+    names = [f"p{k}" for k in range(players)]
+    for _ in range(moves):
+        player = rnd.choice(names)
+        if rnd.random() < 0.05:
+            yield ref, ("leave", player)
+            continue
+        r, c = rnd.randrange(rows + 1 if rnd.random() < 0.02 else rows), rnd.randrange(cols)
+        if r < rows and ref.blocks(player, (r, c)):
+            continue
+        yield ref, ("flip", player, r, c)
+
+
+@pytest.mark.parametrize("stripes", [1, 3, 64])
+@pytest.mark.parametrize("seed", range(10))
+def test_concurrent_board_follows_the_rules(seed, stripes):
+    rows, cols = 5, 6
+    board = ConcurrentBoard(rows, cols, make_values(rows, cols, seed), stripes)
+    names = ["p0", "p1", "p2"]
+    for ref, move in play_script(seed, rows, cols, len(names), 300):
+        name, *args = move
+        assert outcome(getattr(board, name), *args) == outcome(getattr(ref, name), *args), move
+        for player in names:
+            assert board.look(player) == ref.look(player)
+        board._check_rep()
+    assert board.to_string() == ref.look()
+
+
+def wait_until(cond, timeout: float = 2.0) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if cond(): return True
+        time.sleep(0.005)
+    return cond()
+
+
+def flip_in_thread(board, player: str, row: int, col: int) -> tuple:
+    out: list = []
+    t = threading.Thread(target=lambda: out.append(outcome(board.flip, player, row, col)), daemon=True)
+    t.start()
+    return t, out
+
+
+def test_first_flip_waits_for_release():
+    board = ConcurrentBoard(2, 2, ["A", "B", "A", "B"])
+    board.flip("alice", 0, 0)
+    t, out = flip_in_thread(board, "bob", 0, 0)
+    assert wait_until(lambda: board.stats()["waits"] == 1)
+    assert not out
+    board.flip("alice", 0, 1)   # mismatch gives up (0, 0)
+    t.join(2)
+    assert out == ["A"] and "my A" in board.look("bob")
+
+
+def test_waiter_fails_when_the_pair_is_removed():
+    board = ConcurrentBoard(2, 2, ["A", "B", "A", "B"])
+    board.flip("alice", 0, 0); board.flip("alice", 1, 0)   # matched, still controlled
+    t, out = flip_in_thread(board, "bob", 1, 0)
+    assert wait_until(lambda: board.stats()["waits"] == 1)
+    board.flip("alice", 0, 1)   # removes the pair
+    t.join(2)
+    assert out == [("error", "no card at (1, 0)")]
+
+
+def test_release_wakes_only_the_waiters_of_that_card():
+    board = ConcurrentBoard(2, 2, ["A", "B", "A", "B"])
+    board.flip("alice", 0, 0)
+    board.flip("bob", 0, 1)
+    ta, out_a = flip_in_thread(board, "carol", 0, 0)
+    tb, out_b = flip_in_thread(board, "dave", 0, 1)
+    assert wait_until(lambda: board.stats()["waits"] == 2)
+    board.leave("alice")
+    ta.join(2)
+    assert out_a == ["A"] and not out_b and board.stats()["wakeups"] == 1
+    board.leave("bob")
+    tb.join(2)
+    assert out_b == ["B"]
+
+
+async def async_outcome(fn, *args):
+    try:
+        return await fn(*args)
+    except ValueError as e:
+        return ("error", str(e))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_async_board_matches_concurrent_board(seed):
+    rows, cols = 5, 6
+    names = ["p0", "p1", "p2"]
+
+    async def play():
+        board = AsyncBoard(rows, cols, make_values(rows, cols, seed))
+        threaded = ConcurrentBoard(rows, cols, make_values(rows, cols, seed))
+        for ref, move in play_script(seed, rows, cols, len(names), 300):
+            name, *args = move
+            got = await async_outcome(getattr(board, name), *args)
+            assert got == outcome(getattr(threaded, name), *args) == outcome(getattr(ref, name), *args), move
+            for player in names:
+                assert board.look(player) == threaded.look(player)
+        board._check_rep()
+
+    asyncio.run(play())
+
+
+def test_async_first_flip_waits_for_release():
+    async def play():
+        board = AsyncBoard(2, 2, ["A", "B", "A", "B"])
+        await board.flip("alice", 0, 0)
+        bob = asyncio.create_task(async_outcome(board.flip, "bob", 0, 0))
+        await asyncio.sleep(0)
+        assert not bob.done() and board.stats()["waits"] == 1
+        await board.flip("alice", 0, 1)   # mismatch gives up (0, 0)
+        assert await bob == "A" and "my A" in board.look("bob")
+
+    asyncio.run(play())
+
+
+def test_async_waiters_fail_when_the_pair_is_removed():
+    async def play():
+        board = AsyncBoard(2, 2, ["A", "B", "A", "B"])
+        await board.flip("alice", 0, 0); await board.flip("alice", 1, 0)
+        waiters = [asyncio.create_task(async_outcome(board.flip, f"p{k}", 1, 0)) for k in range(3)]
+        await asyncio.sleep(0)
+        await board.flip("alice", 0, 1)   # removes the pair
+        assert await asyncio.gather(*waiters) == [("error", "no card at (1, 0)")] * 3
+
+    asyncio.run(play())
+
+
+def test_async_cancelled_waiter_passes_the_wakeup_on():
+    async def play():
+        board = AsyncBoard(2, 2, ["A", "B", "A", "B"])
+        await board.flip("alice", 0, 0)
+        bob = asyncio.create_task(board.flip("bob", 0, 0))
+        carol = asyncio.create_task(board.flip("carol", 0, 0))
+        await asyncio.sleep(0)
+        await board.leave("alice")   # wakes bob...
+        bob.cancel()                 # ...who is cancelled before he runs
+        assert await asyncio.wait_for(carol, 2) == "A"   # would hang if the wakeup were lost
+        with pytest.raises(asyncio.CancelledError):
+            await bob
+        assert board._stripes[0].waiting == {}
+
+    asyncio.run(play())
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+import commands
+from registry import GameRegistry, RegistryFull
+
+
+def values(n: int) -> list:
+    return [f"v{i // 2}" for i in range(n)]
+
+
+def test_estimate_is_a_lower_bound():
+    for engine in ("grid", "compact"):
+        for rows, cols in ((1, 2), (10, 10), (50, 40)):
+            board = commands.new_game(rows, cols, values(rows * cols), engine, "off").board
+            assert 0 < commands.board_nbytes(rows, cols, engine) <= board.nbytes()
+    with pytest.raises(ValueError):
+        commands.board_nbytes(2, 2, "nope")
+
+
+def test_oversized_game_is_refused_before_it_is_built(monkeypatch):
+    reg = GameRegistry(max_bytes=1024 * 1024)
+    kept = reg.create(2, 2, values(4), game_id="kept")
+
+    def never(*args):
+        raise AssertionError("board built for a game that cannot fit")
+
+    monkeypatch.setattr(commands, "new_game", never)
+    with pytest.raises(RegistryFull):
+        reg.create(1000, 1000, values(2), game_id="huge")   # values are never looked at
+    assert reg.stats()["rejected"] == 1
+    assert reg.get("kept") is kept   # nothing was evicted for a game that could never fit
+
+
+def test_game_count_limit():
+    reg = GameRegistry(max_games=2)
+    a = reg.create(2, 2, values(4), game_id="a")
+    with reg.play("a"):
+        b = reg.create(2, 2, values(4), game_id="b")
+        with reg.play("b"), pytest.raises(RegistryFull):
+            reg.create(2, 2, values(4), game_id="c")   # both games busy: nothing to evict
+    assert {g["game_id"] for g in reg.list()} == {"a", "b"}
+    assert a.size > 0 and b.size > 0
+
+
+def test_budget_evicts_least_recently_used():
+    size = commands.new_game(10, 10, values(100)).board.nbytes()
+    reg = GameRegistry(max_bytes=int(size * 2.5))
+    reg.create(10, 10, values(100), game_id="a")
+    reg.create(10, 10, values(100), game_id="b")
+    reg.get("a").last_used -= 10   # "b" is the more recent one...
+    with reg.play("a"):
+        pass                       # ...until "a" is played
+    reg.create(10, 10, values(100), game_id="c")
+    assert {g["game_id"] for g in reg.list()} == {"a", "c"}
+    st = reg.stats()
+    assert st["evicted_budget"] == 1 and st["bytes"] <= st["max_bytes"]
+
+
+def test_busy_game_is_not_evicted():
+    size = commands.new_game(10, 10, values(100)).board.nbytes()
+    reg = GameRegistry(max_bytes=int(size * 1.5))
+    reg.create(10, 10, values(100), game_id="a")
+    with reg.play("a"), pytest.raises(RegistryFull):
+        reg.create(10, 10, values(100), game_id="b")
+    assert reg.get("a")
+
+
+def test_idle_games_are_swept():
+    reg = GameRegistry(idle_ttl=60.0, sweep_interval=0.0)
+    reg.create(2, 2, values(4), game_id="old")
+    reg.create(2, 2, values(4), game_id="busy")
+    reg.create(2, 2, values(4), game_id="fresh")
+    for gid in ("old", "busy"):
+        reg.get(gid).last_used = time.monotonic() - 120
+    with reg._games["busy"].lock:   # a command in progress
+        assert {g["game_id"] for g in reg.list()} == {"busy", "fresh"}
+        st = reg.stats()
+    assert st["evicted_idle"] == 1 and st["games"] == 2
+
+
+def test_replacing_a_game_frees_its_bytes():
+    reg = GameRegistry()
+    reg.create(10, 10, values(100), game_id="a")
+    before = reg.stats()["bytes"]
+    reg.create(2, 2, values(4), game_id="a")
+    assert reg.stats()["bytes"] < before and reg.stats()["games"] == 1